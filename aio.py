@@ -0,0 +1,114 @@
+import asyncio
+import atexit
+import sys
+import threading
+import time
+import asyncpg
+import cache
+import config
+import database as db
+import querylog
+
+# Concurrent read-only lookups on an asyncpg pool of their own. Their statements are recorded by querylog like
+# those of the main pool's cursors (in the render that ran them), but they run outside any unit of work
+# (database.unit_of_work): they only see committed records, so they are meant for verifying IDs and looking up
+# names, never for reading back a unit's own writes.
+
+_loop = None            # event loop running the asyncio pool, in a background thread
+_pool = None
+_start_lock = threading.Lock()
+
+# coroutine to open the asyncio connection pool
+async def _create_pool():
+    return await asyncpg.create_pool(
+        host=config.db_host,
+        port=config.db_port,
+        user=config.db_user,
+        password=config.password,
+        database=config.db_database,
+        min_size=config.async_pool_min_size,
+        max_size=config.async_pool_max_size
+    )
+
+# function to start the background event loop and its asyncpg pool (on first use); Streamlit runs each
+# script in a thread without an event loop, so every coroutine is handed to this one loop instead
+def _start():
+    global _loop, _pool
+    if _loop is None:
+        with _start_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='aio-db', daemon=True)
+                thread.start()
+                try:
+                    _pool = asyncio.run_coroutine_threadsafe(_create_pool(), loop).result()
+                except BaseException:
+                    # the next call starts over, so stop this loop rather than leaving its thread behind
+                    loop.call_soon_threadsafe(loop.stop)
+                    thread.join()
+                    loop.close()
+                    raise
+                _loop = loop
+                atexit.register(_stop)
+    return _loop
+
+def _stop():
+    asyncio.run_coroutine_threadsafe(_pool.close(), _loop).result(timeout=5)
+    _loop.call_soon_threadsafe(_loop.stop)
+
+# function to run coroutines concurrently on the asyncio pool and wait for all of them; returns their results
+# in the order given, so a page's independent lookups cost the slowest query rather than the sum of them. The
+# coroutines run in a copy of the caller's context (the loop's callbacks are scheduled with the caller's context)
+def run(*coroutines):
+    async def gather():
+        return await asyncio.gather(*coroutines)
+    return asyncio.run_coroutine_threadsafe(gather(), _start()).result()
+
+# coroutine to run a query with one of the pool's methods and record it in querylog as run by frame (in the
+# caller's render, see run)
+async def _timed(method, query, args, frame):
+    if not config.query_instrumentation:
+        return await method(query, *args)
+    start, result = time.perf_counter(), None
+    try:
+        result = await method(query, *args)
+        return result
+    finally:
+        rows = len(result) if isinstance(result, list) else int(result is not None)
+        querylog.record_statement(query, args, frame, time.perf_counter() - start, rows)
+
+# coroutines to run a query (PostgreSQL $1, $2, ... placeholders) on a connection from the asyncio pool
+async def fetch(query, *args):
+    return await _timed(_pool.fetch, query, args, sys._getframe(1))
+
+async def fetchval(query, *args):
+    return await _timed(_pool.fetchval, query, args, sys._getframe(1))
+
+# coroutine to check whether a record exists (shares the known-ID cache with database.record_exists)
+async def record_exists(table, record_id):
+    if not record_id:
+        return False
+    if db.is_known_id(table, record_id):
+        return True
+    exists = await fetchval(f"SELECT EXISTS (SELECT 1 FROM {table} WHERE id = $1);", record_id)
+    if exists:
+        db.remember_id(table, record_id)
+    return exists
+
+# coroutine to get the name of a record (None if there is no such record; shares the name cache with
+# database.record_name)
+async def record_name(table, record_id):
+    if not record_id:
+        return None
+    name = db.cached_name(table, record_id)
+    if name is not cache.MISSING:
+        return name
+    name = await fetchval(f"SELECT name FROM {table} WHERE id = $1;", record_id)
+    if name is not None:
+        db.remember_name(table, record_id, name)
+    return name
+
+# function to look up the names of several records at once, e.g. lookup_names(('patient_record', patient_id),
+# ('doctor_record', doctor_id)); a name is only found for an existing record, so this also verifies the IDs
+def lookup_names(*records):
+    return run(*(record_name(table, record_id) for table, record_id in records))
@@ -0,0 +1,125 @@
+import streamlit as st
+from datetime import date, timedelta
+import pandas as pd
+import database as db
+
+# summaries kept up to date from the delta tables filled by the analytics triggers (see migration 15):
+# (delta table, summary table, key columns, measure columns)
+SUMMARIES = [
+    ('analytics_registration_delta', 'analytics_daily_registrations', ['day'], ['registrations']),
+    ('analytics_test_delta', 'analytics_monthly_tests', ['doctor_id', 'month'], ['tests', 'revenue']),
+]
+
+# function to fold the changes logged since the last refresh into the summary tables; its cost depends on the
+# number of writes since then, not on the size of the record tables. Safe to run from several processes at once;
+# commits on its own even inside a unit of work, so the folded deltas are not locked for the rest of the action
+def refresh():
+    with db.session(own_transaction=True) as (conn, c):
+        for delta_table, summary_table, keys, measures in SUMMARIES:
+            key_list = ', '.join(keys)
+            c.execute(
+                f"""
+                WITH pending AS (DELETE FROM {delta_table} RETURNING *)
+                INSERT INTO {summary_table} ({key_list}, {', '.join(measures)})
+                SELECT {key_list}, {', '.join(f'sum({m})' for m in measures)}
+                FROM pending
+                GROUP BY {key_list}
+                ON CONFLICT ({key_list}) DO UPDATE
+                SET {', '.join(f'{m} = {summary_table}.{m} + EXCLUDED.{m}' for m in measures)};
+                """
+            )
+            c.execute(f"DELETE FROM {summary_table} WHERE {measures[0]} = 0;")
+
+# function to get the number of patients registered on each day of a date range
+def daily_registrations(since, until):
+    with db.session() as (conn, c):
+        c.execute(
+            """
+            SELECT day, registrations
+            FROM analytics_daily_registrations
+            WHERE day BETWEEN %(since)s AND %(until)s
+            ORDER BY day;
+            """,
+            {'since': since, 'until': until}
+        )
+        return c.fetchall()
+
+# function to get the number of tests ordered by each doctor, and the revenue from them, in the months of a
+# date range (busiest doctors first)
+def tests_per_doctor(since, until):
+    with db.session() as (conn, c):
+        c.execute(
+            """
+            SELECT t.doctor_id, d.name, d.department_name, sum(t.tests)::bigint, sum(t.revenue)::bigint
+            FROM analytics_monthly_tests t
+            LEFT JOIN doctor_record d ON d.id = t.doctor_id
+            WHERE t.month BETWEEN date_trunc('month', %(since)s::date) AND %(until)s
+            GROUP BY t.doctor_id, d.name, d.department_name
+            ORDER BY sum(t.tests) DESC, t.doctor_id;
+            """,
+            {'since': since, 'until': until}
+        )
+        return c.fetchall()
+
+# function to get the revenue from medical tests per department and month. The summaries are kept per doctor,
+# so a test counts towards the ordering doctor's current department: moving a doctor to another department
+# moves the revenue of all their past tests with them
+def revenue_by_department(since, until):
+    with db.session() as (conn, c):
+        c.execute(
+            """
+            SELECT t.month, coalesce(d.department_name, 'Unknown'), sum(t.revenue)::bigint
+            FROM analytics_monthly_tests t
+            LEFT JOIN doctor_record d ON d.id = t.doctor_id
+            WHERE t.month BETWEEN date_trunc('month', %(since)s::date) AND %(until)s
+            GROUP BY 1, 2
+            ORDER BY 1, 2;
+            """,
+            {'since': since, 'until': until}
+        )
+        return c.fetchall()
+
+# function to show the analytics dashboard for a chosen date range (the last twelve months by default)
+def show_dashboard():
+    today = date.today()
+    since = st.date_input('From', (today.replace(day=1) - timedelta(days=335)).replace(day=1))
+    until = st.date_input('To', today)
+    try:
+        refresh()
+        registrations = daily_registrations(since, until)
+        doctors = tests_per_doctor(since, until)
+        revenue = revenue_by_department(since, until)
+    except Exception as e:
+        st.error(f'Error fetching analytics: {e}')
+        return
+
+    st.subheader('Daily registrations')
+    if registrations:
+        df = pd.DataFrame(data=registrations, columns=['Day', 'Registrations']).set_index('Day')
+        st.metric('Patients registered', int(df['Registrations'].sum()))
+        st.line_chart(df)
+    else:
+        st.warning('No registrations in this period')
+
+    st.subheader('Tests per doctor')
+    if doctors:
+        st.dataframe(pd.DataFrame(data=doctors, columns=['Doctor ID', 'Name', 'Department', 'Tests', 'Revenue (INR)']))
+    else:
+        st.warning('No medical tests in this period')
+
+    st.subheader('Revenue from medical tests by department and month (INR)')
+    st.caption("Tests are counted under the ordering doctor's current department, so a doctor's move to another "
+               'department also moves the revenue of their past tests.')
+    if revenue:
+        df = pd.DataFrame(data=revenue, columns=['Month', 'Department', 'Revenue'])
+        df['Month'] = pd.to_datetime(df['Month']).dt.strftime('%Y-%m')
+        df = df.pivot(index='Month', columns='Department', values='Revenue').fillna(0).astype(int)
+        st.bar_chart(df)
+        st.dataframe(df)
+    else:
+        st.warning('No medical tests in this period')
+
+# running this module directly refreshes the summaries (e.g. from a scheduled job, so dashboards have less to do)
+if __name__ == '__main__':
+    db.db_init()
+    refresh()
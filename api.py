@@ -0,0 +1,290 @@
+import argparse
+import hmac
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+import changes
+import config
+import database as db
+import indexes
+import search
+import services
+import timeline
+
+# JSON API over the service layer, for clients such as registration kiosks and lab instruments. Every request
+# sends the app password in an X-Password header; writes to patients, doctors and departments also need the
+# edit mode password (X-Edit-Password), and writes to prescriptions and medical tests as well as drug recall
+# need the doctor/medical lab scientist access code (X-Access-Code), as in the Streamlit app. Endpoints:
+#
+#   GET    /<records>?after=<id>&limit=<n>      one page of records in ID order (next_after is the next page's key)
+#   GET    /<records>?q=<text>                  best matching patients, doctors or departments (see search.py)
+#   GET    /patients?min_age=<n>&max_age=<n>    one page of the patients of an age range (also /doctors)
+#   POST   /<records>                           add a record from a JSON object keyed by column name -> {"id": ...}
+#   GET    /<records>/<id>                      one record
+#   PATCH  /<records>/<id>                      update the given fields of a record
+#   DELETE /<records>/<id>                      delete a record
+#   GET    /patients/<id>/prescriptions         a patient's prescriptions (also /medical-tests)
+#   GET    /patients/<id>/timeline?before_time=<t>&before_id=<id>   one page of a patient's timeline
+#   GET    /departments/<id>/doctors            the doctors working in a department
+#   GET    /medicines/<name>/patients?since=<date>&until=<date>     patients prescribed a medicine
+#
+# where <records> is patients, doctors, departments, prescriptions or medical-tests. Prescriptions take their
+# medicines as a list of {"medicine_name": ..., "dosage_description": ...} objects. Errors are returned as
+# {"error": message} with status 400 (invalid input), 401/403 (password), 404 (unknown record) or 409 (conflict).
+
+# record types served: path -> (table, field names, columns, add, update, delete, get, password needed to write)
+RESOURCES = {
+    'patients': ('patient_record', services.PATIENT_FIELDS, services.PATIENT_COLUMNS, services.add_patient,
+                 services.update_patient, services.delete_patient, services.get_patient, 'edit'),
+    'doctors': ('doctor_record', services.DOCTOR_FIELDS, services.DOCTOR_COLUMNS, services.add_doctor,
+                services.update_doctor, services.delete_doctor, services.get_doctor, 'edit'),
+    'departments': ('department_record', services.DEPARTMENT_FIELDS, services.DEPARTMENT_COLUMNS,
+                    services.add_department, services.update_department, services.delete_department,
+                    services.get_department, 'edit'),
+    'prescriptions': ('prescription_record', services.PRESCRIPTION_FIELDS, services.PRESCRIPTION_COLUMNS,
+                      services.add_prescription, services.update_prescription, services.delete_prescription,
+                      services.get_prescription, 'access'),
+    'medical-tests': ('medical_test_record', services.MEDICAL_TEST_FIELDS, services.MEDICAL_TEST_COLUMNS,
+                      services.add_medical_test, services.update_medical_test, services.delete_medical_test,
+                      services.get_medical_test, 'access'),
+}
+
+# header and expected value of each password
+PASSWORDS = {
+    'app': ('X-Password', lambda: config.password),
+    'edit': ('X-Edit-Password', lambda: config.edit_mode_password),
+    'access': ('X-Access-Code', lambda: config.dr_mls_access_code),
+}
+
+TIMELINE_SUMMARY_FIELDS = ['id', 'name', 'age', 'gender', 'blood_group', 'contact_number_1']
+TIMELINE_EVENT_FIELDS = ['event_time', 'kind', 'id', 'doctor_id', 'doctor_name', 'summary', 'details']
+RECALL_FIELDS = ['id', 'name', 'contact_number_1', 'email_id', 'prescriptions', 'last_prescribed', 'medicines']
+DOCTOR_LIST_FIELDS = ['id', 'name']
+AGE_FILTERED_TABLES = {'patient_record', 'doctor_record'}
+
+MAX_BODY_SIZE = 1_000_000       # bytes
+
+# raised by the request handlers to answer with an error status
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _json_value(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+def _records(fields, rows):
+    return [dict(zip(fields, row)) for row in rows]
+
+def _require(headers, password):
+    header, expected = PASSWORDS[password]
+    given = headers.get(header)
+    if given is None:
+        raise HTTPError(401, f'Missing {header} header')
+    if not hmac.compare_digest(given.encode(), expected().encode()):
+        raise HTTPError(403, f'Invalid {header}')
+
+def _query_int(query, name, default, low, high):
+    try:
+        value = int(query.get(name, default))
+    except ValueError:
+        raise HTTPError(400, f'{name} must be a whole number') from None
+    if not low <= value <= high:
+        raise HTTPError(400, f'{name} must be between {low} and {high}')
+    return value
+
+def _query_date(query, name):
+    if name not in query:
+        return None
+    try:
+        return date.fromisoformat(query[name])
+    except ValueError:
+        raise HTTPError(400, f'{name} must be a date (YYYY-MM-DD)') from None
+
+def _require_record(table, record_id):
+    if not db.record_exists(table, record_id):
+        raise HTTPError(404, f'Invalid {services.RECORD_NAMES[table]} ID')
+
+# function to list a page of records (optionally only people of an age range), or the best matches for a search text (?q=)
+def _list(table, fields, columns, query):
+    if 'q' in query:
+        if table not in indexes.SEARCH_COLUMNS:
+            raise HTTPError(400, 'These records cannot be searched')
+        if len(query['q'].strip()) < config.search_min_length:
+            raise HTTPError(400, f'q must have at least {config.search_min_length} characters')
+        limit = _query_int(query, 'limit', config.search_result_limit, 1, config.api_page_size)
+        return {'records': _records(fields, search.search_records(table, query['q'], columns, limit))}
+    limit = _query_int(query, 'limit', config.api_page_size, 1, config.api_page_size)
+    where = params = None
+    if 'min_age' in query or 'max_age' in query:
+        if table not in AGE_FILTERED_TABLES:
+            raise HTTPError(400, 'These records cannot be filtered by age')
+        where, params = services.age_range(query.get('min_age'), query.get('max_age'))
+    rows, _, has_next = db.fetch_page(table, limit, after_id=query.get('after'), columns=columns, where=where,
+                                      params=params)
+    return {'records': _records(fields, rows), 'next_after': rows[-1][0] if has_next else None}
+
+def _timeline(patient_id, query):
+    before = None
+    if 'before_id' in query or 'before_time' in query:
+        if 'before_id' not in query or 'before_time' not in query:
+            raise HTTPError(400, 'before_time and before_id must be given together')
+        before_time = query['before_time']
+        if before_time != '-infinity':
+            try:
+                before_time = datetime.fromisoformat(before_time)
+            except ValueError:
+                raise HTTPError(400, 'before_time must be a date and time or -infinity') from None
+        before = before_time, query['before_id']
+    limit = _query_int(query, 'limit', config.timeline_page_size, 1, config.api_page_size)
+    summary, events, has_more = timeline.fetch_timeline(patient_id, limit, before)
+    if summary is None:
+        raise HTTPError(404, 'Invalid Patient ID')
+    last_time = events[-1][0] if events else None
+    return {
+        'patient': dict(zip(TIMELINE_SUMMARY_FIELDS, summary)),
+        'events': [dict(zip(TIMELINE_EVENT_FIELDS, (None if e[0] == datetime.min else e[0],) + e[1:])) for e in events],
+        # pass these back as before_time and before_id to get the next (older) page
+        'next_before': {
+            'before_time': '-infinity' if last_time == datetime.min else last_time, 'before_id': events[-1][2]
+        } if has_more else None
+    }
+
+# function to answer a request: returns (status, JSON payload or None)
+def route(method, parts, query, body, headers):
+    _require(headers, 'app')
+    if len(parts) == 3 and parts[0] == 'medicines' and parts[2] == 'patients':
+        if method != 'GET':
+            raise HTTPError(405, 'Method not allowed')
+        _require(headers, 'access')
+        rows = services.patients_prescribed(parts[1], _query_date(query, 'since'), _query_date(query, 'until'))
+        return 200, {'patients': _records(RECALL_FIELDS, rows)}
+    if not parts or parts[0] not in RESOURCES or len(parts) > 3:
+        raise HTTPError(404, 'Not found')
+
+    table, fields, columns, add, update, delete, get, writer = RESOURCES[parts[0]]
+    if len(parts) == 1:
+        if method == 'GET':
+            return 200, _list(table, fields, columns, query)
+        if method == 'POST':
+            _require(headers, writer)
+            return 201, {'id': add(body)}
+    elif len(parts) == 2:
+        record_id = parts[1]
+        if method == 'GET':
+            row = get(record_id)
+            if row is None:
+                raise HTTPError(404, f'Invalid {services.RECORD_NAMES[table]} ID')
+            return 200, dict(zip(fields, row))
+        if method == 'PATCH':
+            _require(headers, writer)
+            update(record_id, body)
+            return 200, {'id': record_id}
+        if method == 'DELETE':
+            _require(headers, writer)
+            delete(record_id)
+            return 204, None
+    else:
+        record_id, related = parts[1], parts[2]
+        if (parts[0], related) == ('patients', 'prescriptions'):
+            _require_record(table, record_id)
+            return 200, {'records': _records(services.PRESCRIPTION_FIELDS, services.prescriptions_of_patient(record_id))}
+        if (parts[0], related) == ('patients', 'medical-tests'):
+            _require_record(table, record_id)
+            return 200, {'records': _records(services.MEDICAL_TEST_FIELDS, services.medical_tests_of_patient(record_id))}
+        if (parts[0], related) == ('patients', 'timeline'):
+            return 200, _timeline(record_id, query)
+        if (parts[0], related) == ('departments', 'doctors'):
+            _require_record(table, record_id)
+            return 200, {'records': _records(DOCTOR_LIST_FIELDS, services.doctors_in_department(record_id))}
+        raise HTTPError(404, 'Not found')
+    raise HTTPError(405, 'Method not allowed')
+
+# class handling the API's HTTP requests, one thread per connection
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'       # keep connections open, so clients do not reconnect for every request
+    disable_nagle_algorithm = True      # send each response at once (headers and body are written separately)
+    server_version = 'HIMS-API'
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def _read_body(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            raise HTTPError(400, 'Invalid Content-Length') from None
+        if length < 0:
+            raise HTTPError(400, 'Invalid Content-Length')
+        if length > MAX_BODY_SIZE:
+            raise HTTPError(413, 'Request body too large')
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            raise HTTPError(400, 'Request body must be JSON') from None
+        if not isinstance(body, dict):
+            raise HTTPError(400, 'Request body must be a JSON object')
+        return body
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.split('/') if part]
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            body = self._read_body() if method in ('POST', 'PATCH') else None
+            with db.unit_of_work():     # one connection and transaction per request
+                status, payload = route(method, parts, query, body, self.headers)
+        except HTTPError as e:
+            status, payload = e.status, {'error': str(e)}
+        except services.ValidationError as e:
+            status, payload = 400, {'error': str(e)}
+        except services.NotFound as e:
+            status, payload = 404, {'error': str(e)}
+        except services.Conflict as e:
+            status, payload = 409, {'error': str(e)}
+        except Exception as e:
+            self.log_error('Error handling %s %s: %r', method, self.path, e)
+            status, payload = 500, {'error': 'Internal server error'}
+        self._send(status, payload)
+
+    def _send(self, status, payload):
+        data = b'' if payload is None else json.dumps(payload, default=_json_value).encode()
+        self.send_response(status)
+        if payload is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+# running this module directly serves the API until interrupted
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the HIMS records as a JSON API.')
+    parser.add_argument('--host', default=config.api_host)
+    parser.add_argument('--port', type=int, default=config.api_port)
+    args = parser.parse_args()
+
+    db.db_init()
+    changes.start_listener()
+    server = ThreadingHTTPServer((args.host, args.port), RequestHandler)
+    print(f'Serving the HIMS API on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
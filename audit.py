@@ -0,0 +1,186 @@
+import argparse
+from datetime import datetime
+import streamlit as st
+import pandas as pd
+import config
+import database as db
+import ids
+import services
+import utils
+
+# Data quality audit: scans a record table in chunks of config.audit_chunk_size rows (in ID order, with
+# keyset pagination) and checks every row with the batch validators in utils, the same rules the forms and
+# the bulk import apply. Finds records that were written before a rule existed or behind the app's back. IDs
+# generated before the sequence-based IDs (SSMMHH-YYMMDD, see utils.LEGACY_ID_REGEX) are valid.
+
+def _id_check(column, table):
+    return lambda frame: utils.invalid_id_formats(frame[column], ids.ID_PREFIXES[table], allow_legacy=True)
+
+def _number_check(column):
+    return lambda frame: utils.invalid_numbers(frame[column], *services.NUMBER_RANGES[column])
+
+def _future_check(column):
+    return lambda frame: pd.to_datetime(frame[column], errors='coerce') > pd.Timestamp(datetime.now())
+
+def _blank_check(column):
+    return lambda frame: utils.blank_values(frame[column])
+
+def _phone_check(column, required=True):
+    return lambda frame: utils.invalid_phone_numbers(frame[column], required)
+
+def _email_check(column, required=False):
+    return lambda frame: utils.invalid_emails(frame[column], required)
+
+# checks of each table: (column reported, check, problem); a check takes a chunk of rows as a DataFrame and
+# returns the mask of the rows that fail it
+AUDIT_RULES = {
+    'patient_record': [
+        ('id', _id_check('id', 'patient_record'), 'malformed Patient ID'),
+        ('name', _blank_check('name'), 'name is blank'),
+        ('date_of_birth', _future_check('date_of_birth'), 'date of birth is in the future'),
+        ('contact_number_1', _phone_check('contact_number_1'), 'invalid contact number'),
+        ('contact_number_2', _phone_check('contact_number_2', required=False), 'invalid alternate contact number'),
+        ('next_of_kin_contact_number', _phone_check('next_of_kin_contact_number'), "invalid next of kin's contact number"),
+        ('email_id', _email_check('email_id'), 'invalid email'),
+        ('weight', _number_check('weight'), 'weight out of range'),
+        ('height', _number_check('height'), 'height out of range'),
+    ],
+    'doctor_record': [
+        ('id', _id_check('id', 'doctor_record'), 'malformed Doctor ID'),
+        ('name', _blank_check('name'), 'name is blank'),
+        ('date_of_birth', _future_check('date_of_birth'), 'date of birth is in the future'),
+        ('department_id', _id_check('department_id', 'department_record'), 'malformed Department ID'),
+        ('contact_number_1', _phone_check('contact_number_1'), 'invalid contact number'),
+        ('contact_number_2', _phone_check('contact_number_2', required=False), 'invalid alternate contact number'),
+        ('email_id', _email_check('email_id', required=True), 'invalid email'),
+        ('years_of_experience', _number_check('years_of_experience'), 'years of experience out of range'),
+    ],
+    'department_record': [
+        ('id', _id_check('id', 'department_record'), 'malformed Department ID'),
+        ('name', _blank_check('name'), 'name is blank'),
+        ('contact_number_1', _phone_check('contact_number_1'), 'invalid contact number'),
+        ('contact_number_2', _phone_check('contact_number_2', required=False), 'invalid alternate contact number'),
+        ('email_id', _email_check('email_id', required=True), 'invalid email'),
+    ],
+    'prescription_record': [
+        ('id', _id_check('id', 'prescription_record'), 'malformed Prescription ID'),
+        ('patient_id', _id_check('patient_id', 'patient_record'), 'malformed Patient ID'),
+        ('doctor_id', _id_check('doctor_id', 'doctor_record'), 'malformed Doctor ID'),
+        ('diagnosis', _blank_check('diagnosis'), 'diagnosis is blank'),
+        ('prescribed_at', _future_check('prescribed_at'), 'prescribed in the future'),
+    ],
+    'medical_test_record': [
+        ('id', _id_check('id', 'medical_test_record'), 'malformed Medical Test ID'),
+        ('patient_id', _id_check('patient_id', 'patient_record'), 'malformed Patient ID'),
+        ('doctor_id', _id_check('doctor_id', 'doctor_record'), 'malformed Doctor ID'),
+        ('test_name', _blank_check('test_name'), 'test name is blank'),
+        ('cost', _number_check('cost'), 'cost out of range'),
+        ('result_date_time', lambda frame: pd.to_datetime(frame['result_date_time'], errors='coerce')
+                                   < pd.to_datetime(frame['test_date_time'], errors='coerce'),
+         'result dated before the test'),
+    ],
+}
+
+# record type names shown on the audit screen
+AUDIT_TABLES = {
+    'Patients': 'patient_record', 'Doctors': 'doctor_record', 'Departments': 'department_record',
+    'Prescriptions': 'prescription_record', 'Medical Tests': 'medical_test_record'
+}
+ISSUE_COLUMNS = ['id', 'column', 'problem', 'value']
+
+# function to get the columns a table's audit reads (the id first, as fetch_page needs)
+def audit_columns(table):
+    columns = {'id': None}
+    for column, _, _ in AUDIT_RULES[table]:
+        columns[column] = None
+    if table == 'medical_test_record':
+        columns['test_date_time'] = None
+    return list(columns)
+
+# function to check a chunk of rows: returns a DataFrame of masks, one boolean column per problem, aligned
+# with the rows
+def problem_masks(table, frame):
+    return pd.DataFrame({problem: check(frame) for _, check, problem in AUDIT_RULES[table]}, index=frame.index)
+
+# function to list the problems found in a chunk of rows, one row per (record, problem)
+def find_problems(table, frame):
+    masks = problem_masks(table, frame)
+    issues = [
+        pd.DataFrame({'id': frame.loc[masks[problem], 'id'], 'column': column, 'problem': problem,
+                      'value': frame.loc[masks[problem], column].astype(str)})
+        for column, _, problem in AUDIT_RULES[table] if masks[problem].any()
+    ]
+    return pd.concat(issues, ignore_index=True) if issues else pd.DataFrame(columns=ISSUE_COLUMNS)
+
+# function to scan a whole table chunk by chunk; yields (rows checked in the chunk, problems found in it)
+def audit_table(table, chunk_size=None):
+    columns = audit_columns(table)
+    after_id = None
+    while True:
+        rows, _, has_next = db.fetch_page(table, chunk_size or config.audit_chunk_size, after_id=after_id,
+                                          columns=', '.join(columns))
+        frame = pd.DataFrame(rows, columns=columns)
+        yield len(frame), find_problems(table, frame)
+        if not has_next:
+            return
+        after_id = rows[-1][0]
+
+# function to get the planner's estimate of a table's rows (cheap; used for the progress bar)
+def estimated_rows(table):
+    with db.session() as (conn, c):
+        c.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass;", (table,))
+        return max(c.fetchone()[0], 0)
+
+# function to show the data quality audit screen: scans the chosen table and reports the problems found
+def audit_screen():
+    records = st.selectbox('Records to audit', list(AUDIT_TABLES))
+    table = AUDIT_TABLES[records]
+    st.caption('Checks: ' + '; '.join(problem for _, _, problem in AUDIT_RULES[table]))
+    if not st.button('Run audit'):
+        return
+    progress = st.progress(0.0, text='Scanning...')
+    total = estimated_rows(table)
+    checked, counts, issues, kept = 0, pd.Series(dtype='int64'), [], 0
+    try:
+        for rows, problems in audit_table(table):
+            checked += rows
+            counts = counts.add(problems['problem'].value_counts(), fill_value=0)
+            if kept < config.audit_issue_limit and not problems.empty:
+                issues.append(problems.head(config.audit_issue_limit - kept))
+                kept += len(issues[-1])
+            progress.progress(min(checked / total, 1.0) if total else 1.0, text=f'{checked} records checked')
+    except Exception as e:
+        st.error(f'Error auditing {records.lower()}: {e}')
+        return
+    progress.empty()
+
+    if counts.empty:
+        st.success(f'No problems found in {checked} records.')
+        return
+    st.warning(f'{int(counts.sum())} problems found in {checked} records.')
+    st.dataframe(counts.astype(int).rename('Records').rename_axis('Problem').sort_values(ascending=False))
+    issues = pd.concat(issues, ignore_index=True)
+    if kept < counts.sum():
+        st.info(f'Showing the first {kept} problems.')
+    st.dataframe(issues)
+    st.download_button('Download problems (CSV)', issues.to_csv(index=False), f'{table}_audit.csv', 'text/csv')
+
+# running this module directly audits the given tables (default: all) and prints the problems per table
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the HIMS records against the validation rules.')
+    parser.add_argument('tables', nargs='*', metavar='table', help=f"tables to audit: {', '.join(AUDIT_RULES)}")
+    parser.add_argument('--chunk-size', type=int, default=config.audit_chunk_size)
+    args = parser.parse_args()
+    unknown = set(args.tables) - set(AUDIT_RULES)
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(sorted(unknown))}")
+
+    db.db_init()
+    for table in args.tables or AUDIT_RULES:
+        checked, counts = 0, pd.Series(dtype='int64')
+        for rows, problems in audit_table(table, args.chunk_size):
+            checked += rows
+            counts = counts.add(problems['problem'].value_counts(), fill_value=0)
+        print(f'{table}: {checked} records checked, {int(counts.sum())} problems')
+        for problem, count in counts.sort_values(ascending=False).items():
+            print(f'  {problem}: {int(count)}')
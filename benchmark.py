@@ -0,0 +1,309 @@
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timezone
+import psycopg2 as sql
+from psycopg2.sql import SQL, Identifier
+import config
+import datagen
+import database as db
+import department
+import doctor
+import ids
+import patient
+import prescription
+import medical_test
+import search
+import services
+import timeline
+
+# Benchmarks of the app's create/read/update/delete and query paths, run headlessly against a database seeded
+# with synthetic records at a chosen scale. Results are written as JSON with stable operation names, so runs
+# at the same scale and seed can be compared (see --compare). The seeded database is wiped on every reseed,
+# so it must not be the app's own database.
+
+# named scales (number of patients); any other number of patients can be given too
+SCALES = {'10k': 10_000, '100k': 100_000, '1M': 1_000_000}
+
+# name prefixes of the operations that write
+WRITE_OPERATIONS = ('add_', 'update_', 'delete_')
+
+# date the seeded records end at (fixed, so reseeding on another day gives the same records)
+SEED_AS_OF = date(2026, 1, 1)
+
+# function to create the benchmark database if it does not exist yet
+def create_database(name):
+    conn = sql.connect(host=config.db_host, port=config.db_port, user=config.db_user, password=config.password,
+                       database='postgres')
+    try:
+        conn.autocommit = True      # CREATE DATABASE cannot run inside a transaction
+        with conn.cursor() as c:
+            c.execute("SELECT 1 FROM pg_database WHERE datname = %s;", (name,))
+            if c.fetchone() is None:
+                c.execute(SQL("CREATE DATABASE {};").format(Identifier(name)))
+    finally:
+        conn.close()
+
+# function to work out how many records of each table a scale seeds
+def table_sizes(patients):
+    return datagen.table_sizes(patients)
+
+# function to check whether the database already holds the records of a scale
+def is_seeded(patients):
+    with db.session() as (conn, c):
+        counts = {}
+        for table in table_sizes(patients):
+            c.execute(f"SELECT count(*) FROM {table};")
+            counts[table] = c.fetchone()[0]
+    return counts == table_sizes(patients)
+
+# function to replace the records of the benchmark database with synthetic ones (see datagen.py); the same
+# seed always produces the same records
+def seed(patients, seed_value):
+    datagen.truncate()
+    datagen.generate(table_sizes(patients), seed_value, SEED_AS_OF)
+
+# function to summarise a list of durations (in seconds) in milliseconds
+def summarise(durations):
+    ms = sorted(d * 1000 for d in durations)
+    cuts = statistics.quantiles(ms, n=100, method='inclusive') if len(ms) > 1 else ms * 99
+    return {
+        'n': len(ms), 'mean_ms': round(statistics.fmean(ms), 3), 'p50_ms': round(cuts[49], 3),
+        'p95_ms': round(cuts[94], 3), 'p99_ms': round(cuts[98], 3), 'min_ms': round(ms[0], 3),
+        'max_ms': round(ms[-1], 3)
+    }
+
+# function to time one operation once per argument tuple, after untimed warm-up calls with other arguments;
+# the app's in-process lookup and result caches are emptied before every timed call, so the times are those
+# of the database work rather than of cache hits (the sampled IDs repeat, e.g. of the few departments)
+def time_operation(function, calls, warmup_calls=()):
+    for args in warmup_calls:
+        if args not in calls:
+            function(*args)
+    durations = []
+    for args in calls:
+        db.clear_caches()
+        start = time.perf_counter()
+        function(*args)
+        durations.append(time.perf_counter() - start)
+    return summarise(durations)
+
+def _patient_details(token, n):
+    return {
+        'name': f'Bench Patient {n}', 'gender': 'Female', 'date_of_birth': date(1985, 6, 15), 'blood_group': 'O+',
+        'contact_number_1': '9876543210', 'aadhar_or_voter_id': f'BENCH-{token}-{n}', 'weight': 60, 'height': 165,
+        'address': 'Benchmark Road', 'city': 'Pune', 'state': 'Maharashtra', 'pin_code': '411001',
+        'next_of_kin_name': 'Kin', 'next_of_kin_relation_to_patient': 'Sister', 'next_of_kin_contact_number': '9876500000'
+    }
+
+def _doctor_details(token, n, department_id):
+    return {
+        'name': f'Dr Bench {n}', 'gender': 'Male', 'date_of_birth': date(1975, 1, 1), 'blood_group': 'A+',
+        'department_id': department_id, 'contact_number_1': '9876543211', 'aadhar_or_voter_id': f'BENCH-DR-{token}-{n}',
+        'email_id': f'bench{token}.{n}@hospital.example', 'qualification': 'MBBS', 'specialisation': 'General',
+        'years_of_experience': 10, 'address': 'Benchmark Road', 'city': 'Pune', 'state': 'Maharashtra',
+        'pin_code': '411001'
+    }
+
+def _department_details(token, n):
+    return {
+        'name': f'Bench Department {token}-{n}', 'description': 'Benchmark', 'contact_number_1': '9876543212',
+        'address': 'Benchmark Block', 'email_id': f'bench-department{token}.{n}@hospital.example'
+    }
+
+# function to build the benchmarked operations: (module, operation, function, list of argument tuples). Reads
+# use records sampled at random (with the run's seed); writes add records and then update and delete them
+def operations(patients, iterations, rng):
+    sizes = table_sizes(patients)
+    token = int(time.time())
+
+    def sample(table, count=iterations):
+        return [(ids.format_id(table, rng.randint(1, sizes[table])),) for _ in range(count)]
+
+    def searches(words):
+        return [(rng.choice(words)[:rng.randint(3, 6)],) for _ in range(iterations)]
+
+    def page(table, columns):
+        return lambda after_id: db.fetch_page(table, 25, after_id=after_id, columns=columns)
+
+    def page_of_ages(table, columns):
+        def fetch(youngest):
+            where, params = services.age_range(youngest, youngest + 9)
+            return db.fetch_page(table, 25, columns=columns, where=where, params=params)
+        return fetch
+
+    def search_in(table, columns):
+        return lambda text: search.search_records(table, text, columns)
+
+    added = {table: [] for table in sizes}
+
+    def add(table, function):
+        return lambda *args: added[table].append(function(*args))
+
+    def pop(table, function):
+        return lambda *args: function(added[table].pop(), *args)
+
+    def use_added(table, function):
+        return lambda i, *args: function(added[table][i], *args)
+
+    names = datagen.MALE_FIRST_NAMES + datagen.FEMALE_FIRST_NAMES + datagen.LAST_NAMES
+    dosages = list(datagen.DOSAGES)
+    patient_ids = sample('patient_record')
+    doctor_ids = sample('doctor_record')
+    department_ids = sample('department_record')
+    writes = range(iterations)
+    medicines = [{'medicine_name': rng.choice(datagen.MEDICINES), 'dosage_description': rng.choice(dosages)}]
+    return [
+        ('patient', 'verify_patient_id', patient.verify_patient_id, patient_ids),
+        ('patient', 'get_patient', services.get_patient, sample('patient_record')),
+        ('patient', 'show_all_patients (page after an ID)', page('patient_record', services.PATIENT_COLUMNS), patient_ids),
+        ('patient', 'show_all_patients (first page of a 10 year age band)',
+         page_of_ages('patient_record', services.PATIENT_COLUMNS), [(n % 80,) for n in range(iterations)]),
+        ('patient', 'search_patient', search_in('patient_record', services.PATIENT_COLUMNS), searches(names)),
+        ('patient', 'show_patient_timeline', lambda i: timeline.fetch_timeline(i, config.timeline_page_size), patient_ids),
+        ('patient', 'add_patient', add('patient_record', services.add_patient),
+         [(_patient_details(token, n),) for n in writes]),
+        ('patient', 'update_patient', use_added('patient_record', services.update_patient),
+         [(n, {'city': 'Mumbai', 'contact_number_1': '9123456789'}) for n in writes]),
+
+        ('doctor', 'verify_doctor_id', doctor.verify_doctor_id, doctor_ids),
+        ('doctor', 'get_doctor', services.get_doctor, sample('doctor_record')),
+        ('doctor', 'show_all_doctors (page after an ID)', page('doctor_record', services.DOCTOR_COLUMNS), doctor_ids),
+        ('doctor', 'search_doctor', search_in('doctor_record', services.DOCTOR_COLUMNS), searches(names)),
+        ('doctor', 'add_doctor', add('doctor_record', services.add_doctor),
+         [(_doctor_details(token, n, department_ids[n][0]),) for n in writes]),
+        ('doctor', 'update_doctor', use_added('doctor_record', services.update_doctor),
+         [(n, {'city': 'Mumbai', 'department_id': department_ids[-n - 1][0]}) for n in writes]),
+
+        ('department', 'verify_department_id', department.verify_department_id, department_ids),
+        ('department', 'get_department', services.get_department, department_ids),
+        ('department', 'show_all_departments (first page)', page('department_record', services.DEPARTMENT_COLUMNS),
+         [(None,)] * iterations),
+        ('department', 'search_department', search_in('department_record', services.DEPARTMENT_COLUMNS),
+         searches([name for name, _, _ in datagen.DEPARTMENTS])),
+        ('department', 'list_dept_doctors', services.doctors_in_department, department_ids),
+        ('department', 'add_department', add('department_record', services.add_department),
+         [(_department_details(token, n),) for n in writes]),
+        ('department', 'update_department', use_added('department_record', services.update_department),
+         [(n, {'description': 'Updated by the benchmark'}) for n in writes]),
+
+        ('prescription', 'verify_prescription_id', prescription.verify_prescription_id, sample('prescription_record')),
+        ('prescription', 'get_prescription', services.get_prescription, sample('prescription_record')),
+        ('prescription', 'prescriptions_by_patient', services.prescriptions_of_patient, sample('patient_record')),
+        ('prescription', 'drug_recall', services.patients_prescribed,
+         [(rng.choice(datagen.MEDICINES),) for _ in range(max(1, iterations // 10))]),
+        ('prescription', 'add_prescription', add('prescription_record', services.add_prescription),
+         [({'patient_id': patient_ids[n][0], 'doctor_id': doctor_ids[n][0], 'diagnosis': 'Benchmark',
+            'medicines': medicines},) for n in writes]),
+        ('prescription', 'update_prescription', use_added('prescription_record', services.update_prescription),
+         [(n, {'diagnosis': 'Benchmark, updated', 'medicines': medicines * 2}) for n in writes]),
+
+        ('medical_test', 'verify_medical_test_id', medical_test.verify_medical_test_id, sample('medical_test_record')),
+        ('medical_test', 'get_medical_test', services.get_medical_test, sample('medical_test_record')),
+        ('medical_test', 'medical_tests_by_patient', services.medical_tests_of_patient, sample('patient_record')),
+        ('medical_test', 'add_medical_test', add('medical_test_record', services.add_medical_test),
+         [({'test_name': 'ECG', 'patient_id': patient_ids[n][0], 'doctor_id': doctor_ids[n][0],
+            'medical_lab_scientist_id': 'MLS-1', 'test_date_time': datetime(2026, 1, 1, 10),
+            'result_date_time': datetime(2026, 1, 1, 12), 'cost': 250},) for n in writes]),
+        ('medical_test', 'update_medical_test', use_added('medical_test_record', services.update_medical_test),
+         [(n, {'result_and_diagnosis': 'Normal'}) for n in writes]),
+
+        # the added records are deleted last, dependent records first
+        ('medical_test', 'delete_medical_test', pop('medical_test_record', services.delete_medical_test), [()] * iterations),
+        ('prescription', 'delete_prescription', pop('prescription_record', services.delete_prescription), [()] * iterations),
+        ('patient', 'delete_patient', pop('patient_record', services.delete_patient), [()] * iterations),
+        ('doctor', 'delete_doctor', pop('doctor_record', services.delete_doctor), [()] * iterations),
+        ('department', 'delete_department', pop('department_record', services.delete_department), [()] * iterations),
+    ]
+
+# function to describe the run (so results are only compared with runs of the same scale and seed)
+def run_metadata(patients, seed_value, iterations, database):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    with db.session() as (conn, c):
+        c.execute("SHOW server_version;")
+        server_version = c.fetchone()[0]
+    return {
+        'patients': patients, 'table_sizes': table_sizes(patients), 'seed': seed_value, 'iterations': iterations,
+        'database': database, 'postgres': server_version, 'python': platform.python_version(),
+        'commit': commit, 'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds')
+    }
+
+# function to compare the median times of two runs; returns (rows, regressions) where a regression is an
+# operation whose median time grew by more than threshold (a fraction)
+def compare(baseline, results, threshold):
+    before = {(r['module'], r['operation']): r for r in baseline['results']}
+    rows, regressions = [], []
+    for result in results['results']:
+        old = before.get((result['module'], result['operation']))
+        if old is None:
+            continue
+        change = result['p50_ms'] / old['p50_ms'] - 1 if old['p50_ms'] else 0.0
+        rows.append((f"{result['module']}.{result['operation']}", old['p50_ms'], result['p50_ms'], change))
+        if change > threshold:
+            regressions.append(rows[-1])
+    return rows, regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the HIMS operations on a seeded database.')
+    parser.add_argument('--scale', default='10k', help=f'number of patients, or one of {", ".join(SCALES)}')
+    parser.add_argument('--database', default=config.benchmark_database, help='database to seed and benchmark')
+    parser.add_argument('--seed', type=int, default=42, help='seed for the generated records and the sampled inputs')
+    parser.add_argument('--iterations', type=int, default=200, help='timed calls per operation')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed calls before each operation is timed')
+    parser.add_argument('--reseed', action='store_true', help='regenerate the records even if the scale matches')
+    parser.add_argument('--output', help='write the JSON results to this file (default: standard output)')
+    parser.add_argument('--compare', metavar='BASELINE', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='slowdown of the median time reported as a regression (default 0.2, i.e. 20%%)')
+    args = parser.parse_args()
+
+    patients = SCALES.get(args.scale) or int(args.scale)
+    if args.database == config.db_database:
+        sys.exit('Refusing to seed the app database; choose another --database')
+    create_database(args.database)
+    config.db_database = args.database      # every connection of this process goes to the benchmark database
+    db.db_init()
+    if args.reseed or not is_seeded(patients):
+        print(f'Seeding {args.database} with {patients} patients...', file=sys.stderr)
+        start = time.perf_counter()
+        seed(patients, args.seed)
+        print(f'Seeded in {time.perf_counter() - start:.1f} s', file=sys.stderr)
+
+    results = {'meta': run_metadata(patients, args.seed, args.iterations, args.database), 'results': []}
+    # the warm-up calls sample their own records (with another seed), so the timed calls are not warmed up by them
+    warmups = {(module, operation): calls
+               for module, operation, _, calls in operations(patients, args.warmup, random.Random(args.seed + 1))}
+    for module, operation, function, calls in operations(patients, args.iterations, random.Random(args.seed)):
+        # writes are not warmed up: each call adds, changes or deletes one of the benchmark's own records
+        summary = time_operation(function, calls,
+                                 () if operation.startswith(WRITE_OPERATIONS) else warmups[module, operation])
+        results['results'].append({'module': module, 'operation': operation, **summary})
+        print(f'{module}.{operation}: p50 {summary["p50_ms"]} ms, p95 {summary["p95_ms"]} ms', file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if (baseline['meta']['patients'], baseline['meta']['seed']) != (patients, args.seed):
+            print('Warning: the baseline was run at another scale or seed', file=sys.stderr)
+        rows, regressions = compare(baseline, results, args.threshold)
+        for name, old, new, change in rows:
+            flag = '  REGRESSION' if change > args.threshold else ''
+            print(f'{name}: {old} -> {new} ms ({change:+.0%}){flag}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,161 @@
+import argparse
+import io
+from datetime import datetime
+import pandas as pd
+import psycopg2 as sql
+import config
+import database as db
+import ids
+import utils
+
+# columns an import file must have (one patient per row); date_of_birth may be YYYY-MM-DD or DD-MM-YYYY
+REQUIRED_COLUMNS = [
+    'name', 'gender', 'date_of_birth', 'blood_group', 'contact_number_1', 'aadhar_or_voter_id',
+    'weight', 'height', 'address', 'city', 'state', 'pin_code', 'next_of_kin_name',
+    'next_of_kin_relation_to_patient', 'next_of_kin_contact_number'
+]
+OPTIONAL_COLUMNS = ['contact_number_2', 'email_id']
+TEXT_COLUMNS = [col for col in REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+                if col not in ('date_of_birth', 'weight', 'height')]
+
+# columns of patient_record written by COPY, in the order they appear in the generated CSV
+COPY_COLUMNS = [
+    'id', 'name', 'gender', 'date_of_birth', 'blood_group', 'contact_number_1', 'contact_number_2',
+    'aadhar_or_voter_id', 'weight', 'height', 'address', 'city', 'state', 'pin_code', 'next_of_kin_name',
+    'next_of_kin_relation_to_patient', 'next_of_kin_contact_number', 'email_id',
+    'date_of_registration', 'time_of_registration'
+]
+
+# same limits as the Add patient form
+WEIGHT_RANGE = (0, 400)
+HEIGHT_RANGE = (0, 275)
+
+# function to read an uploaded CSV/Excel file in chunks of config.import_chunk_size rows, all values as
+# text; a 'row' column holds each record's line number in the file (the header is line 1)
+def read_patient_file(source, file_name):
+    if file_name.lower().endswith(('.xlsx', '.xls')):
+        sheet = pd.read_excel(source, dtype=str, keep_default_na=False)
+        chunks = (sheet.iloc[i:i + config.import_chunk_size]
+                  for i in range(0, len(sheet), config.import_chunk_size))
+    else:
+        chunks = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=config.import_chunk_size)
+    first_row = 2
+    for chunk in chunks:
+        chunk = chunk.reset_index(drop=True)
+        chunk.columns = [str(col).strip().lower() for col in chunk.columns]
+        chunk.insert(0, 'row', range(first_row, first_row + len(chunk)))
+        first_row += len(chunk)
+        yield chunk
+
+def _parse_dates(values):
+    iso = pd.to_datetime(values, format='%Y-%m-%d', errors='coerce')
+    day_first = pd.to_datetime(values, format='%d-%m-%Y', errors='coerce')
+    return iso.fillna(day_first)
+
+# function to validate a chunk of patient rows column by column (same rules as the Add patient form);
+# returns the accepted rows, cleaned and typed, and a reject report with the reasons for every other row
+def validate_patients(frame, today):
+    missing = [col for col in REQUIRED_COLUMNS if col not in frame.columns]
+    if missing:
+        raise ValueError(f'Missing columns: {", ".join(missing)}')
+    frame = frame.copy()
+    for col in OPTIONAL_COLUMNS:
+        if col not in frame.columns:
+            frame[col] = ''
+    for col in TEXT_COLUMNS:
+        frame[col] = frame[col].astype(str).str.strip().str.slice(0, utils.MAX_TEXT_LENGTH)
+
+    dob = _parse_dates(frame['date_of_birth'].astype(str).str.strip())
+    weight = pd.to_numeric(frame['weight'], errors='coerce')
+    height = pd.to_numeric(frame['height'], errors='coerce')
+
+    problems = [(frame[col] == '', f'{col} is required') for col in REQUIRED_COLUMNS if col in TEXT_COLUMNS]
+    problems += [
+        (utils.invalid_phone_numbers(frame['contact_number_1']), 'invalid contact number format'),
+        (utils.invalid_phone_numbers(frame['contact_number_2']), 'invalid alternate contact number format'),
+        (utils.invalid_emails(frame['email_id']), 'invalid email format'),
+        (dob.isna(), 'invalid date of birth'),
+        (dob > pd.Timestamp(today), 'date of birth is in the future'),
+        (utils.invalid_numbers(weight, *WEIGHT_RANGE), 'invalid weight'),
+        (utils.invalid_numbers(height, *HEIGHT_RANGE), 'invalid height'),
+        ((frame['aadhar_or_voter_id'] != '') & frame['aadhar_or_voter_id'].duplicated(),
+         'Aadhar ID / Voter ID repeated in the file'),
+    ]
+    reasons = pd.Series('', index=frame.index)
+    for mask, reason in problems:
+        reasons = reasons.where(~mask, reasons + reason + '; ')
+    rejected = reasons != ''
+
+    rejects = pd.DataFrame({'row': frame.loc[rejected, 'row'], 'reason': reasons[rejected].str.rstrip('; ')})
+    accepted = frame.loc[~rejected].copy()
+    accepted['date_of_birth'] = dob[~rejected].dt.date
+    accepted['weight'] = weight[~rejected].astype(int)
+    accepted['height'] = height[~rejected].astype(int)
+    for col in OPTIONAL_COLUMNS:
+        accepted[col] = accepted[col].where(accepted[col] != '', None)
+    return accepted, rejects
+
+def _registered_uids(c, uids):
+    c.execute(
+        "SELECT aadhar_or_voter_id FROM patient_record WHERE aadhar_or_voter_id = ANY(%(uids)s);",
+        {'uids': list(uids)}
+    )
+    return {row[0] for row in c.fetchall()}
+
+# function to stream accepted rows into patient_record with COPY FROM STDIN
+def copy_patients(c, accepted):
+    buffer = io.StringIO()
+    accepted[COPY_COLUMNS].to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    c.copy_expert(f"COPY patient_record ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv);", buffer)
+
+# function to import every patient in a CSV/Excel file; each chunk is validated, given IDs and copied in its
+# own transaction. Returns (imported rows with their new Patient IDs, reject report)
+def import_patients(source, file_name):
+    now = datetime.now().replace(microsecond=0)
+    imported, rejects = [], []
+    for frame in read_patient_file(source, file_name):
+        accepted, rejected = validate_patients(frame, now.date())
+        rejects.append(rejected)
+        if accepted.empty:
+            continue
+        try:
+            with db.session(own_transaction=True) as (conn, c):
+                registered = accepted['aadhar_or_voter_id'].isin(_registered_uids(c, accepted['aadhar_or_voter_id']))
+                rejects.append(pd.DataFrame({
+                    'row': accepted.loc[registered, 'row'],
+                    'reason': 'Aadhar ID / Voter ID is already registered'
+                }))
+                accepted = accepted.loc[~registered].copy()
+                if accepted.empty:
+                    continue
+                accepted['id'] = ids.reserve_ids('patient_record', len(accepted))
+                accepted['date_of_registration'] = now.date()
+                accepted['time_of_registration'] = now.time()
+                copy_patients(c, accepted)
+            db.tables_changed('patient_record', own_transaction=True)
+            imported.append(accepted[['row', 'id', 'name']])
+        except sql.Error as e:
+            rejects.append(pd.DataFrame({'row': accepted['row'], 'reason': f'Not imported: {e}'.strip()}))
+
+    imported = pd.concat(imported, ignore_index=True) if imported else pd.DataFrame(columns=['row', 'id', 'name'])
+    rejects = [r for r in rejects if not r.empty]
+    rejects = (pd.concat(rejects).sort_values('row', ignore_index=True) if rejects
+               else pd.DataFrame(columns=['row', 'reason']))
+    return imported, rejects
+
+# headless entry point, e.g. python bulk_import.py new_patients.csv --rejects rejects.csv
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk import patients from a CSV or Excel file.')
+    parser.add_argument('file', help='CSV or Excel file with one patient per row')
+    parser.add_argument('--rejects', help='write the reject report to this CSV file instead of printing it')
+    args = parser.parse_args()
+
+    db.db_init()
+    with open(args.file, 'rb') as source:
+        imported, rejects = import_patients(source, args.file)
+    print(f'{len(imported)} patients imported, {len(rejects)} rows rejected')
+    if args.rejects:
+        rejects.to_csv(args.rejects, index=False)
+    elif len(rejects):
+        print(rejects.to_string(index=False))
@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()      # returned by LRUCache.get when a key is not cached (None is a valid cached value)
+
+# bounded, thread-safe in-process cache: the least recently used entry is dropped once max_size entries are
+# cached, and entries older than ttl seconds (if given) are treated as missing. Hits and misses are counted
+# so the benefit of each cache can be checked (see stats)
+class LRUCache:
+
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()       # key -> (value, time stored)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # function to get the cache's size and hit/miss counters
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
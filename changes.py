@@ -0,0 +1,127 @@
+import json
+import logging
+import select
+import threading
+import time
+import psycopg2 as sql
+import config
+import database as db
+
+# Cross-process cache invalidation. Triggers on the record tables (see migrations.change_notifications) send a
+# notification on CHANNEL for every committed write: {"table": ..., "operation": INSERT/UPDATE/DELETE/TRUNCATE,
+# "ids": [...]}, with ids null when a statement changed more than MAX_NOTIFIED_IDS rows. Each app process runs a
+# listener thread (start_listener) that drops what its lookup and result caches hold for the changed records,
+# so writes made by other app processes are seen within moments instead of after the caches' TTLs.
+
+CHANNEL = 'hims_changes'
+MAX_NOTIFIED_IDS = 100      # notifications must stay under 8000 bytes
+
+# tables that send notifications, with the column identifying the changed records
+NOTIFIED_TABLES = {
+    'patient_record': 'id',
+    'doctor_record': 'id',
+    'department_record': 'id',
+    'prescription_record': 'id',
+    'medical_test_record': 'id',
+    'prescription_medicine': 'prescription_id',
+}
+
+_logger = logging.getLogger('hims.changes')
+_listener = None
+_listener_lock = threading.Lock()
+_stats = {'connected': False, 'notifications': 0, 'reconnects': 0}
+
+# function to build the trigger function that notifies the writes to a table: the triggers are statement-level
+# and read the changed rows from their transition tables, so a bulk write sends one notification, not one per row
+def trigger_function(table):
+    id_column = NOTIFIED_TABLES[table]
+    return f"""
+        CREATE OR REPLACE FUNCTION {table}_notify_changes() RETURNS trigger AS $$
+        DECLARE
+            changed_ids TEXT[];
+        BEGIN
+            IF TG_OP <> 'TRUNCATE' THEN
+                IF TG_OP = 'DELETE' THEN
+                    SELECT array_agg({id_column}) INTO changed_ids
+                    FROM (SELECT DISTINCT {id_column} FROM old_rows LIMIT {MAX_NOTIFIED_IDS + 1}) AS changed;
+                ELSE
+                    SELECT array_agg({id_column}) INTO changed_ids
+                    FROM (SELECT DISTINCT {id_column} FROM new_rows LIMIT {MAX_NOTIFIED_IDS + 1}) AS changed;
+                END IF;
+                IF changed_ids IS NULL THEN
+                    RETURN NULL;        -- the statement changed no rows
+                END IF;
+            END IF;
+            PERFORM pg_notify('{CHANNEL}', json_build_object(
+                'table', TG_TABLE_NAME, 'operation', TG_OP,
+                'ids', CASE WHEN cardinality(changed_ids) <= {MAX_NOTIFIED_IDS} THEN changed_ids END
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """
+
+# function to drop what the local caches hold for the records named in a notification
+def apply_change(payload):
+    change = json.loads(payload)
+    table, operation, ids = change['table'], change['operation'], change['ids']
+    if table not in NOTIFIED_TABLES:
+        return
+    db.tables_changed(table, own_transaction=True)
+    if table not in db.RECORD_TABLES or operation == 'INSERT':
+        return
+    if ids is None:
+        db.forget_table(table)
+    elif operation == 'DELETE':
+        for record_id in ids:
+            db.forget_id(table, record_id)
+    elif table in db.NAMED_TABLES:
+        for record_id in ids:
+            db.forget_name(table, record_id)
+
+# function to drop everything the local caches hold (writes made while no listener was connected are unknown)
+def _forget_everything():
+    db.tables_changed(*NOTIFIED_TABLES, own_transaction=True)
+    for table in db.RECORD_TABLES:
+        db.forget_table(table)
+
+def _listen():
+    while True:
+        conn = None
+        try:
+            conn = sql.connect(host=config.db_host, port=config.db_port, user=config.db_user,
+                               password=config.password, database=config.db_database)
+            conn.autocommit = True
+            c = conn.cursor()
+            c.execute(f"LISTEN {CHANNEL};")
+            _forget_everything()
+            _stats['connected'] = True
+            while True:
+                if select.select([conn], [], [], config.change_listener_heartbeat) == ([], [], []):
+                    c.execute("SELECT 1;")      # no news: check that the connection is still alive
+                conn.poll()
+                while conn.notifies:
+                    _stats['notifications'] += 1
+                    apply_change(conn.notifies.pop(0).payload)
+        except Exception as e:
+            _logger.warning('Change listener disconnected, reconnecting in %s s: %s', config.change_listener_retry, e)
+        finally:
+            _stats['connected'] = False
+            if conn is not None:
+                conn.close()
+        _stats['reconnects'] += 1
+        time.sleep(config.change_listener_retry)
+
+# function to start this process's change listener (once; later calls do nothing), if config.change_listener is set
+def start_listener():
+    global _listener
+    if not config.change_listener or _listener is not None:
+        return
+    with _listener_lock:
+        if _listener is None:
+            _listener = threading.Thread(target=_listen, name='hims-change-listener', daemon=True)
+            _listener.start()
+
+# function to get the listener's state: whether it is connected, notifications received and reconnections
+def listener_stats():
+    return dict(_stats)
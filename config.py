@@ -6,4 +6,42 @@ db_port = 5432                                  # default PostgreSQL port
 db_user = 'postgres'                   # e.g. 'postgres'
 password = '1234'                               # e.g. password = '1234'
 db_database = 'health'          # e.g. 'healthcare_db'
+
+# Connection pool settings (shared by every page render in the process)
+db_pool_min_size = 1                            # connections opened when the pool is created
+db_pool_max_size = 10                           # upper bound on open connections
+db_pool_timeout = 30                            # seconds to wait for a free connection
+db_pool_health_check_interval = 60              # ping connections that have been idle longer than this (seconds)
+async_pool_min_size = 1                         # connections opened by the asyncio pool for concurrent lookups (aio.py)
+async_pool_max_size = 10                        # upper bound on the asyncio pool's connections
+import_chunk_size = 10000                       # rows validated and copied per transaction by bulk imports
+export_chunk_size = 10000                       # rows fetched per round trip (and per Parquet row group) by exports
+export_download_limit_mb = 100                  # largest export offered for download by the app (larger ones: python export.py)
+migration_batch_size = 5000                     # rows per committed batch in data migrations
+id_block_size = 20                              # new record IDs reserved per database round trip
+id_cache_size = 100000                          # record IDs per table remembered as existing (skips repeat lookups)
+id_cache_ttl = 300                              # seconds a remembered ID is trusted (another process may have deleted the record)
+name_cache_size = 10000                         # patient/doctor/department names per table kept in memory
+name_cache_ttl = 300                            # seconds a cached name is trusted (another process may have renamed the record)
+result_cache_size = 1000                        # results of the read screens (pages, searches, lists) kept in memory (0 to disable)
+result_cache_ttl = 60                           # seconds a cached result is trusted (another process may have changed the records)
+change_listener = True                          # drop cached records as soon as another app process changes them (see changes.py)
+change_listener_heartbeat = 30                  # seconds without notifications after which the listener checks its connection
+change_listener_retry = 5                       # seconds the listener waits before reconnecting
+search_result_limit = 20                        # best matches shown by the search screens
+search_min_length = 3                           # shortest search text accepted (shorter prefixes match too many rows)
+timeline_page_size = 25                         # entries per page of the patient timeline
+api_host = '127.0.0.1'                          # address the JSON API (api.py) listens on
+api_port = 8502                                 # port of the JSON API
+api_page_size = 100                             # most records returned per page by the JSON API
+benchmark_database = 'hims_benchmark'           # database seeded and wiped by benchmark.py (never the app's db_database)
+datagen_workers = 4                             # worker processes generating and copying synthetic records (datagen.py)
+query_instrumentation = True                    # time every SQL statement the app runs (see querylog.py)
+query_stats_panel = False                       # show each page render's SQL statements in the sidebar (for administrators)
+slow_query_log = 'slow_queries.log'             # statements slower than slow_query_ms are logged to this file (None to disable)
+slow_query_ms = 200                             # threshold of the slow query log (milliseconds)
+repeated_query_threshold = 5                    # a render running the same statement this many times is flagged as N+1
+audit_chunk_size = 10000                        # rows checked per chunk by the data quality audit
+audit_issue_limit = 1000                        # most problems listed (and downloadable) on the data quality screen
+
 edit_mode_password = 'allow_edit'
@@ -1,144 +1,431 @@
+import atexit
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
 import psycopg2 as sql
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+import cache
 import config
+import migrations
+import querylog
 
-# function to establish connection to the database, enable foreign key constraint support, and create cursor
-def connection():
-    conn = sql.connect(
-        host=config.db_host,
-        port=config.db_port,
-        user=config.db_user,
-        password=config.password,
-        database=config.db_database
-    )
-    c = conn.cursor()
-    return conn, c
-# function to establish connection to the database and create tables (if they don't exist yet)
+# class implementing a bounded, thread-safe pool of database connections shared by the whole process
+class ConnectionPool:
+
+    def __init__(self, min_size, max_size, timeout, health_check_interval, **connect_kwargs):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._connect_kwargs = connect_kwargs
+        self._idle = []         # stack of (connection, time it was returned) pairs
+        self._size = 0          # number of open connections, idle or checked out
+        self._cond = threading.Condition()
+        try:
+            for _ in range(min_size):
+                self._idle.append((self._connect(), time.monotonic()))
+                self._size += 1
+        except BaseException:
+            self.closeall()     # nothing else holds the connections opened so far
+            raise
+
+    def _connect(self):
+        return sql.connect(**self._connect_kwargs)
+
+    # function to check that an idle connection is still usable (pings it if it has been idle for a while)
+    def _is_healthy(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as c:
+                c.execute('SELECT 1;')
+            conn.rollback()
+            return True
+        except sql.Error:
+            return False
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    # function to borrow a connection, waiting up to the pool timeout when all connections are in use
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, returned_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolError('Timed out waiting for a free database connection')
+                self._cond.wait(remaining)
+
+        if conn is not None and self._is_healthy(conn, returned_at):
+            return conn
+        if conn is not None:
+            _close_quietly(conn)
+        try:
+            return self._connect()
+        except Exception:
+            self._release_slot()
+            raise
+
+    # function to return a borrowed connection, resetting any transaction left open on it
+    def putconn(self, conn):
+        if not conn.closed and conn.info.transaction_status != extensions.TRANSACTION_STATUS_UNKNOWN:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                with self._cond:
+                    self._idle.append((conn, time.monotonic()))
+                    self._cond.notify()
+                return
+            except sql.Error:
+                pass
+        _close_quietly(conn)
+        self._release_slot()
+
+    def closeall(self):
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                _close_quietly(conn)
+                self._size -= 1
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except sql.Error:
+        pass
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# function to get the process-wide connection pool (created on first use)
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    config.db_pool_min_size,
+                    config.db_pool_max_size,
+                    config.db_pool_timeout,
+                    config.db_pool_health_check_interval,
+                    host=config.db_host,
+                    port=config.db_port,
+                    user=config.db_user,
+                    password=config.password,
+                    database=config.db_database,
+                    cursor_factory=querylog.InstrumentedCursor if config.query_instrumentation else None
+                )
+                atexit.register(_pool.closeall)
+    return _pool
+
+# class holding the state of a unit of work: the connection it runs on (checked out of the pool by its first
+# session), the IDs it added to the lookup caches, which are dropped again if its work is rolled back, and the
+# records and tables it changed, whose cached IDs, names and results are invalidated once its work is committed
+class UnitOfWork:
+
+    def __init__(self):
+        self.conn = None
+        self.remembered = []        # (table, record id) pairs
+        self.forgotten = []         # (table, record id, name only) triples
+        self.changed = set()        # tables
+
+    def connection(self):
+        if self.conn is None:
+            self.conn = get_pool().getconn()
+        return self.conn
+
+    def rollback(self):
+        if self.conn is not None and not self.conn.closed:
+            self.conn.rollback()
+        for table, record_id in self.remembered:
+            _invalidate(table, record_id)
+        self.remembered.clear()
+        self.forgotten.clear()
+        self.changed.clear()
+
+_unit = contextvars.ContextVar('unit_of_work', default=None)      # unit of work of the current context
+
+# context manager (also usable as a decorator) binding one connection and one transaction to a whole user
+# action, such as a service write operation or an API request: every session() opened inside it, in any
+# module, runs on that connection, and the work is committed once, when the unit finishes (so before the
+# action reports success). If a session raises, everything the unit did so far is rolled back (later sessions
+# start a new transaction). A unit opened inside another joins it
+@contextmanager
+def unit_of_work():
+    if _unit.get() is not None:
+        yield
+        return
+    unit = UnitOfWork()
+    token = _unit.set(unit)
+    try:
+        yield
+        if unit.conn is not None:
+            unit.conn.commit()
+        _bump_versions(unit.changed)
+        for table, record_id, name_only in unit.forgotten:
+            _invalidate(table, record_id, name_only)
+    except BaseException:
+        unit.rollback()
+        raise
+    finally:
+        _unit.reset(token)
+        if unit.conn is not None:
+            get_pool().putconn(unit.conn)
+
+# function to check a connection out of the pool for the duration of a with-block and create a cursor;
+# the transaction is committed when the block finishes and rolled back if it raises. Inside a unit of work the
+# unit's connection and transaction are used instead, unless own_transaction is set (for work that must be
+# committed on its own, e.g. each chunk of a bulk import)
+@contextmanager
+def session(own_transaction=False):
+    unit = None if own_transaction else _unit.get()
+    if unit is not None:
+        conn = unit.connection()
+        c = conn.cursor()
+        try:
+            yield conn, c
+        except BaseException:
+            unit.rollback()
+            raise
+        finally:
+            c.close()
+        return
+
+    conn = get_pool().getconn()
+    try:
+        c = conn.cursor()
+        try:
+            yield conn, c
+            conn.commit()
+        except BaseException:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            c.close()
+    finally:
+        get_pool().putconn(conn)
+
+# tables holding the HIMS records; each is keyed by a TEXT primary key named id
+RECORD_TABLES = ('patient_record', 'doctor_record', 'department_record', 'prescription_record', 'medical_test_record')
+
+# IDs known to exist; trusted for config.id_cache_ttl seconds, as another process may delete the record
+_known_ids = {table: cache.LRUCache(config.id_cache_size, config.id_cache_ttl) for table in RECORD_TABLES}
+
+# record names by ID, for the tables whose records have a name (used to fill in names on the forms)
+NAMED_TABLES = ('patient_record', 'doctor_record', 'department_record')
+_names = {table: cache.LRUCache(config.name_cache_size, config.name_cache_ttl) for table in NAMED_TABLES}
+
+def _check_table(table, tables=RECORD_TABLES):
+    if table not in tables:
+        raise ValueError(f'Unknown record table: {table}')
+
+# function to check whether a record with the given id exists, using a primary key point lookup;
+# IDs found to exist are remembered so repeated checks (e.g. on every rerun) skip the database
+def record_exists(table, record_id):
+    _check_table(table)
+    if not record_id:
+        return False
+    if is_known_id(table, record_id):
+        return True
+    with session() as (conn, c):
+        c.execute(f"SELECT EXISTS (SELECT 1 FROM {table} WHERE id = %(id)s);", {'id': record_id})
+        exists = c.fetchone()[0]
+    if exists:
+        remember_id(table, record_id)
+    return exists
+
+# function to check the known-ID cache only
+def is_known_id(table, record_id):
+    _check_table(table)
+    return _known_ids[table].get(record_id) is not cache.MISSING
+
+# function to add an id to the known-ID cache (called after a record is inserted)
+def remember_id(table, record_id):
+    _check_table(table)
+    _known_ids[table].put(record_id, True)
+    unit = _unit.get()
+    if unit is not None:
+        unit.remembered.append((table, record_id))
+
+def _invalidate(table, record_id, name_only=False):
+    if not name_only:
+        _known_ids[table].invalidate(record_id)
+    if table in _names:
+        _names[table].invalidate(record_id)
+
+# function to drop a record from the lookup caches, at once or, inside a unit of work, once the unit is
+# committed (a reader could otherwise cache the old record again before the change is visible to it)
+def _forget(table, record_id, name_only=False):
+    unit = _unit.get()
+    if unit is not None:
+        unit.forgotten.append((table, record_id, name_only))
+    else:
+        _invalidate(table, record_id, name_only)
+
+# function to drop an id from the known-ID and name caches (called when a record is deleted)
+def forget_id(table, record_id):
+    _check_table(table)
+    _forget(table, record_id)
+
+# function to drop every ID and name of a table from the lookup caches (e.g. after a bulk write by another process)
+def forget_table(table):
+    _check_table(table)
+    _known_ids[table].clear()
+    if table in _names:
+        _names[table].clear()
+
+# function to get the name of a record by its id (None if there is no such record); names are cached for
+# config.name_cache_ttl seconds, and the caching process drops a name as soon as its change to it is committed
+# (see forget_name)
+def record_name(table, record_id):
+    name = cached_name(table, record_id)
+    if name is not cache.MISSING:
+        return name
+    with session() as (conn, c):
+        c.execute(f"SELECT name FROM {table} WHERE id = %(id)s;", {'id': record_id})
+        result = c.fetchone()
+    if result is None:
+        return None
+    remember_name(table, record_id, result[0])
+    return result[0]
+
+# function to get a record's name from the name cache only (cache.MISSING if it is not cached)
+def cached_name(table, record_id):
+    _check_table(table, NAMED_TABLES)
+    return _names[table].get(record_id)
+
+# function to add a record's name to the name cache (the record is then also known to exist)
+def remember_name(table, record_id, name):
+    _check_table(table, NAMED_TABLES)
+    _names[table].put(record_id, name)
+    remember_id(table, record_id)
+
+# function to drop a record's name from the name cache (called when a record is updated)
+def forget_name(table, record_id):
+    _check_table(table, NAMED_TABLES)
+    _forget(table, record_id, name_only=True)
+
+# results of the read screens (see cached_read), keyed on the function, its arguments and the versions of the
+# tables it reads. Every committed write to a table bumps the table's version, so results read before it are
+# never served again (they just age out of the cache)
+_results = cache.LRUCache(config.result_cache_size, config.result_cache_ttl)
+_table_versions = dict.fromkeys(RECORD_TABLES + ('prescription_medicine',), 0)
+_versions_lock = threading.Lock()
+
+def _bump_versions(tables):
+    with _versions_lock:
+        for table in tables:
+            _table_versions[table] += 1
+
+# function to report a write to the given tables (called after the write's session); cached results read from
+# them are invalidated at once, or inside a unit of work when the unit commits (unless the write was committed
+# in a session of its own_transaction)
+def tables_changed(*tables, own_transaction=False):
+    for table in tables:
+        _check_table(table, _table_versions)
+    unit = None if own_transaction else _unit.get()
+    if unit is not None:
+        unit.changed.update(tables)
+    else:
+        _bump_versions(tables)
+
+# function to call function(*args, **kwargs), a read of the given tables, through the result cache: the result
+# is reused by later calls with the same arguments until one of the tables is written to. Cached results are
+# shared between sessions and must not be modified. A unit of work that has written to one of the tables
+# reads them directly, as its changes are not committed yet
+def cached_read(tables, function, *args, **kwargs):
+    unit = _unit.get()
+    if not config.result_cache_size or (unit is not None and unit.changed.intersection(tables)):
+        return function(*args, **kwargs)
+    with _versions_lock:
+        versions = tuple(_table_versions[table] for table in tables)
+    key = (function.__module__, function.__qualname__, repr(args), repr(sorted(kwargs.items())), versions)
+    result = _results.get(key)
+    if result is cache.MISSING:
+        result = function(*args, **kwargs)
+        _results.put(key, result)
+    return result
+
+# function to empty the in-process lookup and result caches (e.g. so that a benchmark times the database work)
+def clear_caches():
+    for table in RECORD_TABLES:
+        forget_table(table)
+    _results.clear()
+
+# function to get the size and hit/miss counters of the in-process lookup and result caches
+def cache_stats():
+    stats = {f'known IDs ({table})': _known_ids[table].stats() for table in RECORD_TABLES}
+    stats.update({f'names ({table})': _names[table].stats() for table in NAMED_TABLES})
+    stats['read results'] = _results.stats()
+    return stats
+
+# function to fetch one page of a record table in primary key order using keyset pagination, so the cost
+# of a page does not grow with its position in the table. Pass after_id to move forward from a page,
+# before_id to move back from it, or from_id to start at a given id. The rows are streamed through a named
+# (server-side) cursor; the id column must come first in columns. An optional where condition (with its named
+# parameters in params) limits the pages to the matching rows. Returns (rows, has_previous_page, has_next_page).
+def fetch_page(table, page_size, after_id=None, before_id=None, from_id=None, columns='*', where=None, params=None):
+    _check_table(table)
+    if before_id is not None:
+        condition, order, key = 'id < %(key)s', 'DESC', before_id
+    elif after_id is not None:
+        condition, order, key = 'id > %(key)s', 'ASC', after_id
+    elif from_id is not None:
+        condition, order, key = 'id >= %(key)s', 'ASC', from_id
+    else:
+        condition, order, key = 'TRUE', 'ASC', None
+    where = f'({where})' if where else 'TRUE'
+
+    with session() as (conn, c):
+        with conn.cursor(name=f'{table}_page') as page_cursor:
+            page_cursor.itersize = page_size + 1
+            page_cursor.execute(
+                f"SELECT {columns} FROM {table} WHERE {condition} AND {where} ORDER BY id {order} LIMIT %(limit)s;",
+                {**(params or {}), 'key': key, 'limit': page_size + 1}
+            )
+            rows = page_cursor.fetchmany(page_size + 1)
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        if before_id is not None:
+            rows.reverse()
+            return rows, more, True
+        if after_id is not None:
+            return rows, True, more
+        if from_id is not None:
+            c.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {table} WHERE id < %(key)s AND {where});",
+                {**(params or {}), 'key': rows[0][0] if rows else from_id}
+            )
+            return rows, c.fetchone()[0], more
+        return rows, False, more
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+# function to bring the database schema up to date; runs the pending migrations once per process, so
+# later calls (e.g. on every Streamlit rerun) return without touching the database
 def db_init():
-    conn, c = connection()
-    with conn:
-        c.execute(
-            """
-            CREATE TABLE IF NOT EXISTS department_record (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL UNIQUE,
-                description TEXT NOT NULL,
-                contact_number_1 TEXT NOT NULL,
-                contact_number_2 TEXT,
-                address TEXT NOT NULL,
-                email_id TEXT NOT NULL UNIQUE
-            );
-            """
-        )
-
-    with conn:
-        c.execute(
-            """
-            CREATE TABLE IF NOT EXISTS patient_record (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                age INTEGER NOT NULL,
-                gender TEXT NOT NULL,
-                date_of_birth TEXT NOT NULL,
-                blood_group TEXT NOT NULL,
-                contact_number_1 TEXT NOT NULL,
-                contact_number_2 TEXT,
-                aadhar_or_voter_id TEXT NOT NULL UNIQUE,
-                weight INTEGER NOT NULL,
-                height INTEGER NOT NULL,
-                address TEXT NOT NULL,
-                city TEXT NOT NULL,
-                state TEXT NOT NULL,
-                pin_code TEXT NOT NULL,
-                next_of_kin_name TEXT NOT NULL,
-                next_of_kin_relation_to_patient TEXT NOT NULL,
-                next_of_kin_contact_number TEXT NOT NULL,
-                email_id TEXT,
-                date_of_registration TEXT NOT NULL,
-                time_of_registration TEXT NOT NULL
-            );
-            """
-        )
-    with conn:
-        c.execute(
-            """
-            CREATE TABLE IF NOT EXISTS doctor_record (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                age INTEGER NOT NULL,
-                gender TEXT NOT NULL,
-                date_of_birth TEXT NOT NULL,
-                blood_group TEXT NOT NULL,
-                department_id TEXT NOT NULL,
-                department_name TEXT NOT NULL,
-                contact_number_1 TEXT NOT NULL,
-                contact_number_2 TEXT,
-                aadhar_or_voter_id TEXT NOT NULL UNIQUE,
-                email_id TEXT NOT NULL UNIQUE,
-                qualification TEXT NOT NULL,
-                specialisation TEXT NOT NULL,
-                years_of_experience INTEGER NOT NULL,
-                address TEXT NOT NULL,
-                city TEXT NOT NULL,
-                state TEXT NOT NULL,
-                pin_code TEXT NOT NULL,
-                FOREIGN KEY (department_id) REFERENCES department_record(id)
-                ON UPDATE CASCADE
-                ON DELETE RESTRICT
-            );
-            """
-        )
-   
-    with conn:
-        c.execute(
-            """
-            CREATE TABLE IF NOT EXISTS prescription_record (
-                id TEXT PRIMARY KEY,
-                patient_id TEXT NOT NULL,
-                patient_name TEXT NOT NULL,
-                doctor_id TEXT NOT NULL,
-                doctor_name TEXT NOT NULL,
-                diagnosis TEXT NOT NULL,
-                comments TEXT,
-                medicine_1_name TEXT NOT NULL,
-                medicine_1_dosage_description TEXT NOT NULL,
-                medicine_2_name TEXT,
-                medicine_2_dosage_description TEXT,
-                medicine_3_name TEXT,
-                medicine_3_dosage_description TEXT,
-                FOREIGN KEY (patient_id) REFERENCES patient_record(id)
-                ON UPDATE CASCADE
-                ON DELETE RESTRICT,
-                FOREIGN KEY (doctor_id) REFERENCES doctor_record(id)
-                ON UPDATE CASCADE
-                ON DELETE RESTRICT
-            );
-            """
-        )
-    with conn:
-        c.execute(
-            """
-            CREATE TABLE IF NOT EXISTS medical_test_record (
-                id TEXT PRIMARY KEY,
-                test_name TEXT NOT NULL,
-                patient_id TEXT NOT NULL,
-                patient_name TEXT NOT NULL,
-                doctor_id TEXT NOT NULL,
-                doctor_name TEXT NOT NULL,
-                medical_lab_scientist_id TEXT NOT NULL,
-                test_date_time TEXT NOT NULL,
-                result_date_time TEXT NOT NULL,
-                result_and_diagnosis TEXT,
-                description TEXT,
-                comments TEXT,
-                cost INTEGER NOT NULL,
-                FOREIGN KEY (patient_id) REFERENCES patient_record(id)
-                ON UPDATE CASCADE
-                ON DELETE RESTRICT,
-                FOREIGN KEY (doctor_id) REFERENCES doctor_record(id)
-                ON UPDATE CASCADE
-                ON DELETE RESTRICT
-            );
-            """
-        )
-    c.close()
-    conn.close()
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if not _schema_ready:
+            with session() as (conn, c):
+                migrations.migrate(conn)
+            _schema_ready = True
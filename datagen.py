@@ -0,0 +1,518 @@
+import argparse
+import io
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+import numpy as np
+import pandas as pd
+import psycopg2 as sql
+import analytics
+import config
+import database as db
+import ids
+import services
+
+# Synthetic but realistic records for load and capacity testing. Rows are generated in chunks by worker
+# processes and streamed in with COPY, one transaction per chunk. Every chunk draws from its own random
+# generator seeded with (seed, table, chunk number), and the attributes other tables copy (patient and doctor
+# names, registration times) are hashed from the record's number, so a seed gives the same records whatever
+# the number of workers. Records are numbered 1..count per table and get IDs in the app's format (see ids.py).
+
+CHUNK_SIZE = 50_000     # rows per chunk; part of the seed (another chunk size gives other records)
+HISTORY_YEARS = 10      # registrations, prescriptions and tests are spread over this many years before --as-of
+
+# default volumes, relative to the number of patients
+PATIENTS_PER_DOCTOR = 100
+PRESCRIPTIONS_PER_PATIENT = 3
+MEDICAL_TESTS_PER_PATIENT = 2
+
+# share of the patients (chronic conditions, long-term care) who account for FREQUENT_VISIT_SHARE of the
+# prescriptions and tests; the others visit now and then
+FREQUENT_PATIENT_SHARE = 0.2
+FREQUENT_VISIT_SHARE = 0.7
+
+MALE_FIRST_NAMES = [
+    'Aarav', 'Vivaan', 'Aditya', 'Arjun', 'Sai', 'Reyansh', 'Krishna', 'Ishaan', 'Rohan', 'Kabir', 'Rahul',
+    'Amit', 'Suresh', 'Ramesh', 'Vikram', 'Anil', 'Sanjay', 'Rajesh', 'Manoj', 'Deepak', 'Karthik', 'Arun',
+    'Mohammed', 'Imran', 'Joseph', 'Harpreet', 'Gurpreet', 'Nikhil', 'Varun', 'Siddharth'
+]
+FEMALE_FIRST_NAMES = [
+    'Ananya', 'Diya', 'Aadhya', 'Saanvi', 'Pari', 'Anika', 'Navya', 'Meera', 'Priya', 'Kavya', 'Pooja', 'Neha',
+    'Sunita', 'Anita', 'Lakshmi', 'Geeta', 'Rekha', 'Kavita', 'Divya', 'Shreya', 'Fatima', 'Ayesha', 'Mary',
+    'Simran', 'Harleen', 'Deepa', 'Swati', 'Nandini', 'Revathi', 'Aishwarya'
+]
+LAST_NAMES = [
+    'Sharma', 'Verma', 'Patel', 'Reddy', 'Nair', 'Iyer', 'Gupta', 'Singh', 'Kumar', 'Das', 'Mehta', 'Joshi',
+    'Rao', 'Menon', 'Bose', 'Khan', 'Pillai', 'Chopra', 'Malhotra', 'Bhat', 'Yadav', 'Jain', 'Shah', 'Agarwal',
+    'Mishra', 'Pandey', 'Chatterjee', 'Banerjee', 'Mukherjee', 'Naidu', 'Gowda', 'Kulkarni', 'Deshpande',
+    'Fernandes', "D'Souza", 'Thomas', 'Ahmed', 'Sheikh', 'Gill', 'Sandhu'
+]
+# blood group frequencies in India (per cent)
+BLOOD_GROUPS = {'B+': 32, 'O+': 31, 'A+': 22, 'AB+': 8, 'O-': 2.5, 'B-': 2, 'A-': 1.5, 'AB-': 1}
+# (city, state, first three digits of its PIN codes): share of the patients
+CITIES = {
+    ('Mumbai', 'Maharashtra', '400'): 14, ('Delhi', 'Delhi', '110'): 14, ('Bengaluru', 'Karnataka', '560'): 10,
+    ('Hyderabad', 'Telangana', '500'): 8, ('Chennai', 'Tamil Nadu', '600'): 8, ('Kolkata', 'West Bengal', '700'): 8,
+    ('Pune', 'Maharashtra', '411'): 6, ('Ahmedabad', 'Gujarat', '380'): 6, ('Jaipur', 'Rajasthan', '302'): 4,
+    ('Lucknow', 'Uttar Pradesh', '226'): 4, ('Kochi', 'Kerala', '682'): 3, ('Chandigarh', 'Chandigarh', '160'): 3,
+    ('Indore', 'Madhya Pradesh', '452'): 3, ('Patna', 'Bihar', '800'): 3, ('Bhubaneswar', 'Odisha', '751'): 2,
+    ('Guwahati', 'Assam', '781'): 2, ('Nagpur', 'Maharashtra', '440'): 2
+}
+# (youngest, oldest) age at registration: share of the patients
+AGE_BANDS = {
+    (0, 4): 7, (5, 14): 9, (15, 24): 11, (25, 34): 14, (35, 44): 15, (45, 54): 15, (55, 64): 14, (65, 74): 10,
+    (75, 94): 5
+}
+# (department, qualification, specialisations): share of the doctors
+DEPARTMENTS = {
+    ('General Medicine', 'MBBS, MD', ('Internal Medicine', 'Family Medicine')): 14,
+    ('General Surgery', 'MBBS, MS', ('General Surgery', 'Laparoscopic Surgery')): 8,
+    ('Paediatrics', 'MBBS, MD', ('Paediatrics', 'Neonatology')): 8,
+    ('Gynaecology', 'MBBS, MS', ('Obstetrics and Gynaecology',)): 8,
+    ('Orthopaedics', 'MBBS, MS', ('Orthopaedics', 'Sports Medicine', 'Spine Surgery')): 7,
+    ('Cardiology', 'MBBS, MD, DM', ('Cardiology', 'Interventional Cardiology')): 6,
+    ('Emergency Medicine', 'MBBS, MD', ('Emergency Medicine',)): 6,
+    ('Anaesthesiology', 'MBBS, MD', ('Anaesthesiology', 'Critical Care')): 6,
+    ('Radiology', 'MBBS, MD', ('Radiology',)): 5,
+    ('Dermatology', 'MBBS, MD', ('Dermatology',)): 4,
+    ('ENT', 'MBBS, MS', ('Otorhinolaryngology',)): 4,
+    ('Ophthalmology', 'MBBS, MS', ('Ophthalmology',)): 4,
+    ('Psychiatry', 'MBBS, MD', ('Psychiatry',)): 3,
+    ('Pulmonology', 'MBBS, MD, DM', ('Pulmonology',)): 3,
+    ('Neurology', 'MBBS, MD, DM', ('Neurology',)): 3,
+    ('Gastroenterology', 'MBBS, MD, DM', ('Gastroenterology',)): 3,
+    ('Nephrology', 'MBBS, MD, DM', ('Nephrology',)): 2,
+    ('Endocrinology', 'MBBS, MD, DM', ('Endocrinology', 'Diabetology')): 2,
+    ('Urology', 'MBBS, MS, MCh', ('Urology',)): 2,
+    ('Oncology', 'MBBS, MD, DM', ('Medical Oncology', 'Radiation Oncology')): 3,
+}
+DIAGNOSES = {
+    'Viral fever': 14, 'Upper respiratory tract infection': 12, 'Type 2 diabetes mellitus': 10,
+    'Hypertension': 10, 'Acute gastroenteritis': 7, 'Lower back pain': 6, 'Allergic rhinitis': 5,
+    'Hypothyroidism': 5, 'Urinary tract infection': 5, 'Migraine': 4, 'Bronchial asthma': 4, 'Anaemia': 4,
+    'Gastro-oesophageal reflux disease': 4, 'Osteoarthritis of knee': 3, 'Dengue fever': 2, 'Typhoid fever': 2,
+    'Anxiety disorder': 2, 'Fungal skin infection': 1
+}
+# medicines, most commonly prescribed first (picked with Zipf-like frequencies)
+MEDICINES = [
+    'Paracetamol 500 mg', 'Pantoprazole 40 mg', 'Cetirizine 10 mg', 'Amoxicillin 500 mg', 'Metformin 500 mg',
+    'Azithromycin 500 mg', 'Amlodipine 5 mg', 'Ibuprofen 400 mg', 'Vitamin D3 60000 IU', 'Atorvastatin 10 mg',
+    'Telmisartan 40 mg', 'Levothyroxine 50 mcg', 'Montelukast 10 mg', 'Ondansetron 4 mg', 'Omeprazole 20 mg',
+    'Aspirin 75 mg', 'Ferrous sulphate 200 mg', 'Salbutamol inhaler', 'Glimepiride 2 mg', 'Diclofenac gel',
+    'Ciprofloxacin 500 mg', 'Doxycycline 100 mg', 'Losartan 50 mg', 'Clopidogrel 75 mg', 'Insulin glargine',
+    'Sumatriptan 50 mg', 'Escitalopram 10 mg', 'Clotrimazole cream', 'ORS sachet', 'Calcium carbonate 500 mg'
+]
+DOSAGES = {
+    '1-0-1 after food for 5 days': 25, '1-0-0 before breakfast': 20, '0-0-1 at bedtime': 15,
+    '1-1-1 after food for 3 days': 15, 'once daily, long term': 15, 'as needed, at most 3 a day': 10
+}
+MEDICINE_LINES = {1: 30, 2: 35, 3: 20, 4: 10, 5: 5}      # medicines per prescription
+PRESCRIPTION_COMMENTS = {None: 70, 'Review after one week': 15, 'Review with reports': 10, 'Refer to specialist': 5}
+# test: (cost, least and most hours until the result): share of the tests
+MEDICAL_TESTS = {
+    ('Complete blood count', 300, 2, 12): 20, ('Blood sugar (fasting)', 100, 1, 6): 14, ('HbA1c', 450, 4, 24): 9,
+    ('Lipid profile', 600, 4, 24): 9, ('Thyroid profile', 550, 6, 36): 8, ('Liver function test', 700, 4, 24): 6,
+    ('Kidney function test', 650, 4, 24): 6, ('Urine routine', 150, 1, 8): 8, ('Chest X-ray', 400, 1, 6): 7,
+    ('ECG', 250, 0, 1): 6, ('Ultrasound abdomen', 1200, 1, 4): 4, ('CT scan head', 3500, 4, 24): 2,
+    ('MRI brain', 6000, 12, 72): 1
+}
+TEST_RESULTS = {
+    'Within normal limits': 65, 'Mildly abnormal, review with doctor': 22, 'Abnormal, consult doctor': 10,
+    'Critical value, doctor informed': 3
+}
+MEDICAL_LAB_SCIENTISTS = 60
+KIN_RELATIONS = {'Spouse': 45, 'Son': 15, 'Daughter': 12, 'Brother': 10, 'Sister': 8, 'Father': 5, 'Mother': 5}
+
+PATIENT_COLUMNS = [
+    'id', 'name', 'gender', 'date_of_birth', 'blood_group', 'contact_number_1', 'contact_number_2',
+    'aadhar_or_voter_id', 'weight', 'height', 'address', 'city', 'state', 'pin_code', 'next_of_kin_name',
+    'next_of_kin_relation_to_patient', 'next_of_kin_contact_number', 'email_id',
+    'date_of_registration', 'time_of_registration'
+]
+DOCTOR_COLUMNS = [
+    'id', 'name', 'gender', 'date_of_birth', 'blood_group', 'department_id', 'department_name',
+    'contact_number_1', 'contact_number_2', 'aadhar_or_voter_id', 'email_id', 'qualification', 'specialisation',
+    'years_of_experience', 'address', 'city', 'state', 'pin_code'
+]
+DEPARTMENT_COLUMNS = ['id', 'name', 'description', 'contact_number_1', 'contact_number_2', 'address', 'email_id']
+PRESCRIPTION_COLUMNS = ['id', 'patient_id', 'patient_name', 'doctor_id', 'doctor_name', 'diagnosis', 'comments',
+                        'prescribed_at']
+MEDICINE_COLUMNS = ['prescription_id', 'line_number', 'medicine_name', 'dosage_description']
+MEDICAL_TEST_COLUMNS = [
+    'id', 'test_name', 'patient_id', 'patient_name', 'doctor_id', 'doctor_name', 'medical_lab_scientist_id',
+    'test_date_time', 'result_date_time', 'result_and_diagnosis', 'description', 'comments', 'cost'
+]
+
+# tables filled by the generator, in the order they are loaded (records referenced by others first)
+TABLES = ('department_record', 'doctor_record', 'patient_record', 'prescription_record', 'medical_test_record')
+# salts keeping the hashed attributes of different kinds independent of each other
+_SALTS = {'gender': 1, 'first_name': 2, 'last_name': 3, 'registered': 4, 'visits': 5}
+
+# function to work out how many records of each table to generate
+def table_sizes(patients, patients_per_doctor=PATIENTS_PER_DOCTOR, prescriptions_per_patient=PRESCRIPTIONS_PER_PATIENT,
+                medical_tests_per_patient=MEDICAL_TESTS_PER_PATIENT):
+    return {
+        'department_record': len(DEPARTMENTS),
+        'doctor_record': max(len(DEPARTMENTS), round(patients / patients_per_doctor)),
+        'patient_record': patients,
+        'prescription_record': round(patients * prescriptions_per_patient),
+        'medical_test_record': round(patients * medical_tests_per_patient),
+    }
+
+# function to hash record numbers into well mixed 64-bit values (splitmix64), one independent stream per salt
+def _hash(seed, salt, numbers):
+    with np.errstate(over='ignore'):
+        z = np.asarray(numbers, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+        z += np.uint64((seed * 0x632BE59BD9B4E019 + salt * 0xD1B54A32D192ED03) % 2 ** 64)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+# function to hash record numbers into floats in [0, 1)
+def _hashed_uniform(seed, salt, numbers):
+    return (_hash(seed, salt, numbers) >> np.uint64(11)).astype(np.float64) / 2.0 ** 53
+
+# function to turn {value: weight} into (values, cumulative probabilities) for _pick
+def _distribution(weights):
+    values = list(weights)
+    cumulative = np.cumsum(list(weights.values()), dtype=np.float64)
+    return values, cumulative / cumulative[-1]
+
+# function to map uniform numbers in [0, 1) to values of a weighted distribution; returns their indexes
+def _pick(distribution, uniform):
+    return np.minimum(np.searchsorted(distribution[1], uniform, side='right'), len(distribution[0]) - 1)
+
+def _choose(rng, weights, size):
+    values, cumulative = _distribution(weights)
+    return np.array(values, dtype=object)[_pick((values, cumulative), rng.random(size))]
+
+def _ids(table, numbers):
+    return [ids.format_id(table, int(n)) for n in numbers]
+
+def _phone_numbers(rng, size):
+    return (rng.integers(6, 10, size).astype(str).astype(object)
+            + pd.Series(rng.integers(0, 10 ** 9, size)).astype(str).str.zfill(9).to_numpy(dtype=object))
+
+# function to work out the names patients or doctors numbered numbers have (a pure function of the seed, so
+# prescriptions and tests can copy a patient's name without reading the patient)
+def person_names(seed, numbers, kind):
+    salt = 100 if kind == 'doctor_record' else 0
+    female = _hashed_uniform(seed, salt + _SALTS['gender'], numbers) < 0.5
+    first = np.where(
+        female,
+        np.array(FEMALE_FIRST_NAMES, dtype=object)[_hash(seed, salt + _SALTS['first_name'], numbers) % np.uint64(len(FEMALE_FIRST_NAMES))],
+        np.array(MALE_FIRST_NAMES, dtype=object)[_hash(seed, salt + _SALTS['first_name'], numbers) % np.uint64(len(MALE_FIRST_NAMES))]
+    )
+    last = np.array(LAST_NAMES, dtype=object)[_hash(seed, salt + _SALTS['last_name'], numbers) % np.uint64(len(LAST_NAMES))]
+    names = first + ' ' + last
+    if kind == 'doctor_record':
+        names = 'Dr ' + names
+    return names, np.where(female, 'Female', 'Male'), last
+
+# function to work out when patients numbered numbers registered: registrations are spread evenly over the
+# history (so patient IDs increase with registration time), during opening hours (8:00 to 20:00)
+def registration_times(seed, numbers, patients, as_of):
+    start = np.datetime64(as_of, 's') - np.timedelta64(HISTORY_YEARS * 365, 'D')
+    days = ((np.asarray(numbers) - 1) * (HISTORY_YEARS * 365) // max(patients, 1)).astype('timedelta64[D]')
+    seconds = (_hash(seed, _SALTS['registered'], numbers) % np.uint64(12 * 3600)).astype(np.int64) + 8 * 3600
+    return start + days + seconds.astype('timedelta64[s]')
+
+def _dates(values):
+    return np.datetime_as_string(values.astype('datetime64[D]'))
+
+def _timestamps(values):
+    return np.char.replace(np.datetime_as_string(values.astype('datetime64[s]')), 'T', ' ')
+
+# function to pick the patients of visits (prescriptions or tests): FREQUENT_VISIT_SHARE of visits go to the
+# FREQUENT_PATIENT_SHARE of patients who visit often. Patients are shuffled by a fixed permutation of
+# their numbers (multiplying by a prime larger than any patient count), so frequent visitors are spread over
+# the whole registration history
+def _visit_patients(rng, size, seed, patients):
+    frequent = rng.random(size) < FREQUENT_VISIT_SHARE
+    pool = np.where(frequent, max(1, int(patients * FREQUENT_PATIENT_SHARE)), patients)
+    rank = np.floor(rng.random(size) * pool).astype(np.int64)
+    offset = int(_hash(seed, _SALTS['visits'], [0])[0] % np.uint64(patients))
+    return (rank * 2_654_435_761 + offset) % patients + 1
+
+# function to pick when visits happened: after the patient registered and before as_of
+def _visit_times(rng, registered, as_of):
+    end = np.datetime64(as_of, 's')
+    span = (end - registered).astype(np.int64)
+    return registered + (rng.random(len(registered)) * span).astype('timedelta64[s]')
+
+def generate_departments(seed):
+    numbers = np.arange(1, len(DEPARTMENTS) + 1)
+    names = [name for name, _, _ in DEPARTMENTS]
+    return {'department_record': pd.DataFrame({
+        'id': _ids('department_record', numbers),
+        'name': names,
+        'description': [f'Department of {name}' for name in names],
+        'contact_number_1': [f'022{4000000 + n * 1000}' for n in numbers],
+        'contact_number_2': None,
+        'address': [f'Block {chr(64 + (n + 1) // 2)}, floor {n % 2 + 1}' for n in numbers],
+        'email_id': [f"{name.lower().replace(' ', '.')}@hospital.example" for name in names],
+    }, columns=DEPARTMENT_COLUMNS)}
+
+def generate_doctors(seed, first, count, as_of):
+    rng = np.random.default_rng([seed, TABLES.index('doctor_record'), first // CHUNK_SIZE])
+    numbers = np.arange(first, first + count)
+    names, gender, last = person_names(seed, numbers, 'doctor_record')
+    departments = list(DEPARTMENTS)
+    department = _pick(_distribution(DEPARTMENTS), rng.random(count))
+    age = rng.integers(28, 68, count)
+    dob = np.datetime64(as_of, 'D') - (age * 365.25 + rng.integers(0, 365, count)).astype(np.int64).astype('timedelta64[D]')
+    cities = list(CITIES)
+    city = _pick(_distribution(CITIES), rng.random(count))
+    specialisations = np.array([rng.choice(departments[d][2]) for d in department], dtype=object)
+    return {'doctor_record': pd.DataFrame({
+        'id': _ids('doctor_record', numbers),
+        'name': names,
+        'gender': gender,
+        'date_of_birth': _dates(dob),
+        'blood_group': _choose(rng, BLOOD_GROUPS, count),
+        'department_id': _ids('department_record', department + 1),
+        'department_name': [departments[d][0] for d in department],
+        'contact_number_1': _phone_numbers(rng, count),
+        'contact_number_2': np.where(rng.random(count) < 0.4, _phone_numbers(rng, count), None),
+        'aadhar_or_voter_id': _aadhar_numbers(seed + 1, numbers),
+        'email_id': [f"{name[3:].lower().replace(' ', '.').replace(chr(39), '')}.{n}@hospital.example"
+                     for name, n in zip(names, numbers)],
+        'qualification': [departments[d][1] for d in department],
+        'specialisation': specialisations,
+        'years_of_experience': np.maximum(0, age - 26 - rng.integers(0, 4, count)),
+        'address': [f'{n % 200 + 1}, Doctors Quarters' for n in numbers],
+        'city': [cities[i][0] for i in city],
+        'state': [cities[i][1] for i in city],
+        'pin_code': [cities[i][2] + '001' for i in city],
+    }, columns=DOCTOR_COLUMNS)}
+
+# function to derive unique 12 digit Aadhar numbers from record numbers: multiplying by a number coprime to
+# 10^12 permutes them (the product is split in two so it fits in 64 bits)
+def _aadhar_numbers(seed, numbers):
+    multiplier, modulus = 738_205_439_917, 10 ** 12
+    numbers = np.asarray(numbers, dtype=np.int64)
+    values = (numbers % 10 ** 6 * multiplier + numbers // 10 ** 6 * (multiplier * 10 ** 6 % modulus) + seed * 104_729) % modulus
+    return pd.Series(values).astype(str).str.zfill(12).to_numpy(dtype=object)
+
+def generate_patients(seed, first, count, as_of, patients):
+    rng = np.random.default_rng([seed, TABLES.index('patient_record'), first // CHUNK_SIZE])
+    numbers = np.arange(first, first + count)
+    names, gender, last = person_names(seed, numbers, 'patient_record')
+    registered = registration_times(seed, numbers, patients, as_of)
+    bands = list(AGE_BANDS)
+    band = _pick(_distribution(AGE_BANDS), rng.random(count))
+    youngest = np.array([bands[b][0] for b in band])
+    oldest = np.array([bands[b][1] for b in band])
+    age_days = ((youngest + rng.random(count) * (oldest - youngest + 1)) * 365.25).astype(np.int64)
+    dob = registered.astype('datetime64[D]') - age_days.astype('timedelta64[D]')
+    age_at_registration = age_days // 365
+
+    # heights and weights by age and gender: children grow about 6 cm a year, adults follow the usual BMI spread
+    female = gender == 'Female'
+    adult_height = np.where(female, rng.normal(155, 6.5, count), rng.normal(168, 7, count))
+    child_height = 50 + 6.2 * age_at_registration + rng.normal(0, 4, count)
+    height = np.where(age_at_registration >= 17, adult_height, np.minimum(child_height, adult_height))
+    bmi = np.where(age_at_registration >= 17, rng.normal(23.5, 4, count), rng.normal(16.5, 2, count))
+    weight = np.clip(np.round(bmi * (height / 100) ** 2), 2, services.NUMBER_RANGES['weight'][1])
+    height = np.clip(np.round(height), 45, services.NUMBER_RANGES['height'][1])
+
+    city = _pick(_distribution(CITIES), rng.random(count))
+    cities = list(CITIES)
+    kin_first = np.where(rng.random(count) < 0.5,
+                         np.array(FEMALE_FIRST_NAMES, dtype=object)[rng.integers(0, len(FEMALE_FIRST_NAMES), count)],
+                         np.array(MALE_FIRST_NAMES, dtype=object)[rng.integers(0, len(MALE_FIRST_NAMES), count)])
+    child = age_at_registration < 18
+    relation = np.where(child, np.where(rng.random(count) < 0.6, 'Mother', 'Father'), _choose(rng, KIN_RELATIONS, count))
+    has_email = (rng.random(count) < np.where(age_at_registration < 60, 0.65, 0.25)) & ~child
+    email = [f"{name.lower().replace(' ', '.').replace(chr(39), '')}{n}@mail.example" if has else None
+             for name, n, has in zip(names, numbers, has_email)]
+    registration = _timestamps(registered)
+    return {'patient_record': pd.DataFrame({
+        'id': _ids('patient_record', numbers),
+        'name': names,
+        'gender': gender,
+        'date_of_birth': _dates(dob),
+        'blood_group': _choose(rng, BLOOD_GROUPS, count),
+        'contact_number_1': _phone_numbers(rng, count),
+        'contact_number_2': np.where(rng.random(count) < 0.3, _phone_numbers(rng, count), None),
+        'aadhar_or_voter_id': _aadhar_numbers(seed, numbers),
+        'weight': weight.astype(np.int64),
+        'height': height.astype(np.int64),
+        'address': [f'{h}, {street} Road' for h, street in
+                    zip(rng.integers(1, 500, count), np.array(LAST_NAMES, dtype=object)[rng.integers(0, len(LAST_NAMES), count)])],
+        'city': [cities[i][0] for i in city],
+        'state': [cities[i][1] for i in city],
+        'pin_code': [cities[i][2] + f'{p:03d}' for i, p in zip(city, rng.integers(1, 100, count))],
+        'next_of_kin_name': kin_first + ' ' + last,
+        'next_of_kin_relation_to_patient': relation,
+        'next_of_kin_contact_number': _phone_numbers(rng, count),
+        'email_id': email,
+        'date_of_registration': [r[:10] for r in registration],
+        'time_of_registration': [r[11:] for r in registration],
+    }, columns=PATIENT_COLUMNS)}
+
+def generate_prescriptions(seed, first, count, as_of, patients, doctors):
+    rng = np.random.default_rng([seed, TABLES.index('prescription_record'), first // CHUNK_SIZE])
+    numbers = np.arange(first, first + count)
+    patient = _visit_patients(rng, count, seed, patients)
+    doctor = rng.integers(1, doctors + 1, count)
+    prescribed_at = _visit_times(rng, registration_times(seed, patient, patients, as_of), as_of)
+    prescription_ids = _ids('prescription_record', numbers)
+    prescriptions = pd.DataFrame({
+        'id': prescription_ids,
+        'patient_id': _ids('patient_record', patient),
+        'patient_name': person_names(seed, patient, 'patient_record')[0],
+        'doctor_id': _ids('doctor_record', doctor),
+        'doctor_name': person_names(seed, doctor, 'doctor_record')[0],
+        'diagnosis': _choose(rng, DIAGNOSES, count),
+        'comments': _choose(rng, PRESCRIPTION_COMMENTS, count),
+        'prescribed_at': _timestamps(prescribed_at),
+    }, columns=PRESCRIPTION_COLUMNS)
+
+    lines = _choose(rng, MEDICINE_LINES, count).astype(np.int64)
+    line_count = int(lines.sum())
+    # line numbers restart at 1 for each prescription
+    line_number = np.arange(line_count) - np.repeat(np.cumsum(lines) - lines, lines) + 1
+    popularity = {i: 1 / (i + 1) for i in range(len(MEDICINES))}
+    medicines = pd.DataFrame({
+        'prescription_id': np.repeat(np.array(prescription_ids, dtype=object), lines),
+        'line_number': line_number,
+        'medicine_name': np.array(MEDICINES, dtype=object)[_choose(rng, popularity, line_count).astype(np.int64)],
+        'dosage_description': _choose(rng, DOSAGES, line_count),
+    }, columns=MEDICINE_COLUMNS)
+    return {'prescription_record': prescriptions, 'prescription_medicine': medicines}
+
+def generate_medical_tests(seed, first, count, as_of, patients, doctors):
+    rng = np.random.default_rng([seed, TABLES.index('medical_test_record'), first // CHUNK_SIZE])
+    numbers = np.arange(first, first + count)
+    patient = _visit_patients(rng, count, seed, patients)
+    doctor = rng.integers(1, doctors + 1, count)
+    tested_at = _visit_times(rng, registration_times(seed, patient, patients, as_of), as_of)
+    tests = list(MEDICAL_TESTS)
+    test = _pick(_distribution(MEDICAL_TESTS), rng.random(count))
+    least = np.array([tests[t][2] for t in test])
+    most = np.array([tests[t][3] for t in test])
+    result_at = tested_at + ((least + rng.random(count) * (most - least)) * 3600).astype('timedelta64[s]')
+    # results still being worked on at as_of are awaited
+    awaited = result_at > np.datetime64(as_of, 's')
+    return {'medical_test_record': pd.DataFrame({
+        'id': _ids('medical_test_record', numbers),
+        'test_name': [tests[t][0] for t in test],
+        'patient_id': _ids('patient_record', patient),
+        'patient_name': person_names(seed, patient, 'patient_record')[0],
+        'doctor_id': _ids('doctor_record', doctor),
+        'doctor_name': person_names(seed, doctor, 'doctor_record')[0],
+        'medical_lab_scientist_id': [f'MLS-{n:03d}' for n in rng.integers(1, MEDICAL_LAB_SCIENTISTS + 1, count)],
+        'test_date_time': _timestamps(tested_at),
+        'result_date_time': _timestamps(result_at),
+        'result_and_diagnosis': np.where(awaited, services.RESULT_AWAITED, _choose(rng, TEST_RESULTS, count)),
+        'description': None,
+        'comments': None,
+        'cost': [tests[t][1] for t in test],
+    }, columns=MEDICAL_TEST_COLUMNS)}
+
+# function to stream generated rows into a table with COPY FROM STDIN (same CSV route as bulk_import.py)
+def copy_rows(c, table, frame):
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    c.copy_expert(f"COPY {table} ({', '.join(frame.columns)}) FROM STDIN WITH (FORMAT csv);", buffer)
+
+# function run by the worker processes: generates one chunk of a table and copies it in its own transaction
+# (on a connection of its own, as connections cannot be shared between processes); returns (table, rows)
+def load_chunk(connect_kwargs, generate, args):
+    tables = generate(*args)
+    conn = sql.connect(**connect_kwargs)
+    try:
+        with conn, conn.cursor() as c:
+            for table, frame in tables.items():
+                copy_rows(c, table, frame)
+    finally:
+        conn.close()
+    return next(iter(tables)), len(next(iter(tables.values())))
+
+def _chunks(count):
+    return [(first, min(CHUNK_SIZE, count - first + 1)) for first in range(1, count + 1, CHUNK_SIZE)]
+
+# function to fill the record tables with generated records; sizes come from table_sizes(). The tables must
+# be empty (see truncate). Progress is reported on standard error
+def generate(sizes, seed, as_of=None, workers=None):
+    as_of = as_of or date.today()
+    patients, doctors = sizes['patient_record'], sizes['doctor_record']
+    connect_kwargs = {'host': config.db_host, 'port': config.db_port, 'user': config.db_user,
+                      'password': config.password, 'database': config.db_database}
+    load_chunk(connect_kwargs, generate_departments, (seed,))
+    # patients and doctors are loaded before the prescriptions and tests that reference them
+    phases = [
+        [(generate_doctors, (seed, first, count, as_of)) for first, count in _chunks(doctors)]
+        + [(generate_patients, (seed, first, count, as_of, patients)) for first, count in _chunks(patients)],
+        [(generate_prescriptions, (seed, first, count, as_of, patients, doctors))
+         for first, count in _chunks(sizes['prescription_record'])]
+        + [(generate_medical_tests, (seed, first, count, as_of, patients, doctors))
+           for first, count in _chunks(sizes['medical_test_record'])],
+    ]
+    loaded = dict.fromkeys(TABLES, 0)
+    loaded['department_record'] = len(DEPARTMENTS)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers or config.datagen_workers) as pool:
+        for phase in phases:
+            futures = [pool.submit(load_chunk, connect_kwargs, function, args) for function, args in phase]
+            for future in as_completed(futures):
+                table, rows = future.result()
+                loaded[table] += rows
+                print(f'{table}: {loaded[table]}/{sizes[table]} rows ({time.perf_counter() - start:.0f} s)',
+                      file=sys.stderr)
+
+    with db.session() as (conn, c):
+        # new records get IDs after the generated ones
+        for table, count in sizes.items():
+            c.execute("SELECT setval(%s, %s);", (ids.sequence_name(table), count))
+    analytics.refresh()
+    conn = sql.connect(**connect_kwargs)
+    try:
+        conn.autocommit = True      # VACUUM cannot run inside a transaction
+        with conn.cursor() as c:
+            c.execute("VACUUM ANALYZE;")
+    finally:
+        conn.close()
+
+# function to check whether any of the generated tables holds records
+def has_records():
+    with db.session() as (conn, c):
+        c.execute(f"SELECT EXISTS ({' UNION ALL '.join(f'SELECT 1 FROM {table}' for table in TABLES)});")
+        return c.fetchone()[0]
+
+# function to delete every record (and the analytics summaries built from them)
+def truncate():
+    with db.session() as (conn, c):
+        c.execute(
+            "TRUNCATE prescription_medicine, prescription_record, medical_test_record, patient_record, "
+            "doctor_record, department_record, analytics_registration_delta, analytics_daily_registrations, "
+            "analytics_test_delta, analytics_monthly_tests;"
+        )
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fill the HIMS database with synthetic records for load testing.')
+    parser.add_argument('--patients', type=int, required=True, help='number of patients to generate')
+    parser.add_argument('--patients-per-doctor', type=float, default=PATIENTS_PER_DOCTOR)
+    parser.add_argument('--prescriptions-per-patient', type=float, default=PRESCRIPTIONS_PER_PATIENT)
+    parser.add_argument('--tests-per-patient', type=float, default=MEDICAL_TESTS_PER_PATIENT)
+    parser.add_argument('--seed', type=int, default=42, help='the same seed (and --as-of) gives the same records')
+    parser.add_argument('--as-of', type=date.fromisoformat, default=date.today(),
+                        help='date the records end at, YYYY-MM-DD (default: today)')
+    parser.add_argument('--workers', type=int, default=config.datagen_workers, help='worker processes')
+    parser.add_argument('--database', default=config.db_database, help='database to fill (default: the app database)')
+    parser.add_argument('--truncate', action='store_true', help='delete the existing records first')
+    args = parser.parse_args()
+
+    config.db_database = args.database
+    db.db_init()
+    if args.truncate:
+        truncate()
+    elif has_records():
+        sys.exit(f'{args.database} already holds records; pass --truncate to replace them')
+    sizes = table_sizes(args.patients, args.patients_per_doctor, args.prescriptions_per_patient, args.tests_per_patient)
+    start = time.perf_counter()
+    generate(sizes, args.seed, args.as_of, args.workers)
+    print(f'Generated {sum(sizes.values())} records in {time.perf_counter() - start:.0f} s', file=sys.stderr)
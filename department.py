@@ -1,24 +1,15 @@
 import streamlit as st
-from datetime import datetime
 import database as db
+import ids
 import pandas as pd
+import pagination
+import search
+import services
 import utils
 
 # function to verify department id
 def verify_department_id(department_id):
-    verify = False
-    conn, c = db.connection()
-    try:
-        c.execute("SELECT id FROM department_record;")
-        department_ids = c.fetchall()
-    finally:
-        c.close()
-        conn.close()
-    for id in department_ids:
-        if id[0] == department_id:
-            verify = True
-            break
-    return verify
+    return db.record_exists('department_record', department_id)
 
 # function to show the details of department(s) given in a list (provided as a parameter)
 def show_department_details(list_of_departments):
@@ -33,12 +24,9 @@ def show_department_details(list_of_departments):
         df = pd.DataFrame(data=list_of_departments, columns=department_titles)
         st.write(df)
 
-# function to generate unique department id using current date and time
+# function to generate unique department id (drawn from the department id sequence)
 def generate_department_id():
-    now = datetime.now()
-    id_1 = now.strftime('%S%M%H')
-    id_2 = now.strftime('%Y%m%d')[2:]
-    return f'D-{id_1}-{id_2}'
+    return ids.next_id('department_record')
 
 # function to show the doctor id and name of doctor(s) given in a list (provided as a parameter)
 def show_list_of_doctors(list_of_doctors):
@@ -51,21 +39,7 @@ def show_list_of_doctors(list_of_doctors):
 
 # function to fetch department name from the database for the given department id
 def get_department_name(dept_id):
-    conn, c = db.connection()
-    try:
-        c.execute(
-            """
-            SELECT name
-            FROM department_record
-            WHERE id = %(id)s;
-            """,
-            {'id': dept_id}
-        )
-        result = c.fetchone()
-    finally:
-        c.close()
-        conn.close()
-    return result[0] if result else 'Unknown'
+    return db.record_name('department_record', dept_id) or 'Unknown'
 
 # class containing all the fields and methods required to work with the departments' table in the database
 class Department:
@@ -90,51 +64,21 @@ class Department:
         self.email_id = utils.sanitize_text_input(st.text_input('Email ID'))
 
         # Validate email and phone numbers
-        valid_email = utils.validate_email(self.email_id)
-        valid_phone_1 = utils.validate_phone_number(self.contact_number_1)
-        valid_phone_2 = utils.validate_phone_number(self.contact_number_2)
-
-        if not valid_email:
-            st.error('Invalid email format.')
-            return
-        if not valid_phone_1:
-            st.error('Invalid contact number format.')
-            return
-        if self.contact_number_2 and not valid_phone_2:
-            st.error('Invalid alternate contact number format.')
+        try:
+            services.check_contact_details(self.email_id, self.contact_number_1, self.contact_number_2)
+        except services.ValidationError as e:
+            st.error(str(e))
             return
 
-        self.id = generate_department_id()
         save = st.button('Save')
 
         if save:
             try:
-                conn, c = db.connection()
-                with conn:
-                    c.execute(
-                        """
-                        INSERT INTO department_record (
-                            id, name, description, contact_number_1, contact_number_2,
-                            address, email_id
-                        )
-                        VALUES (
-                            %(id)s, %(name)s, %(desc)s, %(phone_1)s, %(phone_2)s, %(address)s, %(email_id)s
-                        );
-                        """,
-                        {
-                            'id': self.id, 'name': self.name, 'desc': self.description,
-                            'phone_1': self.contact_number_1,
-                            'phone_2': self.contact_number_2, 'address': self.address,
-                            'email_id': self.email_id
-                        }
-                    )
+                self.id = services.add_department(vars(self))
                 st.success('Department details saved successfully.')
                 st.write('The Department ID is: ', self.id)
             except Exception as e:
                 st.error(f'Error saving department details: {e}')
-            finally:
-                c.close()
-                conn.close()
 
     def update_department(self):
         id = utils.sanitize_text_input(st.text_input('Enter Department ID of the department to be updated'))
@@ -145,21 +89,11 @@ class Department:
         else:
             st.success('Verified')
             try:
-                conn, c = db.connection()
-                with conn:
-                    c.execute(
-                        """
-                        SELECT *
-                        FROM department_record
-                        WHERE id = %(id)s;
-                        """,
-                        {'id': id}
-                    )
-                    department_data = c.fetchall()
                 st.write('Here are the current details of the department:')
-                show_department_details(department_data)
+                show_department_details([services.get_department(id)])
 
                 st.write('Enter new details of the department:')
+                self.name = utils.sanitize_text_input(st.text_input('Department name (leave blank to keep the current name)'))
                 self.description = utils.sanitize_text_input(st.text_area('Description'))
                 self.contact_number_1 = utils.sanitize_text_input(st.text_input('Contact number'))
                 contact_number_2 = st.text_input('Alternate contact number (optional)')
@@ -168,46 +102,22 @@ class Department:
                 self.email_id = utils.sanitize_text_input(st.text_input('Email ID'))
 
                 # Validate email and phone numbers
-                valid_email = utils.validate_email(self.email_id)
-                valid_phone_1 = utils.validate_phone_number(self.contact_number_1)
-                valid_phone_2 = utils.validate_phone_number(self.contact_number_2)
-
-                if not valid_email:
-                    st.error('Invalid email format.')
-                    return
-                if not valid_phone_1:
-                    st.error('Invalid contact number format.')
-                    return
-                if self.contact_number_2 and not valid_phone_2:
-                    st.error('Invalid alternate contact number format.')
+                try:
+                    services.check_contact_details(self.email_id, self.contact_number_1, self.contact_number_2)
+                except services.ValidationError as e:
+                    st.error(str(e))
                     return
 
                 update = st.button('Update')
 
                 if update:
-                    c.execute(
-                        """
-                        UPDATE department_record
-                        SET description = %(desc)s,
-                            contact_number_1 = %(phone_1)s,
-                            contact_number_2 = %(phone_2)s,
-                            address = %(address)s,
-                            email_id = %(email_id)s
-                        WHERE id = %(id)s;
-                        """,
-                        {
-                            'id': id, 'desc': self.description,
-                            'phone_1': self.contact_number_1,
-                            'phone_2': self.contact_number_2,
-                            'address': self.address, 'email_id': self.email_id
-                        }
-                    )
+                    details = {field: getattr(self, field) for field in services.DEPARTMENT_UPDATE_FIELDS}
+                    if not self.name:
+                        del details['name']
+                    services.update_department(id, details)
                     st.success('Department details updated successfully.')
             except Exception as e:
                 st.error(f'Error updating department details: {e}')
-            finally:
-                c.close()
-                conn.close()
 
     def delete_department(self):
         id = st.text_input('Enter Department ID of the department to be deleted')
@@ -217,65 +127,25 @@ class Department:
             st.error('Invalid Department ID')
         else:
             st.success('Verified')
-            conn, c = db.connection()
-            with conn:
-                c.execute(
-                    """
-                    SELECT *
-                    FROM department_record
-                    WHERE id = %(id)s;
-                    """,
-                    {'id': id}
-                )
-                department_data = c.fetchall()
             st.write('Here are the details of the department to be deleted:')
-            show_department_details(department_data)
+            show_department_details([services.get_department(id)])
 
             confirm = st.checkbox('Check this box to confirm deletion')
             if confirm:
                 delete = st.button('Delete')
                 if delete:
-                    with conn:
-                        c.execute(
-                            """
-                            DELETE FROM department_record
-                            WHERE id = %(id)s;
-                            """,
-                            {'id': id}
-                        )
+                    try:
+                        services.delete_department(id)
+                    except (services.Conflict, services.NotFound) as e:
+                        st.error(str(e))
+                        return
                     st.success('Department details deleted successfully.')
-            conn.close()
 
     def show_all_departments(self):
-        conn, c = db.connection()
-        with conn:
-            c.execute("SELECT * FROM department_record;")
-            departments = c.fetchall()
-        show_department_details(departments)
-        conn.close()
+        pagination.browse_records('department_record', show_department_details, 'Department', services.DEPARTMENT_COLUMNS)
 
     def search_department(self):
-        id = st.text_input('Enter Department ID of the department to be searched')
-        if not id:
-            return
-        elif not verify_department_id(id):
-            st.error('Invalid Department ID')
-        else:
-            st.success('Verified')
-            conn, c = db.connection()
-            with conn:
-                c.execute(
-                    """
-                    SELECT *
-                    FROM department_record
-                    WHERE id = %(id)s;
-                    """,
-                    {'id': id}
-                )
-                department_data = c.fetchall()
-            st.write('Here are the details of the department you searched for:')
-            show_department_details(department_data)
-            conn.close()
+        search.search_screen('department_record', show_department_details, 'Department', services.DEPARTMENT_COLUMNS)
 
     def list_dept_doctors(self):
         dept_id = st.text_input('Enter Department ID to get a list of doctors working in that department')
@@ -285,17 +155,6 @@ class Department:
             st.error('Invalid Department ID')
         else:
             st.success('Verified')
-            conn, c = db.connection()
-            with conn:
-                c.execute(
-                    """
-                    SELECT id, name
-                    FROM doctor_record
-                    WHERE department_id = %(dept_id)s;
-                    """,
-                    {'dept_id': dept_id}
-                )
-                doctor_data = c.fetchall()
+            doctor_data = db.cached_read(('doctor_record',), services.doctors_in_department, dept_id)
             st.write(f"Here is the list of doctors working in the {get_department_name(dept_id)} department:")
             show_list_of_doctors(doctor_data)
-            conn.close()
@@ -0,0 +1,159 @@
+import argparse
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+from psycopg2 import sql as query
+import config
+import database as db
+import services
+
+FORMATS = ['csv', 'parquet']
+
+# record tables that can be exported, with the column used for date range filters (if any)
+EXPORT_DATE_COLUMNS = {
+    'patient_record': 'date_of_registration',
+    'doctor_record': None,
+    'department_record': None,
+    'prescription_record': None,
+    'medical_test_record': 'test_date_time',
+    'prescription_medicine': None,
+}
+
+# columns exported after the stored ones: ages are derived from the date of birth (see services.AGE_COLUMN)
+EXPORT_DERIVED_COLUMNS = {
+    'patient_record': [services.AGE_COLUMN],
+    'doctor_record': [services.AGE_COLUMN],
+}
+
+# rows are exported in primary key order
+EXPORT_KEYS = {'prescription_medicine': ['prescription_id', 'line_number']}
+
+# Arrow types for the PostgreSQL column types used by the record tables (keyed by type OID); any other
+# type is exported as text
+ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int16(),
+    23: pa.int32(),
+    700: pa.float32(),
+    701: pa.float64(),
+    1082: pa.date32(),
+    1083: pa.time64('us'),
+    1114: pa.timestamp('us'),
+}
+
+# function to get the column names of a table (filters may only use these)
+def table_columns(table):
+    with db.session() as (conn, c):
+        c.execute(
+            """
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %(table)s
+            ORDER BY ordinal_position;
+            """,
+            {'table': table}
+        )
+        return [row[0] for row in c.fetchall()]
+
+# function to build the export query: equality filters on any columns, plus an optional date range (both
+# ends inclusive, whole days) on the table's date column
+def build_query(table, filters=None, since=None, until=None):
+    if table not in EXPORT_DATE_COLUMNS:
+        raise ValueError(f'Unknown record table: {table}')
+    conditions, params = [], []
+    for column, value in (filters or {}).items():
+        conditions.append(query.SQL('{} = %s').format(query.Identifier(column)))
+        params.append(value)
+    date_column = EXPORT_DATE_COLUMNS[table]
+    if (since or until) and date_column is None:
+        raise ValueError(f'{table} has no date column to filter on')
+    if since:
+        conditions.append(query.SQL('{} >= %s::date').format(query.Identifier(date_column)))
+        params.append(since)
+    if until:
+        conditions.append(query.SQL('{} < %s::date + 1').format(query.Identifier(date_column)))
+        params.append(until)
+
+    selected = query.SQL(', ').join(map(query.SQL, ['*'] + EXPORT_DERIVED_COLUMNS.get(table, [])))
+    statement = query.SQL('SELECT {} FROM {}').format(selected, query.Identifier(table))
+    if conditions:
+        statement += query.SQL(' WHERE ') + query.SQL(' AND ').join(conditions)
+    key = query.SQL(', ').join(query.Identifier(column) for column in EXPORT_KEYS.get(table, ['id']))
+    return statement + query.SQL(' ORDER BY ') + key, params
+
+# function to stream the selected rows of a table into a binary file object as CSV (with a header row);
+# the rows go straight from COPY TO STDOUT into the file, so memory use does not depend on the table size
+def export_csv(table, out, filters=None, since=None, until=None):
+    statement, params = build_query(table, filters, since, until)
+    with db.session() as (conn, c):
+        select = c.mogrify(statement, params).decode()
+        c.copy_expert(f"COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER);", out)
+        return c.rowcount
+
+# function to stream the selected rows of a table into a file (path or binary file object) as Parquet; rows
+# are read through a server-side cursor and written one row group of config.export_chunk_size rows at a time.
+# If the export fails, the writer is still closed, but what was written so far is left in out
+def export_parquet(table, out, filters=None, since=None, until=None):
+    statement, params = build_query(table, filters, since, until)
+    count = 0
+    writer = None
+    try:
+        with db.session() as (conn, c):
+            with conn.cursor(name=f'{table}_export') as export_cursor:
+                export_cursor.itersize = config.export_chunk_size
+                export_cursor.execute(statement, params)
+                while True:
+                    rows = export_cursor.fetchmany(config.export_chunk_size)
+                    if writer is None:
+                        schema = pa.schema([
+                            (column.name, ARROW_TYPES.get(column.type_code, pa.string()))
+                            for column in export_cursor.description
+                        ])
+                        writer = pq.ParquetWriter(out, schema)
+                    if not rows:
+                        break
+                    columns = list(zip(*rows))
+                    writer.write_table(pa.Table.from_arrays(
+                        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                        schema=schema
+                    ))
+                    count += len(rows)
+    finally:
+        if writer is not None:      # also on failure, so the file is not left open
+            writer.close()
+    return count
+
+# function to export a table in the given format ('csv' or 'parquet'); returns the number of rows written
+def export_table(table, out, file_format, filters=None, since=None, until=None):
+    if file_format == 'csv':
+        return export_csv(table, out, filters, since, until)
+    if file_format == 'parquet':
+        return export_parquet(table, out, filters, since, until)
+    raise ValueError(f'Unknown export format: {file_format}')
+
+# headless entry point, e.g. python export.py patient_record patients.parquet --filter city=Pune --since 2026-01-01
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export a record table to CSV or Parquet.')
+    parser.add_argument('table', choices=list(EXPORT_DATE_COLUMNS))
+    parser.add_argument('file', help='output file')
+    parser.add_argument('--format', choices=FORMATS, help='output format (default: taken from the file extension)')
+    parser.add_argument('--filter', action='append', default=[], metavar='COLUMN=VALUE',
+                        help='only export rows where COLUMN equals VALUE (may be repeated)')
+    parser.add_argument('--since', help='only export rows on or after this date (YYYY-MM-DD)')
+    parser.add_argument('--until', help='only export rows on or before this date (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    db.db_init()
+    file_format = args.format or ('parquet' if args.file.endswith('.parquet') else 'csv')
+    filters = dict(f.split('=', 1) for f in args.filter)
+    unknown = set(filters) - set(table_columns(args.table))
+    if unknown:
+        parser.error(f'unknown column(s) for {args.table}: {", ".join(sorted(unknown))}')
+    try:
+        with open(args.file, 'wb') as out:
+            count = export_table(args.table, out, file_format, filters, args.since, args.until)
+    except BaseException:
+        os.remove(args.file)        # do not leave a half-written export behind
+        raise
+    print(f'{count} rows exported to {args.file}')
@@ -5,19 +5,15 @@ from department import Department
 from doctor import Doctor
 from prescription import Prescription
 from medical_test import Medical_Test
+import analytics
+import audit
+import changes
+import export
 import config
 import psycopg2 as sql
-
-def connection():
-    conn = psycopg2.connect(
-        host=config.db_host,
-        port=config.db_port,
-        user=config.db_user,
-        password=config.password,
-        database=config.db_database
-    )
-    c = conn.cursor()
-    return conn, c
+import tempfile
+import pandas as pd
+import querylog
 
 # function to verify edit mode password
 def verify_edit_mode_password():
@@ -46,10 +42,10 @@ def verify_dr_mls_access_code():
 # function to perform various operations of the patient module (according to user's selection)
 def patients():
     st.header('PATIENTS')
-    option_list = ['', 'Add patient', 'Update patient', 'Delete patient', 'Show complete patient record', 'Search patient']
+    option_list = ['', 'Add patient', 'Update patient', 'Delete patient', 'Show complete patient record', 'Search patient', 'Import patients from a file', 'Show patient timeline']
     option = st.sidebar.selectbox('Select function', option_list)
     p = Patient()
-    if (option == option_list[1] or option == option_list[2] or option == option_list[3]) and verify_edit_mode_password():
+    if (option == option_list[1] or option == option_list[2] or option == option_list[3] or option == option_list[6]) and verify_edit_mode_password():
         if option == option_list[1]:
             st.subheader('ADD PATIENT')
             p.add_patient()
@@ -62,12 +58,18 @@ def patients():
                 p.delete_patient()
             except sql.IntegrityError:      # handles foreign key constraint failure issue (due to integrity error)
                 st.error('This entry cannot be deleted as other records are using it.')
+        elif option == option_list[6]:
+            st.subheader('IMPORT PATIENTS')
+            p.import_patients()
     elif option == option_list[4]:
         st.subheader('COMPLETE PATIENT RECORD')
         p.show_all_patients()
     elif option == option_list[5]:
         st.subheader('SEARCH PATIENT')
         p.search_patient()
+    elif option == option_list[7]:
+        st.subheader('PATIENT TIMELINE')
+        p.show_patient_timeline()
 
 # function to perform various operations of the doctor module (according to user's selection)
 def doctors():
@@ -98,10 +100,10 @@ def doctors():
 # function to perform various operations of the prescription module (according to user's selection)
 def prescriptions():
     st.header('PRESCRIPTIONS')
-    option_list = ['', 'Add prescription', 'Update prescription', 'Delete prescription', 'Show prescriptions of a particular patient']
+    option_list = ['', 'Add prescription', 'Update prescription', 'Delete prescription', 'Show prescriptions of a particular patient', 'Drug recall']
     option = st.sidebar.selectbox('Select function', option_list)
     m = Prescription()
-    if (option == option_list[1] or option == option_list[2] or option == option_list[3]) and verify_dr_mls_access_code():
+    if (option == option_list[1] or option == option_list[2] or option == option_list[3] or option == option_list[5]) and verify_dr_mls_access_code():
         if option == option_list[1]:
             st.subheader('ADD PRESCRIPTION')
             m.add_prescription()
@@ -111,6 +113,9 @@ def prescriptions():
         elif option == option_list[3]:
             st.subheader('DELETE PRESCRIPTION')
             m.delete_prescription()
+        elif option == option_list[5]:
+            st.subheader('DRUG RECALL: PATIENTS PRESCRIBED A MEDICINE')
+            m.drug_recall()
     elif option == option_list[4]:
         st.subheader('PRESCRIPTIONS OF A PARTICULAR PATIENT')
         m.prescriptions_by_patient()
@@ -164,10 +169,81 @@ def departments():
         st.subheader('DOCTORS OF A PARTICULAR DEPARTMENT')
         d.list_dept_doctors()
 
+# function to show the analytics dashboard (registrations, tests and revenue)
+def analytics_dashboard():
+    st.header('ANALYTICS')
+    analytics.show_dashboard()
+
+# function to export a record table (optionally filtered) as a CSV or Parquet download
+def exports():
+    st.header('EXPORT RECORDS')
+    if not verify_edit_mode_password():
+        return
+    tables = {
+        'Patients': 'patient_record', 'Doctors': 'doctor_record', 'Departments': 'department_record',
+        'Prescriptions': 'prescription_record', 'Prescription medicines': 'prescription_medicine',
+        'Medical Tests': 'medical_test_record'
+    }
+    records = st.selectbox('Records to export', list(tables))
+    table = tables[records]
+    file_format = st.radio('File format', export.FORMATS, format_func=str.upper, horizontal=True)
+    filters = {}
+    filter_column = st.selectbox('Only export records where (optional)', [''] + export.table_columns(table))
+    if filter_column:
+        filters[filter_column] = st.text_input(f'{filter_column} equals')
+    since = until = None
+    date_column = export.EXPORT_DATE_COLUMNS[table]
+    if date_column and st.checkbox(f'Limit by {date_column}'):
+        since = st.date_input('From')
+        until = st.date_input('To')
+    if st.button('Prepare export'):
+        # the export is streamed to a temporary file while it runs, but Streamlit holds a download in memory,
+        # so exports over config.export_download_limit_mb are left to the command line
+        with tempfile.TemporaryFile() as out:
+            try:
+                count = export.export_table(table, out, file_format, filters, since, until)
+            except Exception as e:
+                st.error(f'Error exporting {records.lower()}: {e}')
+                return
+            size_mb = out.tell() / 2**20
+            if size_mb > config.export_download_limit_mb:
+                st.warning(f'The export of {count} records is {size_mb:.0f} MB, too large to download here; '
+                           'use the command line instead: python export.py --help')
+                return
+            out.seek(0)
+            st.success(f'{count} records ready to download.')
+            st.download_button('Download', out.read(), f'{table}.{file_format}',
+                               'text/csv' if file_format == 'csv' else 'application/octet-stream')
+
+# function to check the stored records against the validation rules and list the problems found
+def data_quality():
+    st.header('DATA QUALITY AUDIT')
+    if not verify_edit_mode_password():
+        return
+    audit.audit_screen()
+
+# function to show the SQL statements run by this page render in the sidebar (see config.query_stats_panel),
+# with statements repeated once per row of a list (N+1 lookups) flagged
+def query_statistics():
+    statements = querylog.render_statements() or []
+    count, total_ms, rows = querylog.totals(statements)
+    with st.sidebar.expander(f'Query statistics: {count} statements, {total_ms:.1f} ms'):
+        for fingerprint, runs, identical, callers in querylog.repeated_statements(statements):
+            st.warning(f'Run {runs} times ({identical} with values already looked up) by {callers}: {fingerprint}')
+        st.write(f'This page: {count} statements, {total_ms:.1f} ms, {rows} rows')
+        st.dataframe(pd.DataFrame(querylog.by_fingerprint(statements),
+                                  columns=['Statement', 'Runs', 'Total (ms)', 'Rows', 'Run by']))
+        st.write('All statements since the app started, by latency')
+        st.dataframe(pd.DataFrame(querylog.latency_histogram(), columns=['Latency', 'Statements']))
+        st.write('Lookup caches')
+        st.dataframe(pd.DataFrame(db.cache_stats()).T)
+        listener = changes.listener_stats()
+        st.write(f"Change listener: {'connected' if listener['connected'] else 'not connected'}, "
+                 f"{listener['notifications']} notifications, {listener['reconnects']} reconnections")
+
 # function to implement and initialise home/main menu on successful user authentication
 def home():
-    db.db_init()        # establishes connection to the database and create tables (if they don't exist yet)
-    option = st.sidebar.selectbox('Select module', ['', 'Patients', 'Doctors', 'Prescriptions', 'Medical Tests', 'Departments'])
+    option = st.sidebar.selectbox('Select module', ['', 'Patients', 'Doctors', 'Prescriptions', 'Medical Tests', 'Departments', 'Analytics', 'Export', 'Data Quality'])
     if option == 'Patients':
         patients()
     elif option == 'Doctors':
@@ -178,12 +254,24 @@ def home():
         medical_tests()
     elif option == 'Departments':
         departments()
+    elif option == 'Analytics':
+        analytics_dashboard()
+    elif option == 'Export':
+        exports()
+    elif option == 'Data Quality':
+        data_quality()
+
+querylog.start_render()     # statements from here on are counted for this render's query statistics
+db.db_init()        # applies pending schema migrations once per process; a no-op on later reruns
+changes.start_listener()        # keeps this process's caches in step with the other app processes' writes
 
 st.title('HEALTHCARE INFORMATION MANAGEMENT SYSTEM')
 password = st.sidebar.text_input('Enter password', type = 'password')       # user password authentication
 if password == config.password:
     st.sidebar.success('Verified')
     home()
+    if config.query_stats_panel:
+        query_statistics()
 elif password == '':
     st.empty()
 else:
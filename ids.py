@@ -0,0 +1,49 @@
+import threading
+import config
+import database as db
+
+# ID prefix of each record table; IDs look like P-00-000123 (see utils.validate_id_format)
+ID_PREFIXES = {
+    'patient_record': 'P',
+    'doctor_record': 'DR',
+    'department_record': 'D',
+    'medical_test_record': 'T',
+    'prescription_record': 'M',
+}
+
+# the eight digits of an ID hold the value of the table's sequence, so each table has room for this many IDs
+MAX_ID_NUMBER = 99_999_999
+
+_blocks = {table: [] for table in ID_PREFIXES}     # per-table IDs reserved but not handed out yet
+_blocks_lock = threading.Lock()
+
+# function to get the name of the sequence backing the IDs of a table
+def sequence_name(table):
+    return f'{table}_id_seq'
+
+# function to format a sequence value as a record ID
+def format_id(table, number):
+    return f'{ID_PREFIXES[table]}-{number // 1_000_000:02d}-{number % 1_000_000:06d}'
+
+# function to reserve count new IDs for a table in one round trip (e.g. for a batch insert); the IDs are
+# unique across all app processes and increase in the order they were reserved
+def reserve_ids(table, count):
+    if table not in ID_PREFIXES:
+        raise ValueError(f'Unknown record table: {table}')
+    if count <= 0:
+        return []
+    with db.session() as (conn, c):
+        c.execute(
+            "SELECT nextval(%(seq)s) FROM generate_series(1, %(count)s);",
+            {'seq': sequence_name(table), 'count': count}
+        )
+        return [format_id(table, row[0]) for row in c.fetchall()]
+
+# function to get one new ID for a table; IDs are reserved from the database in blocks of
+# config.id_block_size, so most calls are served from memory
+def next_id(table):
+    with _blocks_lock:
+        block = _blocks[table]
+        if not block:
+            block.extend(reversed(reserve_ids(table, config.id_block_size)))
+        return block.pop()
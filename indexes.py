@@ -0,0 +1,145 @@
+import json
+
+# secondary indexes managed by the schema migrations: (index name, table, indexed column(s))
+FOREIGN_KEY_INDEXES = [
+    ('doctor_record_department_id_idx', 'doctor_record', 'department_id'),
+    ('prescription_record_patient_id_idx', 'prescription_record', 'patient_id'),
+    ('prescription_record_doctor_id_idx', 'prescription_record', 'doctor_id'),
+    ('medical_test_record_patient_id_idx', 'medical_test_record', 'patient_id'),
+    ('medical_test_record_doctor_id_idx', 'medical_test_record', 'doctor_id'),
+]
+
+CHRONOLOGICAL_INDEXES = [
+    ('patient_record_date_of_registration_idx', 'patient_record', 'date_of_registration'),
+    ('medical_test_record_test_date_time_idx', 'medical_test_record', 'test_date_time'),
+]
+
+# age filters (see services.age_range) select a range of dates of birth
+AGE_INDEXES = [
+    ('patient_record_date_of_birth_idx', 'patient_record', 'date_of_birth'),
+]
+
+# columns matched by the search screens (see search.py), always compared in lower case
+SEARCH_COLUMNS = {
+    'patient_record': ['name', 'contact_number_1', 'aadhar_or_voter_id'],
+    'doctor_record': ['name', 'contact_number_1', 'aadhar_or_voter_id'],
+    'department_record': ['name'],
+}
+
+# in the C collation a btree index serves prefix matches (lower(name) LIKE 'ram%') and also returns them
+# in order, so a search can stop after the first few matches
+SEARCH_INDEXES = [
+    (f'{table}_{column}_prefix_idx', table, f'(lower({column}) COLLATE "C")')
+    for table, columns in SEARCH_COLUMNS.items() for column in columns
+]
+
+# GIN trigram indexes serve matches anywhere in the value; they are only built where the pg_trgm
+# extension can be installed, so they are not reported as missing
+TRIGRAM_INDEXES = [
+    (f'{table}_{column}_trgm_idx', table, f'lower({column}) gin_trgm_ops')
+    for table, columns in SEARCH_COLUMNS.items() for column in columns
+]
+
+# medicine lookups for drug recalls: exact or prefix matches on the normalised medicine name
+MEDICINE_INDEXES = [
+    ('prescription_medicine_medicine_key_idx', 'prescription_medicine', 'medicine_key text_pattern_ops, prescription_id'),
+]
+
+MANAGED_INDEXES = FOREIGN_KEY_INDEXES + CHRONOLOGICAL_INDEXES + AGE_INDEXES + SEARCH_INDEXES + MEDICINE_INDEXES
+
+# the application's hot lookups, used by the report to show which index (if any) each one is planned with
+INDEXED_QUERIES = [
+    ('Department.list_dept_doctors',
+     "SELECT id, name FROM doctor_record WHERE department_id = %(id)s;"),
+    ('Prescription.prescriptions_by_patient',
+     "SELECT * FROM prescription_record WHERE patient_id = %(id)s;"),
+    ('Medical_Test.medical_tests_by_patient',
+     "SELECT * FROM medical_test_record WHERE patient_id = %(id)s;"),
+    ('Prescription.drug_recall',
+     "SELECT prescription_id FROM prescription_medicine WHERE medicine_key LIKE %(id)s;"),
+    ('ON DELETE RESTRICT check for patients (prescriptions)',
+     "SELECT 1 FROM prescription_record WHERE patient_id = %(id)s;"),
+    ('ON DELETE RESTRICT check for patients (medical tests)',
+     "SELECT 1 FROM medical_test_record WHERE patient_id = %(id)s;"),
+    ('ON DELETE RESTRICT check for doctors (prescriptions)',
+     "SELECT 1 FROM prescription_record WHERE doctor_id = %(id)s;"),
+    ('ON DELETE RESTRICT check for doctors (medical tests)',
+     "SELECT 1 FROM medical_test_record WHERE doctor_id = %(id)s;"),
+    ('ON DELETE RESTRICT check for departments',
+     "SELECT 1 FROM doctor_record WHERE department_id = %(id)s;"),
+]
+
+# function to list the hot queries with the parameters to EXPLAIN them with: INDEXED_QUERIES, and the queries
+# built from the service layer's conditions, such as the first page of a ten year age band (services is imported
+# here, not at the top, as it imports the database module, which imports this one)
+def indexed_queries():
+    import services
+    where, params = services.age_range(30, 40)
+    return [(label, query, {'id': ''}) for label, query in INDEXED_QUERIES] + [
+        ('Patient.show_all_patients (age filter)',
+         f"SELECT id FROM patient_record WHERE TRUE AND ({where}) ORDER BY id ASC LIMIT %(limit)s;",
+         {**params, 'limit': 26}),
+    ]
+
+# function to build an index without blocking writes to the table (the cursor's connection must be in
+# autocommit mode); an invalid index left behind by an interrupted build is dropped and rebuilt
+def create_index_concurrently(c, name, table, columns, method='btree'):
+    c.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s);", (name,))
+    row = c.fetchone()
+    if row and row[0]:
+        return
+    if row:
+        c.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+    c.execute(f"CREATE INDEX CONCURRENTLY {name} ON {table} USING {method} ({columns});")
+
+# function to collect, for every managed index, its size and how often it has been scanned, and for every
+# hot query, the indexes its current plan uses
+def index_report(c):
+    names = [name for name, _, _ in MANAGED_INDEXES + TRIGRAM_INDEXES]
+    c.execute(
+        """
+        SELECT s.indexrelname, s.relname, s.idx_scan, pg_size_pretty(pg_relation_size(s.indexrelid)),
+               i.indisvalid
+        FROM pg_stat_user_indexes s
+        JOIN pg_index i ON i.indexrelid = s.indexrelid
+        WHERE s.indexrelname = ANY(%(names)s)
+        ORDER BY s.relname, s.indexrelname;
+        """,
+        {'names': names}
+    )
+    index_rows = c.fetchall()
+    found = {row[0] for row in index_rows}
+    missing = [name for name, _, _ in MANAGED_INDEXES if name not in found]
+
+    query_rows = []
+    for label, query, params in indexed_queries():
+        c.execute("EXPLAIN (FORMAT JSON) " + query, params)
+        plan = c.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        used = sorted(_plan_indexes(plan[0]['Plan']))
+        query_rows.append((label, ', '.join(used) if used else 'sequential scan'))
+    return index_rows, missing, query_rows
+
+def _plan_indexes(node):
+    used = set()
+    if 'Index Name' in node:
+        used.add(node['Index Name'])
+    for child in node.get('Plans', []):
+        used |= _plan_indexes(child)
+    return used
+
+# running this module directly prints the index report
+if __name__ == '__main__':
+    import database as db
+    db.db_init()
+    with db.session() as (conn, c):
+        index_rows, missing, query_rows = index_report(c)
+    print('Managed indexes (name, table, scans, size, valid):')
+    for row in index_rows:
+        print('  ' + ' | '.join(str(x) for x in row))
+    for name in missing:
+        print(f'  {name} | MISSING')
+    print('Hot queries and the indexes their plans use:')
+    for label, used in query_rows:
+        print(f'  {label}: {used}')
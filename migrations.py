@@ -0,0 +1,548 @@
+import psycopg2 as sql
+import changes
+import config
+import ids
+import indexes
+import names
+
+# key of the PostgreSQL advisory lock that serialises schema migrations between app processes
+MIGRATION_LOCK_ID = 7_240_611
+
+# ordered list of (version, description, function, transactional) tuples, filled in by the @migration decorator
+MIGRATIONS = []
+
+# decorator to register a function as a schema migration; migrations run in ascending version order, each
+# exactly once per database. Non-transactional migrations run in autocommit mode (needed for statements
+# like CREATE INDEX CONCURRENTLY) and must therefore be safe to re-run if they are interrupted.
+def migration(version, description, transactional=True):
+    def register(function):
+        if any(m[0] == version for m in MIGRATIONS):
+            raise ValueError(f'Duplicate migration version {version}')
+        MIGRATIONS.append((version, description, function, transactional))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return function
+    return register
+
+@migration(1, 'initial schema')
+def initial_schema(c):
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS department_record (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            description TEXT NOT NULL,
+            contact_number_1 TEXT NOT NULL,
+            contact_number_2 TEXT,
+            address TEXT NOT NULL,
+            email_id TEXT NOT NULL UNIQUE
+        );
+        """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS patient_record (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            age INTEGER NOT NULL,
+            gender TEXT NOT NULL,
+            date_of_birth TEXT NOT NULL,
+            blood_group TEXT NOT NULL,
+            contact_number_1 TEXT NOT NULL,
+            contact_number_2 TEXT,
+            aadhar_or_voter_id TEXT NOT NULL UNIQUE,
+            weight INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            address TEXT NOT NULL,
+            city TEXT NOT NULL,
+            state TEXT NOT NULL,
+            pin_code TEXT NOT NULL,
+            next_of_kin_name TEXT NOT NULL,
+            next_of_kin_relation_to_patient TEXT NOT NULL,
+            next_of_kin_contact_number TEXT NOT NULL,
+            email_id TEXT,
+            date_of_registration TEXT NOT NULL,
+            time_of_registration TEXT NOT NULL
+        );
+        """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS doctor_record (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            age INTEGER NOT NULL,
+            gender TEXT NOT NULL,
+            date_of_birth TEXT NOT NULL,
+            blood_group TEXT NOT NULL,
+            department_id TEXT NOT NULL,
+            department_name TEXT NOT NULL,
+            contact_number_1 TEXT NOT NULL,
+            contact_number_2 TEXT,
+            aadhar_or_voter_id TEXT NOT NULL UNIQUE,
+            email_id TEXT NOT NULL UNIQUE,
+            qualification TEXT NOT NULL,
+            specialisation TEXT NOT NULL,
+            years_of_experience INTEGER NOT NULL,
+            address TEXT NOT NULL,
+            city TEXT NOT NULL,
+            state TEXT NOT NULL,
+            pin_code TEXT NOT NULL,
+            FOREIGN KEY (department_id) REFERENCES department_record(id)
+            ON UPDATE CASCADE
+            ON DELETE RESTRICT
+        );
+        """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS prescription_record (
+            id TEXT PRIMARY KEY,
+            patient_id TEXT NOT NULL,
+            patient_name TEXT NOT NULL,
+            doctor_id TEXT NOT NULL,
+            doctor_name TEXT NOT NULL,
+            diagnosis TEXT NOT NULL,
+            comments TEXT,
+            medicine_1_name TEXT NOT NULL,
+            medicine_1_dosage_description TEXT NOT NULL,
+            medicine_2_name TEXT,
+            medicine_2_dosage_description TEXT,
+            medicine_3_name TEXT,
+            medicine_3_dosage_description TEXT,
+            FOREIGN KEY (patient_id) REFERENCES patient_record(id)
+            ON UPDATE CASCADE
+            ON DELETE RESTRICT,
+            FOREIGN KEY (doctor_id) REFERENCES doctor_record(id)
+            ON UPDATE CASCADE
+            ON DELETE RESTRICT
+        );
+        """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS medical_test_record (
+            id TEXT PRIMARY KEY,
+            test_name TEXT NOT NULL,
+            patient_id TEXT NOT NULL,
+            patient_name TEXT NOT NULL,
+            doctor_id TEXT NOT NULL,
+            doctor_name TEXT NOT NULL,
+            medical_lab_scientist_id TEXT NOT NULL,
+            test_date_time TEXT NOT NULL,
+            result_date_time TEXT NOT NULL,
+            result_and_diagnosis TEXT,
+            description TEXT,
+            comments TEXT,
+            cost INTEGER NOT NULL,
+            FOREIGN KEY (patient_id) REFERENCES patient_record(id)
+            ON UPDATE CASCADE
+            ON DELETE RESTRICT,
+            FOREIGN KEY (doctor_id) REFERENCES doctor_record(id)
+            ON UPDATE CASCADE
+            ON DELETE RESTRICT
+        );
+        """
+    )
+
+# built concurrently so that upgrading a live deployment does not lock the record tables against writes
+@migration(2, 'foreign key indexes', transactional=False)
+def foreign_key_indexes(c):
+    for name, table, columns in indexes.FOREIGN_KEY_INDEXES:
+        indexes.create_index_concurrently(c, name, table, columns)
+
+# date/time columns converted from the original TEXT formats to native types:
+# (table, column, new type, SQL expression converting the old text value in {value})
+TYPED_DATE_COLUMNS = [
+    ('patient_record', 'date_of_birth', 'DATE', "to_date({value}, 'DD-MM-YYYY')"),
+    ('patient_record', 'date_of_registration', 'DATE', "to_date({value}, 'DD-MM-YYYY')"),
+    ('patient_record', 'time_of_registration', 'TIME', "{value}::time"),
+    ('doctor_record', 'date_of_birth', 'DATE', "to_date({value}, 'DD-MM-YYYY')"),
+    ('medical_test_record', 'test_date_time', 'TIMESTAMP', "to_timestamp({value}, 'DD-MM-YYYY (HH24:MI)')::timestamp"),
+    ('medical_test_record', 'result_date_time', 'TIMESTAMP', "to_timestamp({value}, 'DD-MM-YYYY (HH24:MI)')::timestamp"),
+]
+
+def _typed_date_tables():
+    tables = {}
+    for table, column, column_type, conversion in TYPED_DATE_COLUMNS:
+        tables.setdefault(table, []).append((column, column_type, conversion))
+    return tables
+
+# the date conversion runs in three steps so that no step holds a long lock on a large table:
+# typed shadow columns are added and kept in sync by a trigger, existing rows are backfilled in small
+# committed batches, and finally the shadow columns replace the text columns
+@migration(3, 'typed date columns: add shadow columns and sync trigger')
+def add_typed_date_columns(c):
+    for table, columns in _typed_date_tables().items():
+        for column, column_type, _ in columns:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column}_typed {column_type};")
+        assignments = ''.join(
+            f"    NEW.{column}_typed := {conversion.format(value=f'NEW.{column}')};\n"
+            for column, _, conversion in columns
+        )
+        c.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION {table}_sync_typed_dates() RETURNS trigger AS $$
+            BEGIN
+            {assignments}    RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+            """
+        )
+        c.execute(f"DROP TRIGGER IF EXISTS {table}_sync_typed_dates ON {table};")
+        c.execute(
+            f"""
+            CREATE TRIGGER {table}_sync_typed_dates
+            BEFORE INSERT OR UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {table}_sync_typed_dates();
+            """
+        )
+
+# resumable: rows converted by an earlier, interrupted run are skipped
+@migration(4, 'typed date columns: backfill existing rows in batches', transactional=False)
+def backfill_typed_date_columns(c):
+    for table, columns in _typed_date_tables().items():
+        assignments = ', '.join(
+            f"{column}_typed = {conversion.format(value=column)}" for column, _, conversion in columns
+        )
+        pending = ' OR '.join(f"{column}_typed IS NULL" for column, _, _ in columns)
+        last_id = ''
+        while True:
+            c.execute(
+                f"SELECT max(id) FROM (SELECT id FROM {table} WHERE id > %(last)s ORDER BY id LIMIT %(size)s) AS batch;",
+                {'last': last_id, 'size': config.migration_batch_size}
+            )
+            batch_end = c.fetchone()[0]
+            if batch_end is None:
+                break
+            c.execute(
+                f"UPDATE {table} SET {assignments} WHERE id > %(last)s AND id <= %(end)s AND ({pending});",
+                {'last': last_id, 'end': batch_end}
+            )
+            last_id = batch_end
+
+        # a validated CHECK constraint lets the final step set NOT NULL without scanning the table again
+        for column, _, _ in columns:
+            constraint = f"{table}_{column}_typed_not_null"
+            c.execute("SELECT 1 FROM pg_constraint WHERE conname = %s;", (constraint,))
+            if c.fetchone() is None:
+                c.execute(f"ALTER TABLE {table} ADD CONSTRAINT {constraint} CHECK ({column}_typed IS NOT NULL) NOT VALID;")
+            c.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {constraint};")
+
+@migration(5, 'typed date columns: replace text columns')
+def swap_typed_date_columns(c):
+    for table, columns in _typed_date_tables().items():
+        c.execute(f"DROP TRIGGER IF EXISTS {table}_sync_typed_dates ON {table};")
+        c.execute(f"DROP FUNCTION IF EXISTS {table}_sync_typed_dates();")
+        for column, _, _ in columns:
+            c.execute(f"ALTER TABLE {table} ALTER COLUMN {column}_typed SET NOT NULL;")
+            c.execute(f"ALTER TABLE {table} DROP CONSTRAINT {table}_{column}_typed_not_null;")
+            c.execute(f"ALTER TABLE {table} DROP COLUMN {column};")
+            c.execute(f"ALTER TABLE {table} RENAME COLUMN {column}_typed TO {column};")
+
+@migration(6, 'chronological indexes', transactional=False)
+def chronological_indexes(c):
+    for name, table, columns in indexes.CHRONOLOGICAL_INDEXES:
+        indexes.create_index_concurrently(c, name, table, columns)
+
+# sequences handing out record IDs (see ids.py); unlike the old time-based IDs they never collide
+@migration(7, 'record ID sequences')
+def record_id_sequences(c):
+    for table in ids.ID_PREFIXES:
+        c.execute(f"CREATE SEQUENCE IF NOT EXISTS {ids.sequence_name(table)} MINVALUE 1 MAXVALUE {ids.MAX_ID_NUMBER};")
+
+# indexes for the search screens; the trigram indexes need the pg_trgm extension, which may not be
+# installable (it ships with PostgreSQL's contrib package and needs CREATE privilege), so without it the
+# search falls back to the prefix indexes alone
+@migration(8, 'search indexes', transactional=False)
+def search_indexes(c):
+    for name, table, columns in indexes.SEARCH_INDEXES:
+        indexes.create_index_concurrently(c, name, table, columns)
+    try:
+        c.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    except sql.Error:
+        return
+    for name, table, columns in indexes.TRIGRAM_INDEXES:
+        indexes.create_index_concurrently(c, name, table, columns, method='gin')
+
+# prescriptions had no date of their own; new rows get the time they are saved, and rows saved before the
+# sequence-based IDs get the time encoded in their ID (M-SSMMHH-YYMMDD)
+@migration(9, 'prescription dates: add column')
+def add_prescription_dates(c):
+    c.execute("ALTER TABLE prescription_record ADD COLUMN IF NOT EXISTS prescribed_at TIMESTAMP;")
+    c.execute("ALTER TABLE prescription_record ALTER COLUMN prescribed_at SET DEFAULT LOCALTIMESTAMP(0);")
+
+LEGACY_PRESCRIPTION_ID = r'^M-[0-5]\d[0-5]\d[0-2]\d-\d{6}$'
+
+# resumable like the typed date backfill; prescriptions with newer IDs saved before this release keep an unknown date
+@migration(10, 'prescription dates: backfill from legacy IDs', transactional=False)
+def backfill_prescription_dates(c):
+    last_id = ''
+    while True:
+        c.execute(
+            "SELECT max(id) FROM (SELECT id FROM prescription_record WHERE id > %(last)s ORDER BY id LIMIT %(size)s) AS batch;",
+            {'last': last_id, 'size': config.migration_batch_size}
+        )
+        batch_end = c.fetchone()[0]
+        if batch_end is None:
+            break
+        c.execute(
+            """
+            UPDATE prescription_record
+            SET prescribed_at = to_timestamp(substr(id, 10, 6) || substr(id, 3, 6), 'YYMMDDSSMIHH24')::timestamp
+            WHERE id > %(last)s AND id <= %(end)s AND prescribed_at IS NULL AND id ~ %(legacy)s;
+            """,
+            {'last': last_id, 'end': batch_end, 'legacy': LEGACY_PRESCRIPTION_ID}
+        )
+        last_id = batch_end
+
+# renaming a patient, doctor or department updates every copy of the name (see names.py) in the same transaction
+@migration(11, 'name propagation triggers')
+def name_propagation_triggers(c):
+    for source in names.copies_by_source():
+        c.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION {source}_propagate_name() RETURNS trigger AS $$
+            BEGIN
+            {names.propagation_statements(source)}    RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """
+        )
+        c.execute(f"DROP TRIGGER IF EXISTS {source}_propagate_name ON {source};")
+        c.execute(
+            f"""
+            CREATE TRIGGER {source}_propagate_name
+            AFTER UPDATE OF name ON {source}
+            FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+            EXECUTE FUNCTION {source}_propagate_name();
+            """
+        )
+
+# prescriptions were limited to three medicines held in medicine_1..3 columns; each medicine is now a row of
+# prescription_medicine, with a normalised name (lower case, single spaces) for drug lookups
+@migration(12, 'prescription medicines: add table')
+def add_prescription_medicines(c):
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS prescription_medicine (
+            prescription_id TEXT NOT NULL,
+            line_number INTEGER NOT NULL,
+            medicine_name TEXT NOT NULL,
+            dosage_description TEXT NOT NULL,
+            medicine_key TEXT GENERATED ALWAYS AS (lower(regexp_replace(btrim(medicine_name), '\\s+', ' ', 'g'))) STORED,
+            PRIMARY KEY (prescription_id, line_number),
+            FOREIGN KEY (prescription_id) REFERENCES prescription_record(id)
+            ON UPDATE CASCADE
+            ON DELETE CASCADE
+        );
+        """
+    )
+
+LEGACY_MEDICINE_SLOTS = (1, 2, 3)
+
+def _copy_legacy_medicines(c, condition, params=None):
+    for n in LEGACY_MEDICINE_SLOTS:
+        c.execute(
+            f"""
+            INSERT INTO prescription_medicine (prescription_id, line_number, medicine_name, dosage_description)
+            SELECT id, {n}, medicine_{n}_name, coalesce(medicine_{n}_dosage_description, '')
+            FROM prescription_record
+            WHERE {condition} AND btrim(coalesce(medicine_{n}_name, '')) <> ''
+            ON CONFLICT DO NOTHING;
+            """,
+            params
+        )
+
+# resumable: medicines copied by an earlier, interrupted run are skipped. The medicine index is built after the
+# copy, which is faster than maintaining it row by row
+@migration(13, 'prescription medicines: copy existing medicines and index them', transactional=False)
+def backfill_prescription_medicines(c):
+    last_id = ''
+    while True:
+        c.execute(
+            "SELECT max(id) FROM (SELECT id FROM prescription_record WHERE id > %(last)s ORDER BY id LIMIT %(size)s) AS batch;",
+            {'last': last_id, 'size': config.migration_batch_size}
+        )
+        batch_end = c.fetchone()[0]
+        if batch_end is None:
+            break
+        _copy_legacy_medicines(c, 'id > %(last)s AND id <= %(end)s', {'last': last_id, 'end': batch_end})
+        last_id = batch_end
+    for name, table, columns in indexes.MEDICINE_INDEXES:
+        indexes.create_index_concurrently(c, name, table, columns)
+
+# prescriptions saved by processes still running the old code while the copy ran are caught up before the
+# old columns go
+@migration(14, 'prescription medicines: drop the medicine columns')
+def drop_legacy_medicine_columns(c):
+    c.execute("LOCK TABLE prescription_record IN SHARE ROW EXCLUSIVE MODE;")
+    _copy_legacy_medicines(
+        c, 'NOT EXISTS (SELECT 1 FROM prescription_medicine m WHERE m.prescription_id = prescription_record.id)'
+    )
+    for n in LEGACY_MEDICINE_SLOTS:
+        c.execute(f"ALTER TABLE prescription_record DROP COLUMN medicine_{n}_name, DROP COLUMN medicine_{n}_dosage_description;")
+
+# analytics summaries (see analytics.py): statement-level triggers log the change each write makes to the
+# summarised figures into small delta tables, and analytics.refresh() folds pending deltas into the summaries.
+# (table, delta table, summary key columns, delta SELECT over a transition table {rows} with sign {sign})
+ANALYTICS_SOURCES = [
+    ('patient_record', 'analytics_registration_delta', 'day',
+     "SELECT date_of_registration, {sign} * count(*) FROM {rows} GROUP BY 1"),
+    ('medical_test_record', 'analytics_test_delta', 'doctor_id, month',
+     "SELECT doctor_id, date_trunc('month', test_date_time)::date, {sign} * count(*), {sign} * sum(cost) "
+     "FROM {rows} GROUP BY 1, 2"),
+]
+
+@migration(15, 'analytics summaries')
+def analytics_summaries(c):
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS analytics_registration_delta (day DATE NOT NULL, registrations BIGINT NOT NULL);
+        CREATE TABLE IF NOT EXISTS analytics_daily_registrations (
+            day DATE PRIMARY KEY,
+            registrations BIGINT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS analytics_test_delta (
+            doctor_id TEXT NOT NULL, month DATE NOT NULL, tests BIGINT NOT NULL, revenue BIGINT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS analytics_monthly_tests (
+            doctor_id TEXT NOT NULL,
+            month DATE NOT NULL,
+            tests BIGINT NOT NULL,
+            revenue BIGINT NOT NULL,
+            PRIMARY KEY (doctor_id, month)
+        );
+        """
+    )
+    for table, delta_table, _, delta in ANALYTICS_SOURCES:
+        c.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION {table}_log_analytics() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    INSERT INTO {delta_table} {delta.format(rows='old_rows', sign=-1)};
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO {delta_table} {delta.format(rows='new_rows', sign=1)};
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """
+        )
+        # a trigger with transition tables handles a single event, so each event gets its own trigger
+        for event, referencing in [
+            ('INSERT', 'NEW TABLE AS new_rows'),
+            ('UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+            ('DELETE', 'OLD TABLE AS old_rows'),
+        ]:
+            trigger = f'{table}_log_analytics_{event.lower()}'
+            c.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table};")
+            c.execute(
+                f"""
+                CREATE TRIGGER {trigger}
+                AFTER {event} ON {table}
+                REFERENCING {referencing}
+                FOR EACH STATEMENT EXECUTE FUNCTION {table}_log_analytics();
+                """
+            )
+        # creating the triggers locks out writers until this transaction commits, so the existing rows
+        # can be logged once here without missing or double counting concurrent writes
+        c.execute(f"INSERT INTO {delta_table} {delta.format(rows=table, sign=1)};")
+
+@migration(16, 'date of birth index', transactional=False)
+def date_of_birth_index(c):
+    for name, table, columns in indexes.AGE_INDEXES:
+        indexes.create_index_concurrently(c, name, table, columns)
+
+# ages are worked out from the date of birth when records are read (see services.AGE_COLUMN), so the stored
+# ages, which went out of date on every birthday, are dropped
+@migration(17, 'derived ages: drop the age columns')
+def drop_age_columns(c):
+    for table in ('patient_record', 'doctor_record'):
+        c.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS age;")
+
+# change notifications for the other app processes' caches (see changes.py); as for the analytics summaries,
+# each event gets its own trigger, since a trigger with transition tables handles a single event
+@migration(18, 'change notifications')
+def change_notifications(c):
+    for table in changes.NOTIFIED_TABLES:
+        c.execute(changes.trigger_function(table))
+        for event, referencing in [
+            ('INSERT', 'REFERENCING NEW TABLE AS new_rows'),
+            ('UPDATE', 'REFERENCING NEW TABLE AS new_rows'),
+            ('DELETE', 'REFERENCING OLD TABLE AS old_rows'),
+            ('TRUNCATE', ''),
+        ]:
+            trigger = f'{table}_notify_{event.lower()}'
+            c.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table};")
+            c.execute(
+                f"""
+                CREATE TRIGGER {trigger}
+                AFTER {event} ON {table}
+                {referencing}
+                FOR EACH STATEMENT EXECUTE FUNCTION {table}_notify_changes();
+                """
+            )
+
+# function to fetch the set of migration versions already applied to the database
+def applied_versions(c):
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT now()
+        );
+        """
+    )
+    c.execute("SELECT version FROM schema_version;")
+    return {row[0] for row in c.fetchall()}
+
+# function to apply all pending migrations on the given connection; an advisory lock makes concurrently
+# starting app processes wait for each other instead of racing on the same DDL
+def migrate(conn):
+    previous_autocommit = conn.autocommit
+    conn.autocommit = True
+    c = conn.cursor()
+    try:
+        c.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_ID,))
+        try:
+            applied = applied_versions(c)
+            for version, description, function, transactional in MIGRATIONS:
+                if version in applied:
+                    continue
+                if transactional:
+                    conn.autocommit = False
+                    with conn:
+                        function(c)
+                        _record_version(c, version, description)
+                    conn.autocommit = True
+                else:
+                    function(c)
+                    _record_version(c, version, description)
+        finally:
+            if not conn.closed:
+                if not conn.autocommit:
+                    conn.rollback()
+                    conn.autocommit = True
+                c.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_ID,))
+    finally:
+        c.close()
+        if not conn.closed:
+            conn.autocommit = previous_autocommit
+
+def _record_version(c, version, description):
+    c.execute(
+        "INSERT INTO schema_version (version, description) VALUES (%s, %s);",
+        (version, description)
+    )
+
+# running this module directly brings the database up to date (e.g. before starting new app replicas)
+if __name__ == '__main__':
+    import database as db
+    db.db_init()
+    with db.session() as (conn, c):
+        c.execute("SELECT version, description, applied_at FROM schema_version ORDER BY version;")
+        for version, description, applied_at in c.fetchall():
+            print(f'{version:>4}  {applied_at:%Y-%m-%d %H:%M}  {description}')
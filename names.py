@@ -0,0 +1,89 @@
+import argparse
+import config
+import database as db
+
+# names copied into other tables when a record is saved (a read optimisation, so the lists of prescriptions,
+# tests and doctors need no joins): (source table, copying table, id column, name column)
+DENORMALIZED_NAMES = [
+    ('department_record', 'doctor_record', 'department_id', 'department_name'),
+    ('patient_record', 'prescription_record', 'patient_id', 'patient_name'),
+    ('doctor_record', 'prescription_record', 'doctor_id', 'doctor_name'),
+    ('patient_record', 'medical_test_record', 'patient_id', 'patient_name'),
+    ('doctor_record', 'medical_test_record', 'doctor_id', 'doctor_name'),
+]
+
+# function to group the copies by source table: {source table: [(copying table, id column, name column)]}
+def copies_by_source():
+    sources = {}
+    for source, table, id_column, name_column in DENORMALIZED_NAMES:
+        sources.setdefault(source, []).append((table, id_column, name_column))
+    return sources
+
+# function to build the body of the trigger function that propagates a rename of a source record: one
+# set-based UPDATE per copying table, served by its foreign key index
+def propagation_statements(source):
+    return ''.join(
+        f"    UPDATE {table} SET {name_column} = NEW.name\n"
+        f"    WHERE {id_column} = NEW.id AND {name_column} IS DISTINCT FROM NEW.name;\n"
+        for table, id_column, name_column in copies_by_source()[source]
+    )
+
+# function to count the copies that differ from their source's current name, per (copying table, name column)
+def drift_report(c):
+    report = []
+    for source, table, id_column, name_column in DENORMALIZED_NAMES:
+        c.execute(
+            f"""
+            SELECT count(*)
+            FROM {table} t JOIN {source} s ON s.id = t.{id_column}
+            WHERE t.{name_column} IS DISTINCT FROM s.name;
+            """
+        )
+        report.append((table, name_column, c.fetchone()[0]))
+    return report
+
+# function to repair drifted copies (e.g. rows written while the propagation triggers were disabled), walking
+# each copying table in committed batches of config.migration_batch_size rows so no lock is held for long.
+# Returns the number of rows repaired per (copying table, name column)
+def reconcile():
+    repaired = []
+    for source, table, id_column, name_column in DENORMALIZED_NAMES:
+        count, last_id = 0, ''
+        while True:
+            with db.session() as (conn, c):
+                c.execute(
+                    f"SELECT max(id) FROM (SELECT id FROM {table} WHERE id > %(last)s ORDER BY id LIMIT %(size)s) AS batch;",
+                    {'last': last_id, 'size': config.migration_batch_size}
+                )
+                batch_end = c.fetchone()[0]
+                if batch_end is None:
+                    break
+                c.execute(
+                    f"""
+                    UPDATE {table} t
+                    SET {name_column} = s.name
+                    FROM {source} s
+                    WHERE s.id = t.{id_column} AND t.id > %(last)s AND t.id <= %(end)s
+                      AND t.{name_column} IS DISTINCT FROM s.name;
+                    """,
+                    {'last': last_id, 'end': batch_end}
+                )
+                count += c.rowcount
+            last_id = batch_end
+        repaired.append((table, name_column, count))
+    return repaired
+
+# headless entry point for the reconciliation job, e.g. run python names.py nightly (--check only reports)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check and repair copies of patient, doctor and department names.')
+    parser.add_argument('--check', action='store_true', help='only report drifted copies, do not repair them')
+    args = parser.parse_args()
+
+    db.db_init()
+    if args.check:
+        with db.session() as (conn, c):
+            results = drift_report(c)
+    else:
+        results = reconcile()
+    for table, name_column, count in results:
+        print(f'{table}.{name_column}: {count} {"drifted" if args.check else "repaired"}')
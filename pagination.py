@@ -0,0 +1,49 @@
+import streamlit as st
+import database as db
+import utils
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+# callback to move the browsing position of a table (runs before the page is re-rendered)
+def _move(state, kind):
+    if kind == 'before':
+        state['anchor'] = ('before', state['first_id'])
+    elif kind == 'after':
+        state['anchor'] = ('after', state['last_id'])
+    else:
+        jump_id = utils.sanitize_text_input(st.session_state[state['jump_key']])
+        state['anchor'] = ('from', jump_id) if jump_id else (None, None)
+
+# function to let the user browse a record table page by page (previous/next and jump to an ID);
+# show_details is the module's function that renders a list of rows (selected as columns), record_name is e.g. 'Patient';
+# where and params optionally limit the pages to matching rows (see db.fetch_page)
+def browse_records(table, show_details, record_name, columns='*', where=None, params=None):
+    state = st.session_state.setdefault(f'browse_{table}', {
+        'anchor': (None, None), 'first_id': None, 'last_id': None,
+        'jump_key': f'browse_{table}_jump_id', 'filter': (None, None)
+    })
+    if state.get('filter') != (where, params):     # a new filter starts again from the first page
+        state['filter'], state['anchor'] = (where, params), (None, None)
+
+    page_size = st.selectbox('Records per page', PAGE_SIZES, key=f'browse_{table}_page_size')
+    st.text_input(f'Jump to {record_name} ID (optional)', key=state['jump_key'],
+                  on_change=_move, args=(state, 'from'))
+
+    kind, key = state['anchor']
+    rows, has_previous, has_next = db.cached_read(
+        (table,), db.fetch_page, table, page_size,
+        after_id=key if kind == 'after' else None,
+        before_id=key if kind == 'before' else None,
+        from_id=key if kind == 'from' else None,
+        columns=columns, where=where, params=params
+    )
+    if rows:
+        state['first_id'], state['last_id'] = rows[0][0], rows[-1][0]
+
+    show_details(rows)
+
+    previous_col, next_col = st.columns(2)
+    previous_col.button('Previous page', key=f'browse_{table}_previous', disabled=not has_previous,
+                        on_click=_move, args=(state, 'before'))
+    next_col.button('Next page', key=f'browse_{table}_next', disabled=not has_next,
+                    on_click=_move, args=(state, 'after'))
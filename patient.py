@@ -1,46 +1,31 @@
 import streamlit as st
-from datetime import datetime, date
+import bulk_import
 import database as db
+import ids
 import pandas as pd
+import pagination
+import search
+import services
+import timeline
 import utils
 
 # function to verify patient id
 def verify_patient_id(patient_id):
-    verify = False
-    conn, c = db.connection()
-    try:
-        c.execute("SELECT id FROM patient_record;")
-        for id in c.fetchall():
-            if id[0] == patient_id:
-                verify = True
-                break
-    finally:
-        c.close()
-        conn.close()
-    return verify
+    return db.record_exists('patient_record', patient_id)
 
-# function to generate unique patient id using current date and time
-def generate_patient_id(reg_date, reg_time):
-    id_1 = ''.join(reg_time.split(':')[::-1])
-    id_2 = ''.join(reg_date.split('-')[::-1])[2:]
-    id = f'P-{id_1}-{id_2}'
-    return id
-
-# function to calculate age using given date of birth
-def calculate_age(dob):
-    today = date.today()
-    age = today.year - dob.year - ((dob.month, dob.day) > (today.month, today.day))
-    return age
+# function to generate unique patient id (drawn from the patient id sequence)
+def generate_patient_id():
+    return ids.next_id('patient_record')
 
 # function to show the details of patient(s) given in a list (provided as a parameter)
 def show_patient_details(list_of_patients):
-    patient_titles = ['Patient ID', 'Name', 'Age', 'Gender', 'Date of birth (DD-MM-YYYY)',
+    patient_titles = ['Patient ID', 'Name', 'Age', 'Gender', 'Date of birth (YYYY-MM-DD)',
                      'Blood group', 'Contact number', 'Alternate contact number',
                      'Aadhar ID / Voter ID', 'Weight (kg)', 'Height (cm)', 'Address',
                      'City', 'State', 'PIN code', "Next of kin's name",
                      "Next of kin's relation to patient",
                      "Next of kin's contact number", 'Email ID',
-                     'Date of registration (DD-MM-YYYY)', 'Time of registration (hh:mm:ss)']
+                     'Date of registration (YYYY-MM-DD)', 'Time of registration (hh:mm:ss)']
     if len(list_of_patients) == 0:
         st.warning('No data to show')
     elif len(list_of_patients) == 1:
@@ -58,13 +43,12 @@ class Patient:
         self.name = str()
         self.id = str()
         self.gender = str()
-        self.age = int()
         self.contact_number_1 = str()
         self.contact_number_2 = str()
-        self.date_of_birth = str()
+        self.date_of_birth = None
         self.blood_group = str()
-        self.date_of_registration = str()
-        self.time_of_registration = str()
+        self.date_of_registration = None
+        self.time_of_registration = None
         self.email_id = str()
         self.aadhar_or_voter_id = str()
         self.height = int()
@@ -86,8 +70,7 @@ class Patient:
         self.gender = gender
         dob = st.date_input('Date of birth (YYYY/MM/DD)')
         st.info('If the required date is not in the calendar, please type it in the box above.')
-        self.date_of_birth = dob.strftime('%d-%m-%Y')
-        self.age = calculate_age(dob)
+        self.date_of_birth = dob
         self.blood_group = utils.sanitize_text_input(st.text_input('Blood group'))
         self.contact_number_1 = utils.sanitize_text_input(st.text_input('Contact number'))
         contact_number_2 = st.text_input('Alternate contact number (optional)')
@@ -104,74 +87,23 @@ class Patient:
         self.next_of_kin_contact_number = utils.sanitize_text_input(st.text_input("Next of kin's contact number"))
         email_id = st.text_input('Email ID (optional)')
         self.email_id = utils.sanitize_text_input(email_id) if email_id else None
-        self.date_of_registration = datetime.now().strftime('%d-%m-%Y')
-        self.time_of_registration = datetime.now().strftime('%H:%M:%S')
-        self.id = generate_patient_id(self.date_of_registration, self.time_of_registration)
 
         # Validate email and phone numbers
-        valid_email = utils.validate_email(self.email_id)
-        valid_phone_1 = utils.validate_phone_number(self.contact_number_1)
-        valid_phone_2 = utils.validate_phone_number(self.contact_number_2)
-
-        if not valid_email:
-            st.error('Invalid email format.')
-            return
-        if not valid_phone_1:
-            st.error('Invalid contact number format.')
-            return
-        if self.contact_number_2 and not valid_phone_2:
-            st.error('Invalid alternate contact number format.')
+        try:
+            services.check_contact_details(self.email_id, self.contact_number_1, self.contact_number_2)
+        except services.ValidationError as e:
+            st.error(str(e))
             return
 
         save = st.button('Save')
 
         if save:
             try:
-                conn, c = db.connection()
-                with conn:
-                    c.execute(
-                        """
-                        INSERT INTO patient_record
-                        (
-                            id, name, age, gender, date_of_birth, blood_group,
-                            contact_number_1, contact_number_2, aadhar_or_voter_id,
-                            weight, height, address, city, state, pin_code,
-                            next_of_kin_name, next_of_kin_relation_to_patient,
-                            next_of_kin_contact_number, email_id,
-                            date_of_registration, time_of_registration
-                        )
-                        VALUES (
-                            %(id)s, %(name)s, %(age)s, %(gender)s, %(dob)s, %(blood_group)s,
-                            %(phone_1)s, %(phone_2)s, %(uid)s, %(weight)s, %(height)s,
-                            %(address)s, %(city)s, %(state)s, %(pin)s,
-                            %(kin_name)s, %(kin_relation)s, %(kin_phone)s, %(email_id)s,
-                            %(reg_date)s, %(reg_time)s
-                        );
-                        """,
-                        {
-                            'id': self.id, 'name': self.name, 'age': self.age,
-                            'gender': self.gender, 'dob': self.date_of_birth,
-                            'blood_group': self.blood_group,
-                            'phone_1': self.contact_number_1,
-                            'phone_2': self.contact_number_2,
-                            'uid': self.aadhar_or_voter_id, 'weight': self.weight,
-                            'height': self.height, 'address': self.address,
-                            'city': self.city, 'state': self.state,
-                            'pin': self.pin_code, 'kin_name': self.next_of_kin_name,
-                            'kin_relation': self.next_of_kin_relation_to_patient,
-                            'kin_phone': self.next_of_kin_contact_number,
-                            'email_id': self.email_id,
-                            'reg_date': self.date_of_registration,
-                            'reg_time': self.time_of_registration
-                        }
-                    )
+                self.id = services.add_patient(vars(self))
                 st.success('Patient details saved successfully.')
                 st.write('Your Patient ID is: ', self.id)
             except Exception as e:
                 st.error(f'Error saving patient details: {e}')
-            finally:
-                c.close()
-                conn.close()
 
     def update_patient(self):
         id = utils.sanitize_text_input(st.text_input('Enter Patient ID of the patient to be updated'))
@@ -182,21 +114,11 @@ class Patient:
         else:
             st.success('Verified')
             try:
-                conn, c = db.connection()
-
-                with conn:
-                    c.execute(
-                        """
-                        SELECT *
-                        FROM patient_record
-                        WHERE id = %(id)s;
-                        """,
-                        { 'id': id }
-                    )
-                    st.write('Here are the current details of the patient:')
-                    show_patient_details(c.fetchall())
+                st.write('Here are the current details of the patient:')
+                show_patient_details([services.get_patient(id)])
 
                 st.write('Enter new details of the patient:')
+                self.name = utils.sanitize_text_input(st.text_input('Full name (leave blank to keep the current name)'))
                 self.contact_number_1 = utils.sanitize_text_input(st.text_input('Contact number'))
                 contact_number_2 = st.text_input('Alternate contact number (optional)')
                 self.contact_number_2 = utils.sanitize_text_input(contact_number_2) if contact_number_2 else None
@@ -209,70 +131,25 @@ class Patient:
                 self.next_of_kin_name = utils.sanitize_text_input(st.text_input("Next of kin's name"))
                 self.next_of_kin_relation_to_patient = utils.sanitize_text_input(st.text_input("Next of kin's relation to patient"))
                 self.next_of_kin_contact_number = utils.sanitize_text_input(st.text_input("Next of kin's contact number"))
-                self.email_id = utils.sanitize_text_input(st.text_input('Email ID (optional)'))
+                self.email_id = utils.sanitize_text_input(st.text_input('Email ID (optional)')) or None
 
                 # Validate email and phone numbers
-                valid_email = utils.validate_email(self.email_id)
-                valid_phone_1 = utils.validate_phone_number(self.contact_number_1)
-                valid_phone_2 = utils.validate_phone_number(self.contact_number_2)
-
-                if not valid_email:
-                    st.error('Invalid email format.')
-                    return
-                if not valid_phone_1:
-                    st.error('Invalid contact number format.')
-                    return
-                if self.contact_number_2 and not valid_phone_2:
-                    st.error('Invalid alternate contact number format.')
+                try:
+                    services.check_contact_details(self.email_id, self.contact_number_1, self.contact_number_2)
+                except services.ValidationError as e:
+                    st.error(str(e))
                     return
 
                 update = st.button('Update')
 
                 if update:
-                    with conn:
-                        c.execute(
-                            """
-                            SELECT date_of_birth
-                            FROM patient_record
-                            WHERE id = %(id)s;
-                            """,
-                            { 'id': id }
-                        )
-                        dob = [int(d) for d in c.fetchone()[0].split('-')[::-1]]
-                        dob = date(dob[0], dob[1], dob[2])
-                        self.age = calculate_age(dob)
-
-                    with conn:
-                        c.execute(
-                            """
-                            UPDATE patient_record
-                            SET age = %(age)s, contact_number_1 = %(phone_1)s,
-                                contact_number_2 = %(phone_2)s, weight = %(weight)s,
-                                height = %(height)s, address = %(address)s, city = %(city)s,
-                                state = %(state)s, pin_code = %(pin)s, next_of_kin_name = %(kin_name)s,
-                                next_of_kin_relation_to_patient = %(kin_relation)s,
-                                next_of_kin_contact_number = %(kin_phone)s, email_id = %(email_id)s
-                            WHERE id = %(id)s;
-                            """,
-                            {
-                                'id': id, 'age': self.age,
-                                'phone_1': self.contact_number_1,
-                                'phone_2': self.contact_number_2,
-                                'weight': self.weight, 'height': self.height,
-                                'address': self.address, 'city': self.city,
-                                'state': self.state, 'pin': self.pin_code,
-                                'kin_name': self.next_of_kin_name,
-                                'kin_relation': self.next_of_kin_relation_to_patient,
-                                'kin_phone': self.next_of_kin_contact_number,
-                                'email_id': self.email_id
-                            }
-                        )
+                    details = {field: getattr(self, field) for field in services.PATIENT_UPDATE_FIELDS}
+                    if not self.name:
+                        del details['name']
+                    services.update_patient(id, details)
                     st.success('Patient details updated successfully.')
             except Exception as e:
                 st.error(f'Error updating patient details: {e}')
-            finally:
-                c.close()
-                conn.close()
 
     def delete_patient(self):
         id = utils.sanitize_text_input(st.text_input('Enter Patient ID of the patient to be deleted'))
@@ -283,67 +160,48 @@ class Patient:
         else:
             st.success('Verified')
             try:
-                conn, c = db.connection()
-
-                with conn:
-                    c.execute(
-                        """
-                        SELECT *
-                        FROM patient_record
-                        WHERE id = %(id)s;
-                        """,
-                        { 'id': id }
-                    )
-                    st.write('Here are the details of the patient to be deleted:')
-                    show_patient_details(c.fetchall())
+                st.write('Here are the details of the patient to be deleted:')
+                show_patient_details([services.get_patient(id)])
 
                 confirm = st.checkbox('Check this box to confirm deletion')
                 if confirm:
                     delete = st.button('Delete')
                     if delete:
-                        c.execute(
-                            """
-                            DELETE FROM patient_record
-                            WHERE id = %(id)s;
-                            """,
-                            { 'id': id }
-                        )
+                        services.delete_patient(id)
                         st.success('Patient details deleted successfully.')
             except Exception as e:
                 st.error(f'Error deleting patient details: {e}')
-            finally:
-                c.close()
-                conn.close()
 
     def show_all_patients(self):
-        conn, c = db.connection()
-        try:
-            c.execute("SELECT * FROM patient_record;")
-            show_patient_details(c.fetchall())
-        finally:
-            c.close()
-            conn.close()
+        youngest, oldest = services.AGE_RANGE
+        ages = st.slider('Age (years)', youngest, oldest, (youngest, oldest), key='browse_patient_record_ages')
+        where, params = services.age_range(*ages) if ages != (youngest, oldest) else (None, None)
+        pagination.browse_records('patient_record', show_patient_details, 'Patient', services.PATIENT_COLUMNS,
+                                  where, params)
 
     def search_patient(self):
-        id = utils.sanitize_text_input(st.text_input('Enter Patient ID of the patient to be searched'))
-        if id == '':
-            st.empty()
-        elif not verify_patient_id(id):
-            st.error('Invalid Patient ID')
-        else:
-            st.success('Verified')
-            conn, c = db.connection()
+        search.search_screen('patient_record', show_patient_details, 'Patient', services.PATIENT_COLUMNS)
+
+    def show_patient_timeline(self):
+        timeline.patient_timeline()
+
+    def import_patients(self):
+        st.write('Upload a CSV or Excel file with one patient per row and these columns:')
+        st.write(', '.join(bulk_import.REQUIRED_COLUMNS) + ' (optional: ' + ', '.join(bulk_import.OPTIONAL_COLUMNS) + ')')
+        st.info('Dates of birth may be written as YYYY-MM-DD or DD-MM-YYYY.')
+        uploaded_file = st.file_uploader('Patient file', type=['csv', 'xlsx', 'xls'])
+        if uploaded_file is not None and st.button('Import'):
             try:
-                c.execute(
-                    """
-                    SELECT *
-                    FROM patient_record
-                    WHERE id = %(id)s;
-                    """,
-                    { 'id': id }
-                )
-                st.write('Here are the details of the patient you searched for:')
-                show_patient_details(c.fetchall())
-            finally:
-                c.close()
-                conn.close()
+                imported, rejects = bulk_import.import_patients(uploaded_file, uploaded_file.name)
+            except Exception as e:
+                st.error(f'Error importing patients: {e}')
+                return
+            st.success(f'{len(imported)} patients imported successfully.')
+            if len(imported):
+                st.download_button('Download the new Patient IDs', imported.to_csv(index=False),
+                                   'imported_patients.csv', 'text/csv')
+            if len(rejects):
+                st.warning(f'{len(rejects)} rows were not imported:')
+                st.dataframe(rejects)
+                st.download_button('Download the reject report', rejects.to_csv(index=False),
+                                   'rejected_patients.csv', 'text/csv')
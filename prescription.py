@@ -1,27 +1,21 @@
 import streamlit as st
-from datetime import datetime
+import aio
 import database as db
+import ids
 import pandas as pd
 import patient
 import doctor
+import services
 import utils
 
 # Utility functions
 def verify_prescription_id(prescription_id):
-    conn, c = db.connection()
-    try:
-        c.execute("SELECT id FROM prescription_record WHERE id = %(id)s", {'id': prescription_id})
-        return c.fetchone() is not None
-    finally:
-        c.close()
-        conn.close()
+    return db.record_exists('prescription_record', prescription_id)
 
 def show_prescription_details(prescriptions):
     titles = [
         'Prescription ID', 'Patient ID', 'Patient name', 'Doctor ID', 'Doctor name',
-        'Diagnosis', 'Comments', 'Medicine 1 name', 'Medicine 1 dosage and description',
-        'Medicine 2 name', 'Medicine 2 dosage and description', 'Medicine 3 name',
-        'Medicine 3 dosage and description'
+        'Diagnosis', 'Comments', 'Medicines (dosage and description)', 'Date and time prescribed'
     ]
     if not prescriptions:
         st.warning('No data to show.')
@@ -32,17 +26,10 @@ def show_prescription_details(prescriptions):
         st.write(df)
 
 def generate_prescription_id():
-    return f'M-{datetime.now().strftime("%S%M%H")}-{datetime.now().strftime("%y%m%d")}'
+    return ids.next_id('prescription_record')
 
 def get_name_by_id(table, user_id):
-    conn, c = db.connection()
-    try:
-        c.execute(f"SELECT name FROM {table} WHERE id = %(id)s", {'id': user_id})
-        result = c.fetchone()
-        return result[0] if result else None
-    finally:
-        c.close()
-        conn.close()
+    return db.record_name(table, user_id)
 
 # Class definition
 class Prescription:
@@ -58,72 +45,53 @@ class Prescription:
         self.doctor_name = ""
         self.diagnosis = ""
         self.comments = None
-        self.medicine_1_name = ""
-        self.medicine_1_dosage_description = ""
-        self.medicine_2_name = None
-        self.medicine_2_dosage_description = None
-        self.medicine_3_name = None
-        self.medicine_3_dosage_description = None
+        self.medicines = []
 
     def input_prescription_fields(self, update=False):
         self.diagnosis = utils.sanitize_text_input(st.text_area('Diagnosis'))
         self.comments = utils.sanitize_text_input(st.text_area('Comments (if any)')) or None
-        self.medicine_1_name = utils.sanitize_text_input(st.text_input('Medicine 1 name'))
-        self.medicine_1_dosage_description = utils.sanitize_text_input(st.text_area('Medicine 1 dosage and description'))
-        self.medicine_2_name = utils.sanitize_text_input(st.text_input('Medicine 2 name (optional)')) or None
-        self.medicine_2_dosage_description = utils.sanitize_text_input(st.text_area('Medicine 2 dosage and description')) or None
-        self.medicine_3_name = utils.sanitize_text_input(st.text_input('Medicine 3 name (optional)')) or None
-        self.medicine_3_dosage_description = utils.sanitize_text_input(st.text_area('Medicine 3 dosage and description')) or None
+        medicine_count = st.number_input('Number of medicines', value=1, min_value=1)
+        self.medicines = []
+        for n in range(1, medicine_count + 1):
+            name = utils.sanitize_text_input(st.text_input(f'Medicine {n} name'))
+            dosage_description = utils.sanitize_text_input(st.text_area(f'Medicine {n} dosage and description'))
+            if name:
+                self.medicines.append((name, dosage_description))
 
     def add_prescription(self):
         st.subheader('Enter prescription details:')
         self.patient_id = utils.sanitize_text_input(st.text_input('Patient ID'))
-        if self.patient_id and not patient.verify_patient_id(self.patient_id):
-            st.error('Invalid Patient ID.')
+        patient_status = st.empty()
+        self.doctor_id = utils.sanitize_text_input(st.text_input('Doctor ID'))
+        doctor_status = st.empty()
+        # both IDs are verified by looking up their names at once
+        try:
+            self.patient_name, self.doctor_name = aio.lookup_names(
+                ("patient_record", self.patient_id), ("doctor_record", self.doctor_id)
+            )
+        except Exception as e:
+            st.error(f'Error verifying patient and doctor IDs: {e}')
+            return
+        if self.patient_id and self.patient_name is None:
+            patient_status.error('Invalid Patient ID.')
             return
         elif self.patient_id:
-            self.patient_name = get_name_by_id("patient_record", self.patient_id)
-            st.success(f"Patient verified: {self.patient_name}")
+            patient_status.success(f"Patient verified: {self.patient_name}")
 
-        self.doctor_id = utils.sanitize_text_input(st.text_input('Doctor ID'))
-        if self.doctor_id and not doctor.verify_doctor_id(self.doctor_id):
-            st.error('Invalid Doctor ID.')
+        if self.doctor_id and self.doctor_name is None:
+            doctor_status.error('Invalid Doctor ID.')
             return
         elif self.doctor_id:
-            self.doctor_name = get_name_by_id("doctor_record", self.doctor_id)
-            st.success(f"Doctor verified: {self.doctor_name}")
+            doctor_status.success(f"Doctor verified: {self.doctor_name}")
 
         self.input_prescription_fields()
-        self.id = generate_prescription_id()
 
         if st.button('Save'):
             try:
-                conn, c = db.connection()
-                c.execute("""
-                    INSERT INTO prescription_record (
-                        id, patient_id, patient_name, doctor_id, doctor_name,
-                        diagnosis, comments, medicine_1_name, medicine_1_dosage_description,
-                        medicine_2_name, medicine_2_dosage_description, medicine_3_name,
-                        medicine_3_dosage_description
-                    ) VALUES (
-                        %(id)s, %(patient_id)s, %(patient_name)s, %(doctor_id)s, %(doctor_name)s,
-                        %(diagnosis)s, %(comments)s, %(med1_name)s, %(med1_desc)s,
-                        %(med2_name)s, %(med2_desc)s, %(med3_name)s, %(med3_desc)s
-                    );
-                """, {
-                    'id': self.id, 'patient_id': self.patient_id, 'patient_name': self.patient_name,
-                    'doctor_id': self.doctor_id, 'doctor_name': self.doctor_name,
-                    'diagnosis': self.diagnosis, 'comments': self.comments,
-                    'med1_name': self.medicine_1_name, 'med1_desc': self.medicine_1_dosage_description,
-                    'med2_name': self.medicine_2_name, 'med2_desc': self.medicine_2_dosage_description,
-                    'med3_name': self.medicine_3_name, 'med3_desc': self.medicine_3_dosage_description
-                })
-                conn.commit()
+                self.id = services.add_prescription(vars(self))
                 st.success(f'Prescription saved. ID: {self.id}')
             except Exception as e:
                 st.error(f'Error saving prescription details: {e}')
-            finally:
-                conn.close()
 
     def update_prescription(self):
         id = utils.sanitize_text_input(st.text_input('Enter Prescription ID to update'))
@@ -135,34 +103,19 @@ class Prescription:
 
         st.success('Verified')
         try:
-            conn, c = db.connection()
-            c.execute("SELECT * FROM prescription_record WHERE id = %(id)s", {'id': id})
             st.write('Current details:')
-            show_prescription_details(c.fetchall())
+            show_prescription_details([services.get_prescription(id)])
 
             st.subheader('Enter new details:')
             self.input_prescription_fields(update=True)
 
             if st.button('Update'):
-                c.execute("""
-                    UPDATE prescription_record
-                    SET diagnosis = %(diagnosis)s, comments = %(comments)s,
-                        medicine_1_name = %(med1_name)s, medicine_1_dosage_description = %(med1_desc)s,
-                        medicine_2_name = %(med2_name)s, medicine_2_dosage_description = %(med2_desc)s,
-                        medicine_3_name = %(med3_name)s, medicine_3_dosage_description = %(med3_desc)s
-                    WHERE id = %(id)s;
-                """, {
-                    'id': id, 'diagnosis': self.diagnosis, 'comments': self.comments,
-                    'med1_name': self.medicine_1_name, 'med1_desc': self.medicine_1_dosage_description,
-                    'med2_name': self.medicine_2_name, 'med2_desc': self.medicine_2_dosage_description,
-                    'med3_name': self.medicine_3_name, 'med3_desc': self.medicine_3_dosage_description
-                })
-                conn.commit()
+                services.update_prescription(
+                    id, {'diagnosis': self.diagnosis, 'comments': self.comments, 'medicines': self.medicines}
+                )
                 st.success('Prescription updated successfully.')
         except Exception as e:
             st.error(f'Error updating prescription details: {e}')
-        finally:
-            conn.close()
 
     def delete_prescription(self):
         id = utils.sanitize_text_input(st.text_input('Enter Prescription ID to delete'))
@@ -174,19 +127,14 @@ class Prescription:
 
         st.success('Verified')
         try:
-            conn, c = db.connection()
-            c.execute("SELECT * FROM prescription_record WHERE id = %(id)s", {'id': id})
             st.write('Prescription to be deleted:')
-            show_prescription_details(c.fetchall())
+            show_prescription_details([services.get_prescription(id)])
 
             if st.checkbox('Confirm deletion') and st.button('Delete'):
-                c.execute("DELETE FROM prescription_record WHERE id = %(id)s", {'id': id})
-                conn.commit()
+                services.delete_prescription(id)
                 st.success('Prescription deleted successfully.')
         except Exception as e:
             st.error(f'Error deleting prescription details: {e}')
-        finally:
-            conn.close()
 
     def prescriptions_by_patient(self):
         patient_id = utils.sanitize_text_input(st.text_input('Enter Patient ID'))
@@ -198,12 +146,32 @@ class Prescription:
 
         st.success('Verified')
         try:
-            conn, c = db.connection()
-            c.execute("SELECT * FROM prescription_record WHERE patient_id = %(id)s", {'id': patient_id})
-            prescriptions = c.fetchall()
+            prescriptions = db.cached_read(('prescription_record', 'prescription_medicine'),
+                                           services.prescriptions_of_patient, patient_id)
             st.write(f'Prescriptions for {get_name_by_id("patient_record", patient_id)}:')
             show_prescription_details(prescriptions)
         except Exception as e:
             st.error(f'Error fetching prescription records: {e}')
-        finally:
-            conn.close()
+
+    def drug_recall(self):
+        medicine = utils.sanitize_text_input(st.text_input('Medicine name (or the beginning of it)'))
+        limit_dates = st.checkbox('Only prescriptions in a date range')
+        since = st.date_input('From') if limit_dates else None
+        until = st.date_input('To') if limit_dates else None
+        if not medicine:
+            return
+        try:
+            patients = db.cached_read(('prescription_medicine', 'prescription_record', 'patient_record'),
+                                      services.patients_prescribed, medicine, since, until)
+        except Exception as e:
+            st.error(f'Error fetching prescribed patients: {e}')
+            return
+        if not patients:
+            st.warning('No patients were prescribed this medicine.')
+            return
+        df = pd.DataFrame(data=patients, columns=[
+            'Patient ID', 'Name', 'Contact number', 'Email ID', 'Prescriptions', 'Last prescribed', 'Medicines matched'
+        ])
+        st.write(f'{len(df)} patients were prescribed this medicine:')
+        st.dataframe(df)
+        st.download_button('Download the list', df.to_csv(index=False), 'drug_recall.csv', 'text/csv')
@@ -0,0 +1,211 @@
+import contextvars
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from functools import lru_cache
+from psycopg2 import extensions
+import config
+
+# Instrumentation of the SQL statements the app runs. The connection pool creates its cursors from
+# InstrumentedCursor, which records every statement's fingerprint (the SQL with values and placeholders
+# replaced by ?, so the same query with other values counts as one), duration, rows and the module function
+# that ran it. Statements are collected per page render (see start_render) and into process-wide latency
+# histograms, and statements slower than config.slow_query_ms are written to config.slow_query_log (the
+# fingerprint only: parameter values hold patient details and are never logged).
+
+# upper bounds (ms) of the latency histogram buckets; slower statements fall into a last, open bucket
+LATENCY_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000)
+
+_WHITESPACE = re.compile(r'\s+')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r'%\(\w+\)s|%s|\$\d+')        # psycopg2 and asyncpg (aio.py) placeholders
+
+_render = contextvars.ContextVar('query_render', default=None)     # statements of the current page render
+_histograms = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))      # fingerprint -> bucket counts
+_histograms_lock = threading.Lock()
+_slow_logger = None
+_slow_logger_lock = threading.Lock()
+
+# class holding one executed statement
+class Statement:
+    __slots__ = ('fingerprint', 'caller', 'params', 'duration', 'rows')
+
+    def __init__(self, fingerprint, caller, params):
+        self.fingerprint = fingerprint
+        self.caller = caller
+        self.params = params        # hash of the parameter values (to spot identical lookups)
+        self.duration = 0.0         # seconds
+        self.rows = 0
+
+# function to reduce a statement to its fingerprint: single spaces, and ? in place of values and placeholders
+@lru_cache(maxsize=1024)
+def fingerprint(query):
+    query = _WHITESPACE.sub(' ', query).strip()
+    return _LITERALS.sub('?', _PLACEHOLDERS.sub('?', query))
+
+def _query_text(cursor, query):
+    if isinstance(query, bytes):
+        return query.decode()
+    if not isinstance(query, str):      # psycopg2.sql.Composable
+        return query.as_string(cursor)
+    return query
+
+def _params_key(params):
+    try:
+        return hash(repr(params))
+    except Exception:
+        return None
+
+# function to start recording a statement run from frame (the caller of the cursor method)
+def _start(cursor, query, params, frame):
+    caller = f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+    return Statement(fingerprint(_query_text(cursor, query)), caller, _params_key(params))
+
+# function to record a finished statement in the current render, the histograms and the slow query log
+def _finish(statement):
+    render = _render.get()
+    if render is not None:
+        render.append(statement)
+    ms = statement.duration * 1000
+    bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if ms <= bound), len(LATENCY_BUCKETS_MS))
+    with _histograms_lock:
+        _histograms[statement.fingerprint][bucket] += 1
+    if config.slow_query_log and ms >= config.slow_query_ms:
+        _slow_log().warning('%.1f ms, %d rows, %s: %s', ms, statement.rows, statement.caller, statement.fingerprint)
+
+def _slow_log():
+    global _slow_logger
+    if _slow_logger is None:
+        with _slow_logger_lock:
+            if _slow_logger is None:
+                logger = logging.getLogger('hims.slow_queries')
+                handler = logging.FileHandler(config.slow_query_log)
+                handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+                logger.addHandler(handler)
+                logger.propagate = False
+                _slow_logger = logger
+    return _slow_logger
+
+# cursor class of the pool's connections; named (server-side) cursors run their query while rows are fetched,
+# so their statements are finished when the cursor is closed, with the fetch time and rows included
+class InstrumentedCursor(extensions.cursor):
+    _statement = None
+
+    def execute(self, query, vars=None):
+        statement = _start(self, query, vars, sys._getframe(1))
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            statement.duration = time.perf_counter() - start
+            if self.name is None:
+                statement.rows = max(self.rowcount, 0)
+                _finish(statement)
+            else:
+                self._statement = statement
+
+    def executemany(self, query, vars_list):
+        statement = _start(self, query, None, sys._getframe(1))
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            statement.duration = time.perf_counter() - start
+            statement.rows = max(self.rowcount, 0)
+            _finish(statement)
+
+    def copy_expert(self, sql, file, size=8192):
+        statement = _start(self, sql, None, sys._getframe(1))
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            statement.duration = time.perf_counter() - start
+            statement.rows = max(self.rowcount, 0)
+            _finish(statement)
+
+    def _fetch(self, fetch, *args):
+        if self._statement is None:
+            return fetch(*args)
+        start = time.perf_counter()
+        rows = fetch(*args)
+        self._statement.duration += time.perf_counter() - start
+        self._statement.rows += len(rows) if isinstance(rows, list) else rows is not None
+        return rows
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, *args):
+        return self._fetch(super().fetchmany, *args)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def close(self):
+        if self._statement is not None:
+            statement, self._statement = self._statement, None
+            _finish(statement)
+        super().close()
+
+# function to record a statement run outside the pool's cursors (on the asyncio pool, see aio.py) as if frame had
+# run it, given its duration (seconds) and the rows it returned
+def record_statement(query, params, frame, duration, rows):
+    statement = _start(None, query, params, frame)
+    statement.duration = duration
+    statement.rows = rows
+    _finish(statement)
+
+# function to start collecting the statements of a page render (or of any other unit of work); the statements
+# run in this context from now on are returned by render_statements
+def start_render():
+    _render.set([])
+
+# function to get the statements run since start_render in this context (None if it was never called)
+def render_statements():
+    return _render.get()
+
+# function to total a list of statements: (statements, total ms, rows)
+def totals(statements):
+    return len(statements), sum(s.duration for s in statements) * 1000, sum(s.rows for s in statements)
+
+# function to group statements by fingerprint, slowest total first: list of (fingerprint, count, total ms,
+# rows, callers)
+def by_fingerprint(statements):
+    groups = defaultdict(list)
+    for statement in statements:
+        groups[statement.fingerprint].append(statement)
+    summary = [
+        (fp, len(group), sum(s.duration for s in group) * 1000, sum(s.rows for s in group),
+         ', '.join(sorted({s.caller for s in group})))
+        for fp, group in groups.items()
+    ]
+    return sorted(summary, key=lambda row: row[2], reverse=True)
+
+# function to find the N+1 patterns of a render: statements run at least config.repeated_query_threshold
+# times (typically one lookup per row of a list). Returns a list of (fingerprint, count, identical repeats,
+# callers), where identical repeats counts runs with parameter values already looked up in the render
+def repeated_statements(statements):
+    counts = Counter(s.fingerprint for s in statements)
+    repeated = []
+    for fp, count in counts.most_common():
+        if count < config.repeated_query_threshold:
+            break
+        group = [s for s in statements if s.fingerprint == fp]
+        identical = count - len({s.params for s in group})
+        repeated.append((fp, count, identical, ', '.join(sorted({s.caller for s in group}))))
+    return repeated
+
+# function to get the process-wide latency histogram: list of (bucket label, statements), all fingerprints
+# together, or of one fingerprint if given
+def latency_histogram(fp=None):
+    with _histograms_lock:
+        if fp is not None:
+            counts = list(_histograms.get(fp, [0] * (len(LATENCY_BUCKETS_MS) + 1)))
+        else:
+            counts = [sum(column) for column in zip(*_histograms.values())] or [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    labels = [f'<= {bound} ms' for bound in LATENCY_BUCKETS_MS] + [f'> {LATENCY_BUCKETS_MS[-1]} ms']
+    return list(zip(labels, counts))
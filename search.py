@@ -0,0 +1,87 @@
+import streamlit as st
+import config
+import database as db
+import indexes
+import utils
+
+_trigram_available = None       # whether pg_trgm is installed (checked once per process)
+
+# function to check whether the pg_trgm extension (and so the trigram search indexes) is available
+def trigram_available():
+    global _trigram_available
+    if _trigram_available is None:
+        with db.session() as (conn, c):
+            c.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm');")
+            _trigram_available = c.fetchone()[0]
+    return _trigram_available
+
+# function to escape the LIKE wildcards in a search text
+def escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+# function to find the records of a table matching a search text, best matches first: an exact record ID,
+# then exact values, then values starting with the text, then (with pg_trgm) values containing similar words.
+# Each searched column contributes at most limit candidates, read in index order, so the cost depends on
+# the limit rather than on the size of the table or the number of matches
+def search_records(table, text, columns='*', limit=None):
+    text = text.strip().lower()
+    if len(text) < config.search_min_length:
+        return []
+    params = {
+        'text': text, 'prefix': escape_like(text) + '%', 'id': text.upper(),
+        'limit': limit or config.search_result_limit
+    }
+    candidates = [f'SELECT id, 4 AS search_rank FROM {table} WHERE id = %(id)s']
+    for column in indexes.SEARCH_COLUMNS[table]:
+        value = f'(lower({column}) COLLATE "C")'
+        candidates.append(
+            f"""
+            SELECT id, CASE WHEN {value} = %(text)s THEN 3 ELSE 2 END
+            FROM {table} WHERE {value} LIKE %(prefix)s ORDER BY {value} LIMIT %(limit)s
+            """
+        )
+        if trigram_available():
+            candidates.append(
+                f"""
+                SELECT id, word_similarity(%(text)s, lower({column}))
+                FROM {table} WHERE %(text)s <%% lower({column})
+                ORDER BY 2 DESC LIMIT %(limit)s
+                """
+            )
+    with db.session() as (conn, c):
+        c.execute(
+            f"""
+            SELECT {columns}
+            FROM {table}
+            JOIN (
+                SELECT id, max(search_rank) AS search_rank
+                FROM ({' UNION ALL '.join(f'({query})' for query in candidates)}) candidates
+                GROUP BY id
+            ) m USING (id)
+            ORDER BY m.search_rank DESC, name, id
+            LIMIT %(limit)s;
+            """,
+            params
+        )
+        return c.fetchall()
+
+# function to show a search box for a record table and the best matching records;
+# show_details is the module's function that renders a list of rows (selected as columns), record_name is e.g. 'Patient'
+def search_screen(table, show_details, record_name, columns='*'):
+    searched_columns = ', '.join(column.replace('_', ' ') for column in indexes.SEARCH_COLUMNS[table])
+    text = utils.sanitize_text_input(st.text_input(f'Search by {record_name} ID, {searched_columns}'))
+    if text == '':
+        return
+    if len(text) < config.search_min_length:
+        st.warning(f'Enter at least {config.search_min_length} characters')
+        return
+    if not trigram_available():
+        st.caption('Matches values that start with the search text.')
+    try:
+        rows = db.cached_read((table,), search_records, table, text, columns)
+    except Exception as e:
+        st.error(f'Error searching {record_name.lower()} records: {e}')
+        return
+    if rows:
+        st.write(f'Best {len(rows)} matches:' if len(rows) > 1 else 'Best match:')
+    show_details(rows)
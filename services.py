@@ -0,0 +1,498 @@
+from contextlib import contextmanager
+from datetime import date, datetime
+import psycopg2 as sql
+import aio
+import database as db
+import ids
+import names
+import search
+import utils
+
+# The service layer: every create/update/delete operation and query on the HIMS records, free of Streamlit so
+# the UI modules and the JSON API (api.py) share the same rules. Each write operation runs as one unit of work
+# (see db.unit_of_work), so it is committed, or rolled back as a whole, before it returns.
+
+# raised when the details given for a record are missing or invalid (the message is meant for the user)
+class ValidationError(ValueError):
+    pass
+
+# raised when an operation refers to a record that does not exist
+class NotFound(LookupError):
+    pass
+
+# raised when a write clashes with other records (e.g. a duplicate Aadhar ID, or deleting a record still in use)
+class Conflict(ValueError):
+    pass
+
+# name of each record type as shown to the user
+RECORD_NAMES = {
+    'patient_record': 'Patient',
+    'doctor_record': 'Doctor',
+    'department_record': 'Department',
+    'prescription_record': 'Prescription',
+    'medical_test_record': 'Medical Test',
+}
+
+# columns of each record table in the order expected by the modules' show_*_details functions (and the
+# field names of the records returned by the API)
+PATIENT_FIELDS = [
+    'id', 'name', 'age', 'gender', 'date_of_birth', 'blood_group', 'contact_number_1', 'contact_number_2',
+    'aadhar_or_voter_id', 'weight', 'height', 'address', 'city', 'state', 'pin_code', 'next_of_kin_name',
+    'next_of_kin_relation_to_patient', 'next_of_kin_contact_number', 'email_id',
+    'date_of_registration', 'time_of_registration'
+]
+DOCTOR_FIELDS = [
+    'id', 'name', 'age', 'gender', 'date_of_birth', 'blood_group', 'department_id', 'department_name',
+    'contact_number_1', 'contact_number_2', 'aadhar_or_voter_id', 'email_id', 'qualification',
+    'specialisation', 'years_of_experience', 'address', 'city', 'state', 'pin_code'
+]
+DEPARTMENT_FIELDS = ['id', 'name', 'description', 'contact_number_1', 'contact_number_2', 'address', 'email_id']
+PRESCRIPTION_FIELDS = [
+    'id', 'patient_id', 'patient_name', 'doctor_id', 'doctor_name', 'diagnosis', 'comments', 'medicines',
+    'prescribed_at'
+]
+MEDICAL_TEST_FIELDS = [
+    'id', 'test_name', 'patient_id', 'patient_name', 'doctor_id', 'doctor_name', 'medical_lab_scientist_id',
+    'test_date_time', 'result_date_time', 'result_and_diagnosis', 'description', 'comments', 'cost'
+]
+
+# ages are not stored: a person's age in whole years is worked out from their date of birth whenever the record
+# is read, so it is never out of date
+AGE_COLUMN = "date_part('year', age(date_of_birth))::integer AS age"
+
+PATIENT_COLUMNS = ', '.join(AGE_COLUMN if field == 'age' else field for field in PATIENT_FIELDS)
+DOCTOR_COLUMNS = ', '.join(AGE_COLUMN if field == 'age' else field for field in DOCTOR_FIELDS)
+DEPARTMENT_COLUMNS = ', '.join(DEPARTMENT_FIELDS)
+MEDICAL_TEST_COLUMNS = ', '.join(MEDICAL_TEST_FIELDS)
+# the medicines of each prescription are rows of prescription_medicine, listed here as one text column
+PRESCRIPTION_COLUMNS = (
+    'id, patient_id, patient_name, doctor_id, doctor_name, diagnosis, comments, '
+    "(SELECT string_agg(medicine_name || ' (' || dosage_description || ')', '; ' ORDER BY line_number) "
+    'FROM prescription_medicine WHERE prescription_id = prescription_record.id) AS medicines, prescribed_at'
+)
+
+# details accepted when a record is added and when it is updated (IDs, copied names and registration times are
+# filled in by the service, ages are derived); fields in the *_OPTIONAL_FIELDS sets may be left out or empty
+NEW_PATIENT_FIELDS = [field for field in PATIENT_FIELDS
+                      if field not in ('id', 'age', 'date_of_registration', 'time_of_registration')]
+PATIENT_UPDATE_FIELDS = [
+    'name', 'contact_number_1', 'contact_number_2', 'weight', 'height', 'address', 'city', 'state', 'pin_code',
+    'next_of_kin_name', 'next_of_kin_relation_to_patient', 'next_of_kin_contact_number', 'email_id'
+]
+PATIENT_OPTIONAL_FIELDS = {'contact_number_2', 'email_id'}
+
+NEW_DOCTOR_FIELDS = [field for field in DOCTOR_FIELDS if field not in ('id', 'age', 'department_name')]
+DOCTOR_UPDATE_FIELDS = [
+    'name', 'department_id', 'contact_number_1', 'contact_number_2', 'email_id', 'qualification',
+    'specialisation', 'years_of_experience', 'address', 'city', 'state', 'pin_code'
+]
+DOCTOR_OPTIONAL_FIELDS = {'contact_number_2'}
+
+NEW_DEPARTMENT_FIELDS = DEPARTMENT_UPDATE_FIELDS = DEPARTMENT_FIELDS[1:]
+DEPARTMENT_OPTIONAL_FIELDS = {'contact_number_2'}
+
+NEW_PRESCRIPTION_FIELDS = ['patient_id', 'doctor_id', 'diagnosis', 'comments']
+PRESCRIPTION_UPDATE_FIELDS = ['diagnosis', 'comments']
+PRESCRIPTION_OPTIONAL_FIELDS = {'comments'}
+
+NEW_MEDICAL_TEST_FIELDS = [
+    'test_name', 'patient_id', 'doctor_id', 'medical_lab_scientist_id', 'test_date_time', 'result_date_time',
+    'cost', 'result_and_diagnosis', 'description', 'comments'
+]
+MEDICAL_TEST_UPDATE_FIELDS = ['result_and_diagnosis', 'description', 'comments']
+MEDICAL_TEST_OPTIONAL_FIELDS = {'result_and_diagnosis', 'description', 'comments'}
+RESULT_AWAITED = 'Test result awaited'      # stored until a test's result is entered
+
+# limits of the numeric fields (same as the forms' number inputs)
+NUMBER_RANGES = {'weight': (0, 400), 'height': (0, 275), 'years_of_experience': (0, 100), 'cost': (0, 10000)}
+DATE_FIELDS = {'date_of_birth'}
+DATETIME_FIELDS = {'test_date_time', 'result_date_time'}
+AGE_RANGE = (0, 150)
+
+# tables a write to each record table can change: the table itself, the tables holding copies of its records'
+# names (kept up to date by triggers, see names.py) and, for prescriptions, their medicines
+CHANGED_TABLES = {table: (table,) + tuple(copy for copy, _, _ in names.copies_by_source().get(table, []))
+                  for table in RECORD_NAMES}
+CHANGED_TABLES['prescription_record'] += ('prescription_medicine',)
+
+# condition selecting the people aged min_age to max_age (whole years, both inclusive): written as a range of
+# dates of birth rather than on the derived age, so that it is served by the date of birth index
+AGE_RANGE_CONDITION = (
+    "date_of_birth > (current_date - make_interval(years => %(max_age)s + 1))::date "
+    "AND date_of_birth <= (current_date - make_interval(years => %(min_age)s))::date"
+)
+
+# function to check an age filter; returns the condition and parameters to select patients or doctors aged
+# min_age to max_age (a missing end is open)
+def age_range(min_age=None, max_age=None):
+    low, high = AGE_RANGE
+    min_age = low if min_age is None else _number('min_age', min_age, AGE_RANGE)
+    max_age = high if max_age is None else _number('max_age', max_age, AGE_RANGE)
+    if min_age > max_age:
+        raise ValidationError('Min age must not be greater than max age.')
+    return AGE_RANGE_CONDITION, {'min_age': min_age, 'max_age': max_age}
+
+def _label(field):
+    label = field.replace('_', ' ').capitalize()
+    return label[:-2] + 'ID' if label.endswith(' id') else label
+
+# function to check the format of a record's email and contact numbers (the checks the forms run as they are filled in)
+def check_contact_details(email_id, contact_number_1, contact_number_2):
+    if not utils.validate_email(email_id):
+        raise ValidationError('Invalid email format.')
+    if not utils.validate_phone_number(contact_number_1):
+        raise ValidationError('Invalid contact number format.')
+    if contact_number_2 and not utils.validate_phone_number(contact_number_2):
+        raise ValidationError('Invalid alternate contact number format.')
+
+def _number(field, value, limits=None):
+    low, high = limits or NUMBER_RANGES[field]
+    try:
+        if isinstance(value, bool) or int(value) != float(value):
+            raise ValueError
+        value = int(value)
+    except (TypeError, ValueError, OverflowError):     # OverflowError: infinite or huge numbers (e.g. 1e400 in JSON)
+        raise ValidationError(f'{_label(field)} must be a whole number.') from None
+    if not low <= value <= high:
+        raise ValidationError(f'{_label(field)} must be between {low} and {high}.')
+    return value
+
+def _date(field, value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise ValidationError(f'{_label(field)} must be a date (YYYY-MM-DD).') from None
+
+def _datetime(field, value):
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        raise ValidationError(f'{_label(field)} must be a date and time (YYYY-MM-DD hh:mm).') from None
+
+# function to check and normalise the given fields of a record's details (a dict keyed by column name): text is
+# sanitised and empty text counts as missing, numbers and dates are converted and range-checked, and a missing
+# field raises ValidationError unless it is optional (stored as NULL). With partial set (updates), fields
+# left out of details are left out of the result rather than treated as missing
+def clean_details(details, fields, optional=(), partial=False):
+    values = {}
+    for field in fields:
+        if partial and field not in details:
+            continue
+        value = details.get(field)
+        if isinstance(value, str):
+            value = utils.sanitize_text_input(value) or None
+        if value is None:
+            if field not in optional:
+                raise ValidationError(f'{_label(field)} is required.')
+        elif field in NUMBER_RANGES:
+            value = _number(field, value)
+        elif field in DATE_FIELDS:
+            value = _date(field, value)
+        elif field in DATETIME_FIELDS:
+            value = _datetime(field, value)
+        elif not isinstance(value, str):
+            raise ValidationError(f'{_label(field)} must be text.')
+        values[field] = value
+    check_contact_details(values.get('email_id'), values.get('contact_number_1'), values.get('contact_number_2'))
+    return values
+
+# context manager for one service transaction writing to a table, reporting constraint violations as Conflict;
+# the cached results of the tables the write changes are invalidated once it is committed
+@contextmanager
+def _transaction(table):
+    try:
+        with db.session() as (conn, c):
+            yield c
+    except sql.IntegrityError as e:
+        raise Conflict(e.diag.message_detail or str(e).strip()) from e
+    db.tables_changed(*CHANGED_TABLES[table])
+
+def _insert(c, table, values):
+    c.execute(
+        f"INSERT INTO {table} ({', '.join(values)}) VALUES ({', '.join(f'%({col})s' for col in values)});",
+        values
+    )
+
+# function to update the given columns of a record; raises NotFound for an unknown ID
+def _update(c, table, record_id, values):
+    assignments = [f'{col} = %({col})s' for col in values]
+    c.execute(
+        f"UPDATE {table} SET {', '.join(assignments) or 'id = id'} WHERE id = %(record_id)s;",
+        {**values, 'record_id': record_id}
+    )
+    if c.rowcount == 0:
+        raise NotFound(f'Invalid {RECORD_NAMES[table]} ID')
+
+def _delete(table, record_id):
+    try:
+        with db.session() as (conn, c):
+            c.execute(f"DELETE FROM {table} WHERE id = %(id)s;", {'id': record_id})
+            deleted = c.rowcount
+    except sql.errors.ForeignKeyViolation as e:
+        raise Conflict('This entry cannot be deleted as other records are using it.') from e
+    if not deleted:
+        raise NotFound(f'Invalid {RECORD_NAMES[table]} ID')
+    db.forget_id(table, record_id)
+    db.tables_changed(*CHANGED_TABLES[table])
+
+# function to fetch one record by its ID as a row of the given columns (None if there is no such record)
+def get_record(table, record_id, columns='*'):
+    if table not in RECORD_NAMES:
+        raise ValueError(f'Unknown record table: {table}')
+    with db.session() as (conn, c):
+        c.execute(f"SELECT {columns} FROM {table} WHERE id = %(id)s;", {'id': record_id})
+        return c.fetchone()
+
+# function to get the name of a record that other records refer to, raising ValidationError for an unknown ID
+def _referenced_name(table, record_id):
+    name = db.record_name(table, record_id)
+    if name is None:
+        raise ValidationError(f'Invalid {RECORD_NAMES[table]} ID')
+    return name
+
+# Patients
+
+# function to add a patient; returns the new Patient ID
+@db.unit_of_work()
+def add_patient(details):
+    values = clean_details(details, NEW_PATIENT_FIELDS, PATIENT_OPTIONAL_FIELDS)
+    now = datetime.now().replace(microsecond=0)
+    values.update(id=ids.next_id('patient_record'), date_of_registration=now.date(), time_of_registration=now.time())
+    with _transaction('patient_record') as c:
+        _insert(c, 'patient_record', values)
+    db.remember_id('patient_record', values['id'])
+    return values['id']
+
+@db.unit_of_work()
+def update_patient(patient_id, details):
+    values = clean_details(details, PATIENT_UPDATE_FIELDS, PATIENT_OPTIONAL_FIELDS, partial=True)
+    with _transaction('patient_record') as c:
+        _update(c, 'patient_record', patient_id, values)
+    db.forget_name('patient_record', patient_id)
+
+@db.unit_of_work()
+def delete_patient(patient_id):
+    _delete('patient_record', patient_id)
+
+def get_patient(patient_id):
+    return get_record('patient_record', patient_id, PATIENT_COLUMNS)
+
+# Doctors
+
+# function to add a doctor (the department's name is copied from its record); returns the new Doctor ID
+@db.unit_of_work()
+def add_doctor(details):
+    values = clean_details(details, NEW_DOCTOR_FIELDS, DOCTOR_OPTIONAL_FIELDS)
+    values.update(id=ids.next_id('doctor_record'),
+                  department_name=_referenced_name('department_record', values['department_id']))
+    with _transaction('doctor_record') as c:
+        _insert(c, 'doctor_record', values)
+    db.remember_id('doctor_record', values['id'])
+    return values['id']
+
+# function to update the given details of a doctor (the department's name is copied from its record)
+@db.unit_of_work()
+def update_doctor(doctor_id, details):
+    values = clean_details(details, DOCTOR_UPDATE_FIELDS, DOCTOR_OPTIONAL_FIELDS, partial=True)
+    if 'department_id' in values:
+        values['department_name'] = _referenced_name('department_record', values['department_id'])
+    with _transaction('doctor_record') as c:
+        _update(c, 'doctor_record', doctor_id, values)
+    db.forget_name('doctor_record', doctor_id)
+
+@db.unit_of_work()
+def delete_doctor(doctor_id):
+    _delete('doctor_record', doctor_id)
+
+def get_doctor(doctor_id):
+    return get_record('doctor_record', doctor_id, DOCTOR_COLUMNS)
+
+# Departments
+
+# function to add a department; returns the new Department ID
+@db.unit_of_work()
+def add_department(details):
+    values = clean_details(details, NEW_DEPARTMENT_FIELDS, DEPARTMENT_OPTIONAL_FIELDS)
+    values['id'] = ids.next_id('department_record')
+    with _transaction('department_record') as c:
+        _insert(c, 'department_record', values)
+    db.remember_id('department_record', values['id'])
+    return values['id']
+
+@db.unit_of_work()
+def update_department(department_id, details):
+    values = clean_details(details, DEPARTMENT_UPDATE_FIELDS, DEPARTMENT_OPTIONAL_FIELDS, partial=True)
+    with _transaction('department_record') as c:
+        _update(c, 'department_record', department_id, values)
+    db.forget_name('department_record', department_id)
+
+@db.unit_of_work()
+def delete_department(department_id):
+    _delete('department_record', department_id)
+
+def get_department(department_id):
+    return get_record('department_record', department_id, DEPARTMENT_COLUMNS)
+
+# function to list the ID and name of the doctors working in a department
+def doctors_in_department(department_id):
+    with db.session() as (conn, c):
+        c.execute(
+            "SELECT id, name FROM doctor_record WHERE department_id = %(dept_id)s ORDER BY id;",
+            {'dept_id': department_id}
+        )
+        return c.fetchall()
+
+# Prescriptions
+
+# function to check the medicines of a prescription, given as (name, dosage and description) pairs or as dicts
+# with medicine_name and dosage_description keys; medicines without a name are skipped
+def clean_medicines(medicines):
+    if medicines is not None and not isinstance(medicines, (list, tuple)):
+        raise ValidationError('Medicines must be a list.')
+    cleaned = []
+    for medicine in medicines or []:
+        if isinstance(medicine, dict):
+            name, dosage = medicine.get('medicine_name'), medicine.get('dosage_description')
+        elif isinstance(medicine, (list, tuple)) and len(medicine) == 2:
+            name, dosage = medicine
+        else:
+            raise ValidationError('Each medicine must be a name and dosage pair.')
+        if not isinstance(name, (str, type(None))) or not isinstance(dosage, (str, type(None))):
+            raise ValidationError('Medicine names and dosages must be text.')
+        name = utils.sanitize_text_input(name)
+        if name:
+            cleaned.append((name, utils.sanitize_text_input(dosage) or ''))
+    if not cleaned:
+        raise ValidationError('Enter at least one medicine.')
+    return cleaned
+
+# function to replace the medicines of a prescription (a list of (name, dosage and description) pairs)
+def save_medicines(c, prescription_id, medicines):
+    c.execute("DELETE FROM prescription_medicine WHERE prescription_id = %(id)s;", {'id': prescription_id})
+    c.executemany(
+        """
+        INSERT INTO prescription_medicine (prescription_id, line_number, medicine_name, dosage_description)
+        VALUES (%s, %s, %s, %s);
+        """,
+        [(prescription_id, n, name, dosage) for n, (name, dosage) in enumerate(medicines, start=1)]
+    )
+
+# function to look up the names of a record's patient and doctor at once, which also verifies both IDs
+def _patient_and_doctor_names(values):
+    patient_name, doctor_name = aio.lookup_names(
+        ('patient_record', values['patient_id']), ('doctor_record', values['doctor_id'])
+    )
+    if patient_name is None:
+        raise ValidationError('Invalid Patient ID')
+    if doctor_name is None:
+        raise ValidationError('Invalid Doctor ID')
+    return patient_name, doctor_name
+
+# function to add a prescription with its medicines (details['medicines'], see clean_medicines); returns the
+# new Prescription ID
+@db.unit_of_work()
+def add_prescription(details):
+    values = clean_details(details, NEW_PRESCRIPTION_FIELDS, PRESCRIPTION_OPTIONAL_FIELDS)
+    medicines = clean_medicines(details.get('medicines'))
+    values['patient_name'], values['doctor_name'] = _patient_and_doctor_names(values)
+    values['id'] = ids.next_id('prescription_record')
+    with _transaction('prescription_record') as c:
+        _insert(c, 'prescription_record', values)
+        save_medicines(c, values['id'], medicines)
+    db.remember_id('prescription_record', values['id'])
+    return values['id']
+
+# function to update the diagnosis, comments and (if given) the medicines of a prescription
+@db.unit_of_work()
+def update_prescription(prescription_id, details):
+    values = clean_details(details, PRESCRIPTION_UPDATE_FIELDS, PRESCRIPTION_OPTIONAL_FIELDS, partial=True)
+    medicines = clean_medicines(details['medicines']) if 'medicines' in details else None
+    with _transaction('prescription_record') as c:
+        _update(c, 'prescription_record', prescription_id, values)
+        if medicines is not None:
+            save_medicines(c, prescription_id, medicines)
+
+@db.unit_of_work()
+def delete_prescription(prescription_id):
+    _delete('prescription_record', prescription_id)
+
+def get_prescription(prescription_id):
+    return get_record('prescription_record', prescription_id, PRESCRIPTION_COLUMNS)
+
+# function to list the prescriptions of a patient, oldest first
+def prescriptions_of_patient(patient_id):
+    with db.session() as (conn, c):
+        c.execute(
+            f"SELECT {PRESCRIPTION_COLUMNS} FROM prescription_record WHERE patient_id = %(id)s "
+            "ORDER BY prescribed_at;",
+            {'id': patient_id}
+        )
+        return c.fetchall()
+
+# function to find the patients prescribed a medicine (matched on its normalised name, or the start of it)
+# within an optional date range, using the medicine index; one row per patient, most recent first
+def patients_prescribed(medicine, since=None, until=None):
+    medicine_key = search.escape_like(' '.join(medicine.split()).lower()) + '%'
+    with db.session() as (conn, c):
+        c.execute(
+            """
+            SELECT p.id, p.name, p.contact_number_1, p.email_id, count(DISTINCT r.id),
+                   max(r.prescribed_at), string_agg(DISTINCT m.medicine_name, ', ')
+            FROM prescription_medicine m
+            JOIN prescription_record r ON r.id = m.prescription_id
+            JOIN patient_record p ON p.id = r.patient_id
+            WHERE m.medicine_key LIKE %(key)s
+              AND (%(since)s::date IS NULL OR r.prescribed_at >= %(since)s::date)
+              AND (%(until)s::date IS NULL OR r.prescribed_at < %(until)s::date + 1)
+            GROUP BY p.id, p.name, p.contact_number_1, p.email_id
+            ORDER BY max(r.prescribed_at) DESC NULLS LAST, p.id;
+            """,
+            {'key': medicine_key, 'since': since, 'until': until}
+        )
+        return c.fetchall()
+
+# Medical tests
+
+# function to add a medical test; returns the new Medical Test ID
+@db.unit_of_work()
+def add_medical_test(details):
+    values = clean_details(details, NEW_MEDICAL_TEST_FIELDS, MEDICAL_TEST_OPTIONAL_FIELDS)
+    values['result_and_diagnosis'] = values['result_and_diagnosis'] or RESULT_AWAITED
+    values['patient_name'], values['doctor_name'] = _patient_and_doctor_names(values)
+    values['id'] = ids.next_id('medical_test_record')
+    with _transaction('medical_test_record') as c:
+        _insert(c, 'medical_test_record', values)
+    db.remember_id('medical_test_record', values['id'])
+    return values['id']
+
+# function to update the result, description and comments of a medical test
+@db.unit_of_work()
+def update_medical_test(medical_test_id, details):
+    values = clean_details(details, MEDICAL_TEST_UPDATE_FIELDS, MEDICAL_TEST_OPTIONAL_FIELDS, partial=True)
+    if 'result_and_diagnosis' in values:
+        values['result_and_diagnosis'] = values['result_and_diagnosis'] or RESULT_AWAITED
+    with _transaction('medical_test_record') as c:
+        _update(c, 'medical_test_record', medical_test_id, values)
+
+@db.unit_of_work()
+def delete_medical_test(medical_test_id):
+    _delete('medical_test_record', medical_test_id)
+
+def get_medical_test(medical_test_id):
+    return get_record('medical_test_record', medical_test_id, MEDICAL_TEST_COLUMNS)
+
+# function to list the medical tests of a patient, oldest first
+def medical_tests_of_patient(patient_id):
+    with db.session() as (conn, c):
+        c.execute(
+            f"SELECT {MEDICAL_TEST_COLUMNS} FROM medical_test_record WHERE patient_id = %(p_id)s "
+            "ORDER BY test_date_time;",
+            {'p_id': patient_id}
+        )
+        return c.fetchall()
@@ -0,0 +1,98 @@
+import streamlit as st
+from datetime import datetime
+import pandas as pd
+import config
+import database as db
+import services
+import utils
+
+PATIENT_SUMMARY_TITLES = ['Patient ID', 'Name', 'Age', 'Gender', 'Blood group', 'Contact number']
+EVENT_TITLES = ['Date and time', 'Type', 'ID', 'Doctor ID', 'Doctor name', 'Summary', 'Details']
+TIMELINE_TABLES = ('patient_record', 'prescription_record', 'prescription_medicine', 'medical_test_record')
+
+# function to fetch a patient's summary and one page of their prescriptions and medical tests, newest first
+# (undated ones last), in a single query served by the patient_id indexes; before is the (time, id) key of
+# the last event on the previous page. Returns (patient summary, events, has_more), or (None, [], False) for an unknown patient
+def fetch_timeline(patient_id, page_size, before=None):
+    before_time, before_id = before or (None, None)
+    if before_time == datetime.min:     # events with an unknown date are read back as datetime.min
+        before_time = '-infinity'
+    with db.session() as (conn, c):
+        c.execute(
+            f"""
+            WITH events AS (
+                SELECT coalesce(test_date_time, '-infinity') AS event_time, 'Medical test' AS kind, id,
+                       doctor_id, doctor_name, test_name AS summary, result_and_diagnosis AS details
+                FROM medical_test_record
+                WHERE patient_id = %(id)s
+                UNION ALL
+                SELECT coalesce(prescribed_at, '-infinity'), 'Prescription', id, doctor_id, doctor_name,
+                       diagnosis, (SELECT string_agg(medicine_name, ', ' ORDER BY line_number)
+                                   FROM prescription_medicine WHERE prescription_id = prescription_record.id)
+                FROM prescription_record
+                WHERE patient_id = %(id)s
+            ), page AS (
+                SELECT *
+                FROM events
+                WHERE %(before_id)s IS NULL OR (event_time, id) < (%(before_time)s, %(before_id)s)
+                ORDER BY event_time DESC, id DESC
+                LIMIT %(limit)s
+            )
+            SELECT p.id, p.name, {services.AGE_COLUMN}, p.gender, p.blood_group, p.contact_number_1,
+                   e.event_time, e.kind, e.id, e.doctor_id, e.doctor_name, e.summary, e.details
+            FROM patient_record p
+            LEFT JOIN page e ON TRUE
+            WHERE p.id = %(id)s
+            ORDER BY e.event_time DESC, e.id DESC;
+            """,
+            {'id': patient_id, 'before_time': before_time, 'before_id': before_id, 'limit': page_size + 1}
+        )
+        rows = c.fetchall()
+    if not rows:
+        return None, [], False
+    events = [row[6:] for row in rows if row[8] is not None]
+    return rows[0][:6], events[:page_size], len(events) > page_size
+
+# callback to move between timeline pages; state['pages'] holds the key each visited page starts before
+def _move(state, kind):
+    if kind == 'older':
+        state['pages'].append(state['last_key'])
+    elif kind == 'newer':
+        state['pages'].pop()
+    else:
+        state['pages'] = [None]
+
+# function to show a patient's prescriptions and medical tests as one timeline, newest first, page by page
+def patient_timeline():
+    state = st.session_state.setdefault('patient_timeline', {'pages': [None], 'last_key': None})
+    patient_id = utils.sanitize_text_input(st.text_input('Enter Patient ID', key='patient_timeline_id',
+                                                         on_change=_move, args=(state, 'reset')))
+    if not patient_id:
+        return
+    try:
+        summary, events, has_more = db.cached_read(TIMELINE_TABLES, fetch_timeline, patient_id,
+                                                   config.timeline_page_size, state['pages'][-1])
+    except Exception as e:
+        st.error(f'Error fetching patient timeline: {e}')
+        return
+    if summary is None:
+        st.error('Invalid Patient ID')
+        return
+
+    st.success('Verified')
+    st.write(pd.Series(data=summary, index=PATIENT_SUMMARY_TITLES))
+    if events:
+        state['last_key'] = events[-1][0], events[-1][2]
+        timeline = pd.DataFrame(data=events, columns=EVENT_TITLES)
+        timeline['Date and time'] = timeline['Date and time'].map(
+            lambda t: 'Unknown' if t == datetime.min else t.strftime('%Y-%m-%d %H:%M')
+        )
+        st.dataframe(timeline)
+    else:
+        st.warning('No prescriptions or medical tests to show')
+
+    newer_col, older_col = st.columns(2)
+    newer_col.button('Newer entries', key='patient_timeline_newer', disabled=len(state['pages']) == 1,
+                     on_click=_move, args=(state, 'newer'))
+    older_col.button('Older entries', key='patient_timeline_older', disabled=not has_more,
+                     on_click=_move, args=(state, 'older'))
@@ -1,11 +1,32 @@
 import re
+from functools import lru_cache
+import pandas as pd
+
+# validation rules shared by the form validators below and the batch validators used by bulk pipelines
+EMAIL_REGEX = r'^[\w\.-]+@[\w\.-]+\.\w+$'
+PHONE_REGEX = r'^\+?\d{7,15}$'
+ID_REGEX = r'^{prefix}-\d{{2}}-\d{{6}}$'        # filled in with a table's ID prefix (see ids.ID_PREFIXES)
+LEGACY_ID_REGEX = r'^{prefix}-[0-5]\d[0-5]\d[0-2]\d-\d{{6}}$'        # IDs generated before the sequences (SSMMHH-YYMMDD)
+MAX_TEXT_LENGTH = 255
+
+EMAIL_PATTERN = re.compile(EMAIL_REGEX)
+PHONE_PATTERN = re.compile(PHONE_REGEX)
+
+# function to get the compiled pattern of the IDs with a given prefix (compiled once per prefix)
+@lru_cache(maxsize=None)
+def id_pattern(prefix):
+    return re.compile(ID_REGEX.format(prefix=re.escape(prefix)))
+
+# function to get the compiled pattern of the legacy IDs with a given prefix
+@lru_cache(maxsize=None)
+def legacy_id_pattern(prefix):
+    return re.compile(LEGACY_ID_REGEX.format(prefix=re.escape(prefix)))
 
 def validate_email(email):
     """Validate email format."""
     if email is None:
         return True
-    email_regex = r'^[\w\.-]+@[\w\.-]+\.\w+$'
-    return re.match(email_regex, email) is not None
+    return EMAIL_PATTERN.match(email) is not None
 
 def validate_phone_number(phone):
     """Validate phone number format: digits only, length 7 to 15."""
@@ -14,10 +35,9 @@ def validate_phone_number(phone):
     phone = phone.strip()
     if phone == '':
         return True
-    phone_regex = r'^\+?\d{7,15}$'
-    return re.match(phone_regex, phone) is not None
+    return PHONE_PATTERN.match(phone) is not None
 
-def sanitize_text_input(text, max_length=255):
+def sanitize_text_input(text, max_length=MAX_TEXT_LENGTH):
     """Sanitize text input by stripping and limiting length."""
     if text is None:
         return None
@@ -30,6 +50,48 @@ def validate_id_format(id_str, prefix):
     """Validate ID format with expected prefix and pattern."""
     if id_str is None:
         return False
-    id_str = id_str.strip()
-    pattern = rf'^{prefix}-\d{{2}}-\d{{6}}$'
-    return re.match(pattern, id_str) is not None
+    return id_pattern(prefix).match(id_str.strip()) is not None
+
+# Batch versions of the validators, for bulk pipelines (imports, data quality audits). Each takes a pandas
+# Series or any iterable of values, matches the whole column at once, and returns a boolean Series that is
+# True for the invalid values (the per-row error mask), aligned with the input
+
+def _as_text(values):
+    values = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+    return values.astype('string').str.strip()
+
+def blank_values(values):
+    """Mask of missing or blank values."""
+    text = _as_text(values)
+    return (text.isna() | (text == '')).astype(bool)
+
+def _mismatches(values, pattern, blank_is_valid):
+    text = _as_text(values)
+    blank = text.isna() | (text == '')
+    return (~text.str.match(pattern).fillna(False).astype(bool) & ~blank) | (blank & (not blank_is_valid))
+
+def invalid_emails(values, required=False):
+    """Mask of malformed email addresses; blank values are invalid only if required."""
+    return _mismatches(values, EMAIL_PATTERN, not required)
+
+def invalid_phone_numbers(values, required=False):
+    """Mask of malformed phone numbers; blank values are invalid only if required."""
+    return _mismatches(values, PHONE_PATTERN, not required)
+
+def invalid_id_formats(values, prefix, allow_legacy=False):
+    """Mask of values that are not IDs with the expected prefix (missing values are invalid); with allow_legacy,
+    IDs in the legacy SSMMHH-YYMMDD shape are valid too."""
+    invalid = _mismatches(values, id_pattern(prefix), False)
+    if allow_legacy:
+        invalid &= _mismatches(values, legacy_id_pattern(prefix), False)
+    return invalid
+
+def invalid_numbers(values, low, high):
+    """Mask of values that are not whole numbers from low to high (missing values are invalid)."""
+    numbers = pd.to_numeric(values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object),
+                            errors='coerce')
+    return (numbers.isna() | (numbers % 1 != 0) | ~numbers.between(low, high)).astype(bool)
+
+def too_long(values, max_length=MAX_TEXT_LENGTH):
+    """Mask of text values longer than max_length."""
+    return (_as_text(values).str.len() > max_length).fillna(False).astype(bool)